@@ -19,6 +19,7 @@ import arcpy
 import click
 
 from unbox import build_locator
+from unbox import build_planner
 from unbox.build_locator import BuildConfig
 
 # --------------------------------------------------------------------------------------
@@ -77,7 +78,7 @@ def _validate_path_or_url(ctx: click.Context, param: click.Parameter, value: Opt
 # --------------------------------------------------------------------------------------
 # Core logic (stub)
 # --------------------------------------------------------------------------------------
-def main(cfg: BuildConfig) -> None:
+def main(cfg: BuildConfig, dry_run: bool = False, matrix: Optional[List[Dict]] = None, sample_addresses: Optional[List[str]] = None) -> None:
     """
     Implement the actual work here.
 
@@ -86,7 +87,8 @@ def main(cfg: BuildConfig) -> None:
     - Build a locator in cfg.output using cfg.cities/cfg.counties/cfg.tiger
     - Respect include_* flags
 
-    Currently: just prints parsed configuration.
+    Prints the parsed configuration, then either builds the locator or, for a dry run, checks the inputs and
+    estimates the build without building anything. With a matrix of variants, builds and compares every variant.
     """
     # NOTE: keep this lightweight; click already validates most inputs.
     click.echo("Parsed configuration:")
@@ -102,13 +104,30 @@ def main(cfg: BuildConfig) -> None:
             "include_parcels": cfg.include_parcels,
             "parcels_with_addresses": cfg.parcels_with_addresses,
             "temp_gdb": cfg.temp_gdb,
+            "parallel_stages": cfg.parallel_stages,
+            "max_workers": cfg.max_workers,
+            "shard_by": cfg.shard_by,
+            "region_groups": cfg.region_groups,
+            "shard_manifest": cfg.shard_manifest,
+            "telemetry_path": cfg.telemetry_path,
+            "spatial_order": cfg.spatial_order,
+            "precision_type": cfg.precision_type,
             "extra": cfg.extra or {},
         },
         indent=2,
         sort_keys=True,
     ))
 
-    cfg.run_build()
+    if dry_run:
+        plan = build_planner.plan_build(cfg)
+        click.echo(plan.report())
+        raise SystemExit(0 if plan.ok else 1)
+
+    _ensure_parent_dir(cfg.output_locator_path)
+    if matrix:
+        cfg.run_matrix(matrix, sample_addresses=sample_addresses)
+    else:
+        cfg.run_build()
 
 
 # --------------------------------------------------------------------------------------
@@ -183,6 +202,76 @@ CONTEXT_SETTINGS = {
     type=click.Path(exists=True, file_okay=False, dir_okay=True, readable=True, path_type=str),
     help="Optional temp file geodatabase to use when preparing intermediate data.",
 )
+@click.option(
+    "--parallel_stages/--no_parallel_stages",
+    default=True,
+    show_default=True,
+    help="Whether to run the data preparation stages concurrently in worker processes.",
+)
+@click.option(
+    "--max_workers",
+    default=None,
+    type=click.IntRange(min=1),
+    help="Maximum number of worker processes for the preparation stages. Defaults to one per stage.",
+)
+@click.option(
+    "--shard_by",
+    default=None,
+    type=click.Choice(["county"]),
+    help="Build one locator per county in parallel and combine them into a composite locator at --output_locator.",
+)
+@click.option(
+    "--region_groups",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False, readable=True, path_type=str),
+    help='JSON file of shard names to lists of county FIPS codes, e.g. {"bay_area": ["06001", "06075"]}. Implies a sharded build.',
+)
+@click.option(
+    "--shard_manifest",
+    default=None,
+    type=click.Path(dir_okay=False, path_type=str),
+    help="Manifest of shard fingerprints used to rebuild only changed shards. Defaults to manifest.json in the shards folder.",
+)
+@click.option(
+    "--spatial_order",
+    default=None,
+    type=click.Choice(["hilbert", "zorder"]),
+    help="Write the prepared parcels and address points in space-filling curve order so nearby features are stored together.",
+)
+@click.option(
+    "--precision_type",
+    default="GLOBAL_EXTRA_HIGH",
+    show_default=True,
+    type=click.Choice(["GLOBAL_HIGH", "GLOBAL_EXTRA_HIGH", "LOCAL_EXTRA_HIGH"]),
+    help="Precision of the locator's coordinates, passed to CreateLocator.",
+)
+@click.option(
+    "--matrix",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False, readable=True, path_type=str),
+    help="JSON list of variants (a name plus the settings that differ) to build from shared prepared inputs and compare.",
+)
+@click.option(
+    "--sample_addresses",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False, readable=True, path_type=str),
+    help="CSV of addresses (ID, STREET, CITY, STATE, ZIP) used to measure geocode throughput of --matrix variants.",
+)
+@click.option(
+    "--telemetry",
+    "telemetry_path",
+    default=None,
+    type=click.Path(dir_okay=False, path_type=str),
+    help="JSON lines file where build timings are recorded and read back for --dry-run estimates, e.g. ~/.unbox/locator_build_telemetry.jsonl. Nothing is recorded without it.",
+)
+@click.option(
+    "--dry-run",
+    "--dry_run",
+    "dry_run",
+    is_flag=True,
+    default=False,
+    help="Check role tables and mapped fields, report row counts and estimate build time and size without building.",
+)
 @click.option(
     "--config",
     "config_pairs",
@@ -206,6 +295,17 @@ def cli(
     include_parcels: bool,
     parcels_with_addresses: Optional[str],
     temp_gdb: Optional[str],
+    parallel_stages: bool,
+    max_workers: Optional[int],
+    shard_by: Optional[str],
+    region_groups: Optional[str],
+    shard_manifest: Optional[str],
+    spatial_order: Optional[str],
+    precision_type: str,
+    matrix: Optional[str],
+    sample_addresses: Optional[str],
+    telemetry_path: Optional[str],
+    dry_run: bool,
     config_pairs: Tuple[str, ...],
     usage: bool,
 ) -> None:
@@ -224,10 +324,12 @@ def cli(
             "--output must be a file path (e.g., C:\\path\\to\\locator.loc), not a directory."
         )
 
-    _ensure_parent_dir(output_locator)
-
     extra = _normalize_kv_pairs(config_pairs)
 
+    if region_groups:
+        with open(region_groups, "r") as groups_file:
+            region_groups = json.load(groups_file)
+
     cfg = BuildConfig(
         input_gdb=input_gdb,
         output_locator_path=output_locator,
@@ -239,10 +341,24 @@ def cli(
         include_parcels=include_parcels,
         parcels_with_addresses=parcels_with_addresses,
         temp_gdb=temp_gdb,
+        parallel_stages=parallel_stages,
+        max_workers=max_workers,
+        shard_by=shard_by,
+        region_groups=region_groups,
+        shard_manifest=shard_manifest,
+        spatial_order=spatial_order,
+        precision_type=precision_type,
+        telemetry_path=telemetry_path,
         extra=extra,
     )
 
-    main(cfg)
+    if matrix:
+        with open(matrix, "r") as matrix_file:
+            matrix = json.load(matrix_file)
+    if sample_addresses:
+        sample_addresses = build_locator.read_address_corpus(sample_addresses)
+
+    main(cfg, dry_run=dry_run, matrix=matrix, sample_addresses=sample_addresses)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+"""
+bulk_geocode_cli.py
+
+Command line wrapper for geocoding a large CSV or NDJSON file against a locator with a pool of worker processes.
+
+Input files either have an "address" column or our standard input schema (ID, STREET, CITY, STATE, ZIP). Output is
+written in input order and flushed as chunks finish, so an interrupted run can be picked up with --resume.
+"""
+
+from __future__ import annotations
+
+import time
+
+import click
+
+from unbox import bulk_geocode
+from unbox.locator_pool import LocatorPool
+
+
+@click.command()
+@click.option("--locator", "locator_path", required=True, help="Path to the .loc file to geocode against")
+@click.option("--input", "input_path", required=True, help="CSV, or NDJSON with a .ndjson/.jsonl extension")
+@click.option("--output", "output_path", required=True, help="Output file - CSV, or NDJSON with a .ndjson/.jsonl extension")
+@click.option("--workers", default=None, type=int, help="Worker processes. Defaults to the number of CPUs.")
+@click.option("--chunk_size", default=bulk_geocode.DEFAULT_CHUNK_SIZE, type=int, help="Rows sent to a worker at once")
+@click.option("--resume/--no_resume", default=False, help="Append to an existing output file, skipping rows already in it")
+def main(locator_path, input_path, output_path, workers, chunk_size, resume):
+    pool = LocatorPool(locator_path, workers=workers)
+    start = time.perf_counter()
+    try:
+        count = bulk_geocode.geocode_file(input_path, output_path, pool, chunk_size=chunk_size, resume=resume)
+    finally:
+        pool.close()
+    seconds = time.perf_counter() - start
+    print(f"Geocoded {count} rows in {seconds:.1f} seconds ({count / seconds if seconds else 0:.0f} rows/second) to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Times point-in-polygon enrichment of geocode results against the real boundary layers.
+
+Loads whichever layers are given, then annotates batches of made up results at random points inside the layers' extent
+and reports load time per layer and microseconds per result, overall and per layer.
+
+Usage:
+    python scripts/benchmark_enrichment.py --counties TEMP_GDB/counties --cities TEMP_GDB/cities --zip_boundaries TEMP_GDB/zip_boundaries [--block_groups PATH] [--points 100000]
+"""
+import json
+import os
+import sys
+import time
+
+import click
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unbox.enrichment import LAYERS, PolygonEnricher, PolygonLayer, read_polygons
+
+
+@click.command()
+@click.option("--counties", default=None)
+@click.option("--cities", default=None)
+@click.option("--zip_boundaries", default=None)
+@click.option("--block_groups", default=None)
+@click.option("--points", default=100000, type=int)
+@click.option("--batch_size", default=1000, type=int, help="Results per annotate() call, like a /batch request")
+def benchmark(counties, cities, zip_boundaries, block_groups, points, batch_size):
+    sources = {"county_fips": counties, "city_geoid": cities, "zip": zip_boundaries, "block_group": block_groups}
+    layers, report = {}, {"load_seconds": {}, "microseconds_per_result": {}}
+    for field, source in sources.items():
+        if source:
+            start = time.perf_counter()
+            value_field, cell_size = LAYERS[field]
+            layers[field] = PolygonLayer(field, read_polygons(source, value_field), cell_size=cell_size)
+            report["load_seconds"][field] = round(time.perf_counter() - start, 2)
+            report[field] = layers[field].stats()
+    if not layers:
+        raise click.UsageError("Give at least one layer")
+
+    layer = next(iter(layers.values()))
+    rng = np.random.default_rng(0)
+    lons = rng.uniform(layer.x0, layer.x0 + layer.nx * layer.cell_size, points)
+    lats = rng.uniform(layer.y0, layer.y0 + layer.ny * layer.cell_size, points)
+    results = [{"X": float(x), "Y": float(y)} for x, y in zip(lons, lats)]
+
+    for field, single in layers.items():
+        start = time.perf_counter()
+        single.lookup(lons, lats)
+        report["microseconds_per_result"][field] = round((time.perf_counter() - start) / points * 1e6, 2)
+
+    enricher = PolygonEnricher(layers)
+    start = time.perf_counter()
+    for batch in range(0, points, batch_size):
+        enricher.annotate(results[batch:batch + batch_size])
+    report["microseconds_per_result"]["annotate_all_layers"] = round((time.perf_counter() - start) / points * 1e6, 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,70 @@
+"""
+Compares reverse geocoding throughput of the nearest-address KD-tree index against Locator.reverseGeocode.
+
+Points are sampled around real address points (jittered by up to JITTER meters) so both sides see realistic queries.
+Reports points per second for each, how often the index's answer was within the fallback distance, and how often
+its nearest address agrees with the locator's match.
+
+Usage:
+    python scripts/benchmark_reverse_index.py LOCATOR INDEX_FOLDER [--address_points TABLE] [--points 2000] [--jitter 30]
+"""
+import json
+import os
+import sys
+import time
+
+import click
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unbox import reverse_index
+
+
+@click.command()
+@click.argument("locator_path")
+@click.argument("index_folder")
+@click.option("--address_points", default=None, help="Prepared address points table, if the index needs building")
+@click.option("--points", default=2000, type=int)
+@click.option("--jitter", default=30.0, type=float, help="Meters to move sampled points by, at most")
+@click.option("--max_distance", default=50.0, type=float)
+def benchmark(locator_path, index_folder, address_points, points, jitter, max_distance):
+    import arcpy
+    from arcpy.geocoding import Locator
+
+    index = reverse_index.open_or_build(index_folder, address_points)
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, index.count, points)
+    degrees = jitter / 111000
+    lons = index.lon[rows] + rng.uniform(-degrees, degrees, points)
+    lats = index.lat[rows] + rng.uniform(-degrees, degrees, points)
+
+    start = time.perf_counter()
+    index_results = index.results(lons, lats, max_distance)
+    index_seconds = time.perf_counter() - start
+
+    locator = Locator(locator_path)
+    start = time.perf_counter()
+    locator_results = []
+    for lon, lat in zip(lons, lats):
+        location = arcpy.PointGeometry(arcpy.Point(X=float(lon), Y=float(lat)), arcpy.SpatialReference(4326))
+        locator_results.append(locator.reverseGeocode(location=location, forStorage=True))
+    locator_seconds = time.perf_counter() - start
+
+    agree = sum(
+        1 for ours, theirs in zip(index_results, locator_results)
+        if ours and theirs and ours["Match_addr"].split(",")[0].upper() == str(theirs.get("Match_addr", "")).split(",")[0].upper()
+    )
+    within = sum(result is not None for result in index_results)
+    print(json.dumps({
+        "points": points,
+        "index_points_per_second": round(points / index_seconds, 1),
+        "locator_points_per_second": round(points / locator_seconds, 1),
+        "speedup": round(locator_seconds / index_seconds, 1),
+        "within_max_distance": within,
+        "street_line_agreement": round(agree / within, 4) if within else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,75 @@
+"""
+Times serializing a /batch response the old way against projecting to outFields and serializing with
+serialization.dumps.
+
+The old path drops Shape from every candidate, walks the whole response with FastAPI's encoder and serializes every
+field. The new path keeps only the requested fields and serializes with orjson when it's installed (the json module
+otherwise). Candidates are shaped like real /geocode ones, with about 60 attributes.
+
+Usage:
+    python scripts/benchmark_serialization.py [--addresses 500] [--repeat 20] [--out_fields Match_addr,Score,X,Y,Addr_type]
+"""
+import json
+import os
+import sys
+import time
+
+import click
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unbox import serialization
+
+FULL_RESULT = {f"Field{index}": "" for index in range(52)}
+FULL_RESULT.update({"Match_addr": "10860 Gold Center Dr, Rancho Cordova, 95670", "Score": 100, "Addr_type": "PointAddress",
+                    "X": -121.2797034602203, "Y": 38.591489370123995, "Xmin": -121.28, "Xmax": -121.27, "Shape": object()})
+
+
+def _best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@click.command()
+@click.option("--addresses", default=500, type=int, help="Addresses in the batch response")
+@click.option("--repeat", default=20, type=int, help="Runs of each path - the fastest is reported")
+@click.option("--out_fields", default="Match_addr,Score,X,Y,Addr_type")
+def benchmark(addresses, repeat, out_fields):
+    fields = serialization.parse_out_fields(out_fields)
+
+    def batch():
+        return [{"id": str(row), "results": [dict(FULL_RESULT)]} for row in range(addresses)]
+
+    def old_path():
+        rows = batch()
+        for row in rows:
+            row["results"] = [{key: value for key, value in result.items() if key != "Shape"} for result in row["results"]]
+        return JSONResponse(jsonable_encoder(rows)).body
+
+    def new_path():
+        rows = batch()
+        for row in rows:
+            row["results"] = serialization.project(row["results"], fields)
+        return serialization.dumps(rows)
+
+    old_seconds, new_seconds = _best_of(old_path, repeat), _best_of(new_path, repeat)
+    print(json.dumps({
+        "addresses": addresses,
+        "orjson": serialization.orjson is not None,
+        "old_ms": round(old_seconds * 1000, 2),
+        "new_ms": round(new_seconds * 1000, 2),
+        "speedup": round(old_seconds / new_seconds, 1),
+        "old_bytes": len(old_path()),
+        "new_bytes": len(new_path()),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,58 @@
+"""
+Compares a monolithic statewide locator build against a sharded (per-county) build with a composite locator on top.
+
+Reports build time for each, then geocode latency and match rate for both locators on the same sample of addresses.
+A second sharded run is timed too, to show the cost of an incremental build when nothing changed.
+
+Usage:
+    python scripts/benchmark_sharded_locator.py INPUT_GDB OUTPUT_FOLDER SAMPLE_CSV [--tiger PATH] [--cities URL] [--counties URL]
+
+SAMPLE_CSV uses our standard input schema (ID, STREET, CITY, STATE, ZIP).
+"""
+import json
+import os
+import sys
+import time
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unbox import build_locator
+from unbox.build_locator import BuildConfig
+
+
+def timed_build(cfg):
+    start = time.perf_counter()
+    cfg.run_build()
+    return round(time.perf_counter() - start, 1)
+
+
+@click.command()
+@click.argument("input_gdb")
+@click.argument("output_folder")
+@click.argument("sample_csv")
+@click.option("--tiger", default=None)
+@click.option("--cities", default=None)
+@click.option("--counties", default=None)
+@click.option("--max_workers", default=None, type=int)
+def benchmark(input_gdb, output_folder, sample_csv, tiger, cities, counties, max_workers):
+    addresses = build_locator.read_address_corpus(sample_csv)
+    report = {}
+
+    common = dict(input_gdb=input_gdb, tiger=tiger, cities=cities, counties=counties, max_workers=max_workers)
+    monolithic = BuildConfig(output_locator_path=os.path.join(output_folder, "benchmark_monolithic.loc"), **common)
+    sharded_path = os.path.join(output_folder, "benchmark_sharded.loc")
+
+    report["monolithic_build_seconds"] = timed_build(monolithic)
+    report["sharded_build_seconds"] = timed_build(BuildConfig(output_locator_path=sharded_path, shard_by="county", **common))
+    report["sharded_rebuild_unchanged_seconds"] = timed_build(BuildConfig(output_locator_path=sharded_path, shard_by="county", **common))
+
+    report["monolithic_geocode"] = build_locator.geocode_benchmark(monolithic.output_locator_path, addresses)
+    report["sharded_geocode"] = build_locator.geocode_benchmark(sharded_path, addresses)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    benchmark()
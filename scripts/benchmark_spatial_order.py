@@ -0,0 +1,98 @@
+"""
+Benchmarks spatially ordered reference data against source order.
+
+Copies a feature class twice into a scratch GDB - once as-is and once in Hilbert curve order - then times the same
+set of random bounding box queries against each. With --with_locator, it also builds an address point locator from
+the input GDB with and without spatial ordering of the prepared inputs and compares the CreateLocator stage time.
+
+Usage:
+    python scripts/benchmark_spatial_order.py INPUT_GDB OUTPUT_FOLDER [--table Addresses] [--queries 500] [--with_locator]
+"""
+import json
+import os
+import random
+import sys
+import time
+
+import arcpy
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unbox import build_locator
+from unbox import spatial_order
+
+
+def random_boxes(extent, count, fraction, seed=20260201):
+    rng = random.Random(seed)
+    width = (extent.XMax - extent.XMin) * fraction
+    height = (extent.YMax - extent.YMin) * fraction
+    boxes = []
+    for _ in range(count):
+        x = rng.uniform(extent.XMin, extent.XMax - width)
+        y = rng.uniform(extent.YMin, extent.YMax - height)
+        boxes.append(arcpy.Extent(x, y, x + width, y + height).polygon)
+    return boxes
+
+
+def time_queries(features, boxes):
+    rows = 0
+    latencies = []
+    for box in boxes:
+        start = time.perf_counter()
+        with arcpy.da.SearchCursor(features, ["OID@", "SHAPE@XY"], spatial_filter=box) as cursor:
+            rows += sum(1 for _ in cursor)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "queries": len(boxes),
+        "rows": rows,
+        "seconds": round(sum(latencies), 3),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p90_ms": round(latencies[int(len(latencies) * 0.9)] * 1000, 3),
+    }
+
+
+@click.command()
+@click.argument("input_gdb")
+@click.argument("output_folder")
+@click.option("--table", default="Addresses")
+@click.option("--queries", default=500, type=int)
+@click.option("--bbox_fraction", default=0.002, type=float, help="Box width and height as a share of the table extent")
+@click.option("--with_locator", is_flag=True, default=False)
+def benchmark(input_gdb, output_folder, table, queries, bbox_fraction, with_locator):
+    scratch_gdb = build_locator.make_temp_gdb(output_folder, "spatial_order_benchmark.gdb")
+    source = os.path.join(input_gdb, table)
+    unordered = os.path.join(scratch_gdb, f"{table}_source_order")
+    ordered = os.path.join(scratch_gdb, f"{table}_hilbert_order")
+
+    arcpy.management.CopyFeatures(source, unordered)
+    arcpy.management.CopyFeatures(source, f"{ordered}_input")
+    spatial_order.spatially_ordered_copy(f"{ordered}_input", ordered, curve="hilbert", delete_input=True)
+    for features in (unordered, ordered):
+        arcpy.management.AddSpatialIndex(features, 0, 0, 0)
+
+    boxes = random_boxes(arcpy.Describe(source).extent, queries, bbox_fraction)
+    time_queries(unordered, boxes[:10])  # warm up the file cache for both before timing
+    time_queries(ordered, boxes[:10])
+    report = {
+        "bbox_source_order": time_queries(unordered, boxes),
+        "bbox_hilbert_order": time_queries(ordered, boxes),
+    }
+
+    if with_locator:
+        for curve in (None, "hilbert"):
+            results = build_locator.make_locator(
+                input_gdb,
+                os.path.join(output_folder, f"benchmark_locator_{curve or 'source_order'}.loc"),
+                include_parcels=False,
+                spatial_order=curve,
+            )
+            report[f"create_locator_seconds_{curve or 'source_order'}"] = round(results["create_locator"].duration, 1)
+            report[f"prepare_addresses_seconds_{curve or 'source_order'}"] = round(results["prepare_addresses"].duration, 1)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    benchmark()
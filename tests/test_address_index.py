@@ -0,0 +1,97 @@
+import arcpy
+
+from unbox import address_index
+
+POINTS = [
+    # house_number, address, unit, city, state, ZIP5, address_lid, SHAPE@XY
+    ("10860", "10860 GOLD CENTER DR", None, "RANCHO CORDOVA", "CA", "95670", 101, (-121.2797, 38.5915)),
+    ("1315", "10TH ST", None, "SACRAMENTO", "CA", "95814", 102, (-121.4936, 38.5767)),
+    # two points for the same address without units - ambiguous, so it shouldn't be indexed
+    ("500", "500 CAPITOL MALL", None, "SACRAMENTO", "CA", "95814", 103, (-121.5021, 38.5776)),
+    ("500", "500 CAPITOL MALL", None, "SACRAMENTO", "CA", "95814", 104, (-121.5030, 38.5780)),
+]
+
+
+class _Cursor:
+    def __init__(self, table, fields, spatial_reference=None):
+        assert fields == address_index.INDEX_FIELDS
+
+    def __enter__(self):
+        return iter(POINTS)
+
+    def __exit__(self, *args):
+        pass
+
+
+def test_exact_matches_come_from_the_index(monkeypatch, tmp_path):
+    monkeypatch.setattr(arcpy.da, "SearchCursor", _Cursor, raising=False)
+    monkeypatch.setattr(arcpy, "SpatialReference", lambda wkid: wkid, raising=False)
+    folder = str(tmp_path / "address_index")
+    meta = address_index.build_address_index("address_points", folder)
+    assert meta["points"] == 4
+    assert meta["ambiguous_keys_dropped"] == 2  # with and without ZIP
+
+    index = address_index.AddressIndex(folder)
+    match = index.lookup("10860 Gold Center Drive, Rancho Cordova, CA 95670-1234")
+    assert match["Addr_type"] == "PointAddress"
+    assert match["address_lid"] == 101
+    assert (match["X"], match["Y"]) == (-121.2797, 38.5915)
+    assert index.lookup("1315 10th Street, Sacramento, California")["Match_addr"] == "1315 10TH ST, SACRAMENTO, 95814"
+    assert index.lookup("500 Capitol Mall, Sacramento, CA 95814") is None
+    assert index.lookup("1 Nowhere Rd, Sacramento, CA") is None
+    assert index.stats()["hit_rate"] == 0.5
+
+
+def test_shim_uses_the_index_only_for_single_candidates_it_can_fill(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    from unbox import locator_api_dev_shim as shim
+    from unbox.admission import LocatorSlots
+
+    class _Locator:
+        calls = 0
+
+        def geocode(self, address, for_storage, maxResults=1):
+            self.calls += 1
+            return [{"Match_addr": address, "Rank": 20}] * maxResults
+
+    monkeypatch.setattr(arcpy.da, "SearchCursor", _Cursor, raising=False)
+    monkeypatch.setattr(arcpy, "SpatialReference", lambda wkid: wkid, raising=False)
+    folder = str(tmp_path / "address_index")
+    address_index.build_address_index("address_points", folder)
+    locator = _Locator()
+    monkeypatch.setattr(shim, "ADDRESS_INDEX", address_index.AddressIndex(folder))
+    monkeypatch.setattr(shim, "LOCATOR_SLOTS", LocatorSlots([locator]))
+    shim.RESULT_CACHE.invalidate("index-test")
+    client = TestClient(shim.app)
+    address = "1315 10th Street, Sacramento, CA 95814"
+
+    single = {"address": address, "max_locations": 1}
+    assert client.get("/geocode", params=single).json()["results"][0]["address_lid"] == 102
+    assert client.get("/geocode", params={**single, "outFields": "match_addr,X,Y"}).json()["results"][0]["X"] == -121.4936
+    assert locator.calls == 0
+    assert len(client.get("/geocode", params={"address": address, "max_locations": 3}).json()["results"]) == 3
+    assert client.get("/geocode", params={**single, "outFields": "Match_addr,Rank"}).json()["results"][0]["Rank"] == 20
+    assert locator.calls == 2
+
+
+def test_city_directional_doesnt_match_a_street_directional(monkeypatch, tmp_path):
+    points = [
+        ("123", "123 MAIN ST", None, "WEST SACRAMENTO", "CA", "95691", 201, (-121.53, 38.58)),
+        ("400", "400 GRAND AVENUE SOUTH", None, "SAN FRANCISCO", "CA", "94080", 202, (-122.41, 37.65)),
+    ]
+
+    class _OtherCursor(_Cursor):
+        def __enter__(self):
+            return iter(points)
+
+    monkeypatch.setattr(arcpy.da, "SearchCursor", _OtherCursor, raising=False)
+    monkeypatch.setattr(arcpy, "SpatialReference", lambda wkid: wkid, raising=False)
+    folder = str(tmp_path / "address_index")
+    address_index.build_address_index("address_points", folder)
+    index = address_index.AddressIndex(folder)
+
+    assert index.lookup("123 Main St, West Sacramento, CA 95691")["address_lid"] == 201
+    assert index.lookup("123 Main St W, Sacramento, CA 95691") is None
+    assert index.lookup("400 Grand Ave S, San Francisco, CA 94080")["address_lid"] == 202
+    assert index.lookup("400 Grand Ave, South San Francisco, CA 94080") is None
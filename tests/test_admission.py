@@ -0,0 +1,44 @@
+import threading
+import time
+
+import pytest
+
+from unbox.admission import LocatorSlots, Overloaded
+
+
+def test_waiting_request_gets_the_freed_instance():
+    slots = LocatorSlots(["locator"], max_queue=1, queue_timeout=2)
+    acquired = []
+
+    def waiter():
+        with slots.acquire() as (locator, waited):
+            acquired.append((locator, waited))
+
+    with slots.acquire():
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.2)
+        assert slots.stats()["queued"] == 1
+    thread.join()
+
+    assert acquired[0][0] == "locator"
+    assert acquired[0][1] >= 0.15  # queue wait is recorded apart from time in the locator
+    assert slots.stats()["admitted"] == 2
+
+
+def test_full_queue_and_timeout_are_rejected():
+    slots = LocatorSlots(["locator"], max_queue=0, queue_timeout=0.1)
+    with slots.acquire():
+        with pytest.raises(Overloaded):
+            with slots.acquire():
+                pass
+
+    slots.max_queue = 1
+    with slots.acquire():
+        with pytest.raises(Overloaded) as error:
+            with slots.acquire():
+                pass
+    assert error.value.retry_after >= 1
+
+    stats = slots.stats()
+    assert (stats["rejected_queue_full"], stats["rejected_timeout"], stats["in_flight"]) == (1, 1, 0)
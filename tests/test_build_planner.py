@@ -0,0 +1,41 @@
+import json
+
+from unbox import build_planner
+
+
+def _write_runs(path, runs):
+    with open(path, "w") as telemetry_file:
+        for run in runs:
+            telemetry_file.write(json.dumps(run) + "\n")
+        telemetry_file.write('{"partial": ')  # interrupted write shouldn't break reading
+
+
+def test_estimate_prefers_runs_with_same_roles(tmp_path):
+    telemetry = str(tmp_path / "telemetry.jsonl")
+    _write_runs(telemetry, [
+        {"row_counts": {"PointAddress": 100, "Parcel": 100}, "total_rows": 200, "seconds": 400, "locator_bytes": 2000},
+        {"row_counts": {"StreetAddress": 100}, "total_rows": 100, "seconds": 10, "locator_bytes": 100},
+    ])
+
+    estimate = build_planner.estimate_build({"PointAddress": 300, "Parcel": 100}, telemetry)
+    assert estimate["runs_used"] == 1
+    assert estimate["seconds"] == 800
+    assert estimate["locator_bytes"] == 4000
+
+
+def test_estimate_without_telemetry(tmp_path):
+    assert build_planner.estimate_build({"PointAddress": 1}, str(tmp_path / "missing.jsonl")) is None
+
+
+def test_row_counts_for_telemetry_skip_remote_layers(monkeypatch):
+    from unbox.build_locator import BuildConfig
+
+    def no_sign_in(*args, **kwargs):
+        raise AssertionError("row counts shouldn't sign in to the portal")
+
+    monkeypatch.setattr(build_planner.arcgis, "GIS", no_sign_in, raising=False)
+    monkeypatch.setattr(build_planner, "_read_metadata", lambda source: ({}, 10))
+    cfg = BuildConfig(input_gdb="input.gdb", output_locator_path="out.loc", tiger="tiger.gdb/edges",
+                      cities="https://services.arcgis.com/cities/FeatureServer/0")
+    assert build_planner.role_row_counts(cfg) == {"PointAddress": 10, "Parcel": 10, "StreetAddress": 10}
+    assert cfg.telemetry_path is None
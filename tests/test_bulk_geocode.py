@@ -0,0 +1,80 @@
+import csv
+
+from concurrent.futures import Future
+
+import pytest
+from fastapi.testclient import TestClient
+
+from unbox import bulk_geocode
+from unbox import locator_api_dev_shim as shim
+
+
+class _InlinePool:
+    """Stands in for LocatorPool - geocodes each chunk right away in this process"""
+    workers = 2
+
+    def __init__(self):
+        self.chunks = 0
+
+    def submit(self, addresses, max_locations=1, out_fields=None):
+        self.chunks += 1
+        future = Future()
+        future.set_result([
+            {"results": [{"Match_addr": address.upper(), "Score": 100, "X": -121.5, "Y": 38.5}]} if "NOWHERE" not in address else {"results": []}
+            for address in addresses
+        ])
+        return future
+
+
+def _write_input(path, count):
+    with open(path, "w") as input_file:
+        input_file.write("ID,STREET,CITY,STATE,ZIP\n")
+        for row in range(count):
+            input_file.write(f"r{row},{row} Main St,{'NOWHERE' if row == 3 else 'Sacramento'},CA,95814\n")
+
+
+def test_geocode_file_keeps_order_and_resumes(tmp_path):
+    input_path, output_path = str(tmp_path / "in.csv"), str(tmp_path / "out.csv")
+    _write_input(input_path, 25)
+    pool = _InlinePool()
+
+    assert bulk_geocode.geocode_file(input_path, output_path, pool, chunk_size=4) == 25
+    with open(output_path) as output_file:
+        lines = output_file.read().splitlines()
+    assert lines[0] == ",".join(bulk_geocode.OUTPUT_FIELDS)
+    rows = list(csv.reader(lines[1:]))
+    assert [row[0] for row in rows] == [f"r{row}" for row in range(25)]
+    assert rows[3][2] == "U"
+
+    # simulate a run killed partway through writing row r10
+    with open(output_path, "w") as output_file:
+        output_file.write("\n".join(lines[:11]) + "\nr10,10 Ma")
+    assert bulk_geocode.geocode_file(input_path, output_path, pool, chunk_size=4, resume=True) == 15
+    with open(output_path) as output_file:
+        assert output_file.read().splitlines() == lines
+
+
+def test_bulk_endpoint_streams_ndjson(monkeypatch):
+    monkeypatch.setattr(shim, "_batch_pool", lambda: _InlinePool())
+    body = "".join(f'{{"id": {row}, "address": "{row} Main St"}}\n' for row in range(10))
+    response = TestClient(shim.app).post("/bulk", params={"format": "ndjson", "resume_after": "2", "chunk_size": 3}, content=body)
+
+    assert response.status_code == 200
+    rows = [line for line in response.text.splitlines() if line]
+    assert [bulk_geocode.json.loads(line)["id"] for line in rows] == [str(row) for row in range(3, 10)]
+
+
+def test_resume_id_missing_from_input_is_an_error(monkeypatch):
+    rows = [{"id": str(row), "address": f"{row} Main St"} for row in range(5)]
+    assert [row["id"] for row in bulk_geocode.skip_completed(rows, "2")] == ["3", "4"]
+    with pytest.raises(ValueError):
+        list(bulk_geocode.skip_completed(rows, "99"))
+
+    monkeypatch.setattr(shim, "_batch_pool", lambda: _InlinePool())
+    body = "".join(f'{{"id": {row}, "address": "{row} Main St"}}\n' for row in range(5))
+    client = TestClient(shim.app)
+    response = client.post("/bulk", params={"format": "ndjson", "resume_after": "99"}, content=body)
+    assert response.status_code == 400 and "99" in response.json()["detail"]
+    # resuming after the last row leaves nothing to do, which isn't an error
+    response = client.post("/bulk", params={"format": "ndjson", "resume_after": "4"}, content=body)
+    assert response.status_code == 200 and response.text == ""
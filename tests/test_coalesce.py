@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+from unbox import locator_api_dev_shim as shim
+from unbox.admission import LocatorSlots
+from unbox.coalesce import SingleFlight
+from unbox.stub_locator import StubLocator
+
+
+def test_concurrent_calls_share_one_result():
+    flights = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait()
+        return {"Match_addr": "1 MAIN ST"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("1 MAIN ST", slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flights.stats()["calls_saved"] < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 5 and all(result is results[0] for result in results)
+    assert flights.stats() == {"calls": 1, "calls_saved": 4, "in_flight": 0, "saved_rate": 0.8}
+    flights.do("1 MAIN ST", lambda: None)  # finished calls aren't reused
+    assert flights.stats()["calls"] == 2
+
+
+def test_errors_reach_every_waiter():
+    flights = SingleFlight()
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("locator broke")
+
+    errors = []
+
+    def call():
+        try:
+            flights.do("key", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    leader.join()
+    follower.join()
+    assert errors == ["locator broke", "locator broke"]
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/geocode", {"address": "77 Herd St, Sacramento", "max_locations": 1}),
+    ("/reverse", {"lon": -121.45, "lat": 38.55}),
+])
+def test_shim_coalesces_a_thundering_herd(monkeypatch, path, params):
+    locator = StubLocator(latency=0.3)
+    monkeypatch.setattr(shim, "LOCATOR_SLOTS", LocatorSlots([locator, StubLocator(latency=0.3)]))
+    monkeypatch.setattr(shim, "REVERSE_INDEX", None)
+    shim.RESULT_CACHE.invalidate("test")
+    shim.REVERSE_CACHE.invalidate("test")
+    client = TestClient(shim.app)
+
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(client.get(path, params=params))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [response.status_code for response in responses] == [200] * 8
+    assert len({response.content for response in responses}) == 1
+    assert locator.calls + shim.LOCATOR_SLOTS.locators[1].calls == 1
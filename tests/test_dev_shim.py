@@ -0,0 +1,93 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from unbox import locator_api_dev_shim as shim
+from unbox.admission import LocatorSlots
+
+
+class _CountingLocator:
+    def __init__(self):
+        self.calls = 0
+
+    def geocode(self, address, for_storage, maxResults=1):
+        self.calls += 1
+        return [{"Match_addr": address.upper(), "Score": 100}]
+
+
+def test_ready_only_after_warm_up(monkeypatch):
+    locator = _CountingLocator()
+    monkeypatch.setattr(shim, "LOCATOR", locator)
+    monkeypatch.setattr(shim, "LOCATOR_SLOTS", LocatorSlots([locator]))
+    monkeypatch.setattr(shim, "READY", False)
+    client = TestClient(shim.app)
+
+    assert client.get("/ready").status_code == 503
+    shim.warm_up(["1 Main St", "2 Main St"])
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["warmup"]["queries"] == 2
+    assert locator.calls == 2
+
+
+def test_geocode_served_from_cache(monkeypatch):
+    locator = _CountingLocator()
+    monkeypatch.setattr(shim, "LOCATOR_SLOTS", LocatorSlots([locator]))
+    shim.RESULT_CACHE.invalidate("test")
+    client = TestClient(shim.app)
+
+    first = client.get("/geocode", params={"address": "10 Main Street", "max_locations": 1}).json()
+    second = client.get("/geocode", params={"address": "10 MAIN ST.", "max_locations": 1}).json()
+    assert first["results"] == second["results"]
+    assert second["input"]["address"] == "10 MAIN ST."
+    assert locator.calls == 1
+
+
+def test_overloaded_requests_get_retry_after(monkeypatch):
+    slots = LocatorSlots([_CountingLocator()], max_queue=0)
+    monkeypatch.setattr(shim, "LOCATOR_SLOTS", slots)
+    shim.RESULT_CACHE.invalidate("test")
+    client = TestClient(shim.app)
+
+    with slots.acquire():  # the only instance is busy and nobody may queue
+        response = client.get("/geocode", params={"address": "1 Busy St"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert slots.stats()["rejected_queue_full"] == 1
+
+
+def test_metrics_split_phases(monkeypatch):
+    locator = _CountingLocator()
+    monkeypatch.setattr(shim, "LOCATOR_SLOTS", LocatorSlots([locator]))
+    shim.RESULT_CACHE.invalidate("test")
+    client = TestClient(shim.app)
+
+    response = client.get("/geocode", params={"address": "5 Timing Way"})
+    phases = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+    assert phases == ["queue", "locator", "serialize", "total"]
+
+    text = client.get("/metrics").text
+    assert 'unbox_request_duration_seconds_count{endpoint="/geocode",phase="locator"}' in text
+    assert 'unbox_requests_total{endpoint="/geocode",status="200"}' in text
+    assert 'unbox_cache_misses_total{cache="geocode"}' in text
+
+
+def test_concurrent_first_batch_requests_share_one_pool(monkeypatch):
+    created = []
+
+    class _SlowPool:
+        def __init__(self, path, workers=None):
+            time.sleep(0.1)  # starting workers takes a while
+            created.append(self)
+
+    monkeypatch.setattr(shim, "LocatorPool", _SlowPool)
+    monkeypatch.setattr(shim, "BATCH_POOL", None)
+    monkeypatch.setattr(shim, "ACTIVE_LOCATOR_PATH", "statewide.loc")
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(shim._batch_pool())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1 and all(pool is created[0] for pool in pools)
@@ -0,0 +1,81 @@
+import numpy as np
+
+from fastapi.testclient import TestClient
+
+from unbox import locator_api_dev_shim as shim
+from unbox.admission import LocatorSlots
+from unbox.enrichment import PolygonEnricher, PolygonLayer
+from unbox.stub_locator import StubLocator
+
+
+def _square(x, y, half):
+    return np.array([(x - half, y - half), (x + half, y - half), (x + half, y + half), (x - half, y + half)])
+
+
+def _lattice(count=12, step=0.05, seed=0):
+    """Non-overlapping quads with jittered, shared corners and densified edges, like a set of boundaries would have"""
+    rng = np.random.default_rng(seed)
+    xs = -122 + np.arange(count + 1)[:, None] * step + rng.uniform(-0.4, 0.4, (count + 1, count + 1)) * step
+    ys = 37 + np.arange(count + 1)[None, :] * step + rng.uniform(-0.4, 0.4, (count + 1, count + 1)) * step
+    polygons = []
+    for i in range(count):
+        for j in range(count):
+            corners = np.array([(xs[i, j], ys[i, j]), (xs[i + 1, j], ys[i + 1, j]), (xs[i + 1, j + 1], ys[i + 1, j + 1]), (xs[i, j + 1], ys[i, j + 1])])
+            ring = np.vstack([np.linspace(corners[k], corners[(k + 1) % 4], 8, endpoint=False) for k in range(4)])
+            polygons.append((f"{i:02d}{j:02d}", [ring]))
+    return polygons
+
+
+def _brute_force(polygons, lons, lats):
+    found = np.full(len(lons), -1)
+    for index, (_, rings) in enumerate(polygons):
+        inside = np.zeros(len(lons), dtype=bool)
+        for ring in rings:
+            for (x1, y1), (x2, y2) in zip(ring, np.roll(ring, -1, axis=0)):
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    inside ^= ((y1 > lats) != (y2 > lats)) & (x1 + (lats - y1) * (x2 - x1) / (y2 - y1) > lons)
+        found[inside] = index
+    return found
+
+
+def test_lookup_matches_brute_force_ray_casting():
+    polygons = _lattice()[:-3]  # leave a gap
+    polygons.append(("donut", [_square(-121.0, 37.5, 0.1), _square(-121.0, 37.5, 0.04)]))
+    polygons.append(("island", [_square(-121.0, 37.5, 0.04)]))
+    polygons.append(("two_parts", [_square(-120.7, 37.2, 0.02), _square(-120.6, 37.2, 0.02)]))
+    layer = PolygonLayer("test", polygons, cell_size=0.02)
+
+    rng = np.random.default_rng(1)
+    lons, lats = rng.uniform(-122.1, -120.5, 20000), rng.uniform(36.9, 37.7, 20000)
+    found = layer.lookup(lons, lats)
+    assert (found == _brute_force(polygons, lons, lats)).all()
+    assert layer.values[layer.lookup(-121.0, 37.5)[0]] == "island"
+    assert layer.values[layer.lookup(-121.0, 37.43)[0]] == "donut"
+    assert layer.lookup(-100.0, 37.5)[0] == -1
+
+
+def test_annotate_copies_results():
+    enricher = PolygonEnricher({"county_fips": PolygonLayer("county_fips", _lattice(60, step=0.02), cell_size=0.01)})
+    rng = np.random.default_rng(2)
+    results = [{"Match_addr": str(i), "X": x, "Y": y} for i, (x, y) in enumerate(zip(rng.uniform(-122, -120.9, 20000), rng.uniform(37, 38.1, 20000)))]
+    results.append({"Match_addr": "no location"})
+
+    annotated = enricher.annotate(results)
+    assert "county_fips" not in results[0]
+    assert annotated[0]["county_fips"] is not None
+    assert annotated[-1] == {"Match_addr": "no location"}
+
+
+def test_geocode_results_are_enriched(monkeypatch):
+    locator = StubLocator(latency=0)
+    x, y = locator.geocode("5 Enrich Way")[0]["X"], locator.geocode("5 Enrich Way")[0]["Y"]
+    layer = PolygonLayer("county_fips", [("06067", [_square(x, y, 0.01)])])
+    monkeypatch.setattr(shim, "ENRICHER", PolygonEnricher({"county_fips": layer}))
+    monkeypatch.setattr(shim, "LOCATOR_SLOTS", LocatorSlots([locator]))
+    shim.RESULT_CACHE.invalidate("test")
+    client = TestClient(shim.app)
+
+    body = client.get("/geocode", params={"address": "5 Enrich Way", "max_locations": 1, "outFields": "Match_addr,county_fips"}).json()
+    assert body["results"] == [{"Match_addr": "5 ENRICH WAY", "county_fips": "06067"}]
+    found, cached = shim.RESULT_CACHE.get(("5 ENRICH WAY", 1))
+    assert found and "county_fips" not in cached[0]  # the cache keeps plain locator results
@@ -0,0 +1,90 @@
+from unbox.address_normalize import normalize_address
+from unbox.geocode_cache import ResultCache, ReverseCache, grid_cell
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalized_addresses_match():
+    assert normalize_address("10860 Gold Center Drive, Rancho Cordova") == normalize_address("10860  GOLD CENTER DR. rancho cordova")
+    assert normalize_address("123 North Main Street, Apt #4") == "123 N MAIN ST APT 4"
+    assert normalize_address("12-B Elm Ave") == "12-B ELM AVE"
+    assert normalize_address("500 Park Place Way, Sacramento, California 95814") == "500 PARK PLACE WAY SACRAMENTO CA 95814"
+    assert normalize_address("9 Main Street South, Suite 2") == "9 MAIN ST S STE 2"
+
+
+def test_street_names_arent_abbreviated():
+    # a street named North isn't N Street
+    assert normalize_address("123 North St") == "123 NORTH ST"
+    assert normalize_address("123 N St") == "123 N ST"
+    assert normalize_address("123 North Street, Sacramento") != normalize_address("123 N Street, Sacramento")
+    assert normalize_address("123 N Court St") == normalize_address("123 North Court Street") == "123 N COURT ST"
+    assert normalize_address("45 Court Street") == "45 COURT ST"
+    assert normalize_address("1 California Ave, Los Angeles, CA") == "1 CALIFORNIA AVE LOS ANGELES CA"
+
+
+def test_city_directionals_arent_street_directionals():
+    # the city starting with a directional mustn't turn into the street's post-directional
+    for street_directional, city_directional in (
+        ("123 Main St W, Sacramento, CA", "123 Main St, West Sacramento, CA"),
+        ("400 Grand Ave S, San Francisco, CA 94080", "400 Grand Ave, South San Francisco, CA 94080"),
+        ("10 Oak Rd N, Highlands", "10 Oak Rd, North Highlands"),
+    ):
+        assert normalize_address(street_directional) != normalize_address(city_directional)
+    assert normalize_address("123 Main Street West, Sacramento") == normalize_address("123 MAIN ST W SACRAMENTO")
+    assert normalize_address("123 Main St West Sacramento") == normalize_address("123 Main St, West Sacramento")
+    assert normalize_address("9 Main St North Apt 2, Fresno") == "9 MAIN ST N APT 2 FRESNO"
+
+
+def test_lru_eviction_and_ttl():
+    clock = _Clock()
+    cache = ResultCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == (True, 1)  # a is now more recently used than b
+    cache.put("c", 3)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    clock.now = 11
+    assert cache.get("c") == (False, None)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (2, 2, 1, 1)
+
+
+def test_disk_tier_survives_restart_and_respects_locator_version(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first = ResultCache(disk_path=path)
+    first.invalidate("locator-v1")
+    first.put(("1 MAIN ST", 1), [{"Score": 100}])
+
+    second = ResultCache(disk_path=path)  # a restarted worker
+    second.invalidate("locator-v1")
+    assert second.get(("1 MAIN ST", 1)) == (True, [{"Score": 100}])
+    assert second.stats()["disk_hits"] == 1
+
+    second.invalidate("locator-v2")
+    assert second.get(("1 MAIN ST", 1)) == (False, None)
+
+
+def test_reverse_cache_checks_tolerance():
+    cache = ReverseCache(cell_meters=100, tolerance_meters=20)
+    match = {"Match_addr": "1 Main St", "X": -121.50000, "Y": 38.50000}
+    cache.put(-121.50001, 38.50001, None, match)
+
+    # about 1.4 m from the match, in the same cell
+    assert cache.get(-121.500005, 38.500005) == (True, match)
+    # same cell, but about 70 m from the match
+    assert grid_cell(-121.50060, 38.50040, 100) == grid_cell(-121.50001, 38.50001, 100)
+    assert cache.get(-121.50060, 38.50040) == (False, None)
+    # a different search distance is a different key
+    assert cache.get(-121.500005, 38.500005, distance=50) == (False, None)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["tolerance_rejections"]) == (1, 2, 1)
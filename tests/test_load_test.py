@@ -0,0 +1,65 @@
+import pytest
+
+from unbox import load_test
+from unbox import locator_api_dev_shim as shim
+from unbox.stub_locator import StubLocator
+
+
+def test_stub_locator_from_path():
+    locator = StubLocator.from_path("stub:latency=0,jitter=0,error_rate=0")
+    first = locator.geocode("10 Main Street, Sacramento", True, maxResults=2)
+    assert len(first) == 2
+    assert first == locator.geocode("10 MAIN ST SACRAMENTO", True, maxResults=2)
+    assert locator.reverseGeocode((-121.5, 38.5))["Match_addr"].endswith("STUB ST")
+    assert locator.calls == 3
+    with pytest.raises(RuntimeError):
+        StubLocator(latency=0, error_rate=1).geocode("1 Main St")
+
+
+def test_build_requests_for_each_endpoint():
+    records = load_test.synthetic_corpus(250)
+    assert len(load_test.build_requests(records, "geocode")) == 250
+    assert load_test.build_requests(records, "reverse")[0][1].startswith("/reverse?lon=")
+    batches = load_test.build_requests(records, "batch", batch_size=100)
+    assert [items for _, _, _, items in batches] == [100, 100, 50]
+    assert load_test.build_requests(records, "reverse_batch", batch_size=100)[0][1] == "/reverse/batch"
+
+
+@pytest.fixture
+def stub_shim(monkeypatch):
+    for name in ("LOCATOR", "LOCATOR_SLOTS", "ACTIVE_LOCATOR_PATH", "READY", "MAX_IN_FLIGHT", "MAX_QUEUE", "REVERSE_INDEX"):
+        monkeypatch.setattr(shim, name, getattr(shim, name))
+    shim.REVERSE_INDEX = None
+    servers = []
+
+    def start(**kwargs):
+        server, url = load_test.start_stub_shim(**kwargs)
+        servers.append(server)
+        return url
+
+    yield start
+    for server in servers:
+        server.should_exit = True
+
+
+def test_closed_loop_and_fixed_rate_reports(stub_shim):
+    url = stub_shim(latency=0.002, max_in_flight=4)
+    records = load_test.synthetic_corpus(200)
+
+    report = load_test.run_load_test(url, load_test.build_requests(records, "geocode"), duration=1, concurrency=4)
+    assert report["requests"] > 20
+    assert report["error_rate"] == 0
+    assert report["latency_ms"]["p50"] <= report["latency_ms"]["p99"]
+
+    report = load_test.run_load_test(url, load_test.build_requests(records, "reverse"), duration=1, concurrency=4, rate=50)
+    assert report["settings"]["mode"] == "fixed_rate"
+    assert 40 <= report["requests"] <= 50
+    assert report["status_counts"] == {"200": report["requests"]}
+
+
+def test_admission_control_sheds_load_under_the_harness(stub_shim):
+    url = stub_shim(latency=0.05, max_in_flight=1, max_queue=0)
+    requests = load_test.build_requests(load_test.synthetic_corpus(500, seed=1), "geocode")
+    report = load_test.run_load_test(url, requests, duration=1, concurrency=8)
+    assert report["status_counts"].get("503", 0) > 0
+    assert report["errors"] == report["status_counts"]["503"]
@@ -0,0 +1,49 @@
+import pytest
+
+from unbox import locator_matrix
+from unbox.build_locator import BuildConfig
+
+CITIES = "https://example.com/arcgis/rest/services/cities/FeatureServer/2"
+
+
+def _base():
+    return BuildConfig(input_gdb="input.gdb", output_locator_path="out/base.loc", cities=CITIES, tiger="tiger_address_range_2025")
+
+
+def test_variant_configs_apply_overrides():
+    configs = locator_matrix.variant_configs(_base(), [
+        {"name": "full"},
+        {"name": "no_tiger", "tiger": None},
+        {"name": "global_high", "precision_type": "GLOBAL_HIGH"},
+    ], "out")
+
+    assert configs["full"].tiger == "tiger_address_range_2025"
+    assert configs["no_tiger"].tiger is None
+    assert configs["no_tiger"].cities == CITIES
+    assert configs["global_high"].precision_type == "GLOBAL_HIGH"
+    assert configs["global_high"].output_locator_path.endswith("global_high.loc")
+
+
+@pytest.mark.parametrize("variant", [
+    {"tiger": None},  # no name
+    {"name": "bad", "input_gdb": "other.gdb"},  # not a variant field
+    {"name": "other_url", "cities": "https://example.com/other/FeatureServer/0"},
+])
+def test_variant_configs_reject_invalid_variants(variant):
+    with pytest.raises(ValueError):
+        locator_matrix.variant_configs(_base(), [variant], "out")
+
+
+def test_variant_inputs_use_shared_prepared_data():
+    base = _base()
+    configs = locator_matrix.variant_configs(base, [{"name": "no_cities", "cities": None}, {"name": "full"}], "out")
+    prepared = {
+        "download_remote": ("temp.gdb/cities", None, None),
+        "prepare_parcels": "temp.gdb/parcels_with_addresses",
+        "prepare_addresses": "temp.gdb/address_points",
+    }
+
+    full = locator_matrix._variant_inputs(configs["full"], prepared, base)
+    assert full["cities"] == "temp.gdb/cities"
+    assert full["addresses"] == "temp.gdb/address_points"
+    assert locator_matrix._variant_inputs(configs["no_cities"], prepared, base)["cities"] is None
@@ -0,0 +1,29 @@
+from unbox import locator_pool
+
+
+class _EchoLocator:
+    def geocode(self, address, for_storage, maxResults=1):
+        if address == "fail":
+            raise ValueError("bad address")
+        return [{"Match_addr": address, "Shape": object()}][:maxResults]
+
+
+def test_chunk_keeps_order_and_isolates_errors(monkeypatch):
+    """
+    A failed address should only fail itself, and geometries shouldn't come back from workers
+    """
+    monkeypatch.setattr(locator_pool, "_WORKER_LOCATOR", _EchoLocator())
+    output = locator_pool._geocode_chunk(["1 Main St", "fail", "2 Main St"], 1)
+
+    assert output[0] == {"results": [{"Match_addr": "1 Main St"}]}
+    assert "bad address" in output[1]["error"]
+    assert output[2] == {"results": [{"Match_addr": "2 Main St"}]}
+
+
+def test_chunk_size_spreads_work():
+    pool = locator_pool.LocatorPool.__new__(locator_pool.LocatorPool)  # no worker processes needed
+    pool.workers, pool.max_chunk_size = 4, 250
+
+    assert pool.chunk_size(1) == 1
+    assert pool.chunk_size(160) == 10  # about four chunks per worker
+    assert pool.chunk_size(1000000) == 250
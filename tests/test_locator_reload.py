@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from unbox import locator_api_dev_shim as shim
+from unbox import locator_reload
+from unbox.admission import LocatorSlots
+
+
+class _NamedLocator:
+    def __init__(self, path):
+        self.path = path
+
+    def geocode(self, address, for_storage, maxResults=1):
+        return [{"Match_addr": address, "Locator": self.path}]
+
+
+def test_swap_waits_for_old_requests_and_flushes_cache(monkeypatch, tmp_path):
+    new_path = tmp_path / "weekly.loc"
+    new_path.write_text("locator")
+    old = LocatorSlots([_NamedLocator("old")])
+    monkeypatch.setattr(shim, "Locator", _NamedLocator)
+    monkeypatch.setattr(shim, "check_memory_headroom", lambda *args, **kwargs: None)
+    monkeypatch.setattr(shim, "LOCATOR_SLOTS", old)
+    for name in ("BATCH_POOL", "LOCATOR", "ACTIVE_LOCATOR_PATH", "LOCATOR_LOADED_AT", "LAST_RELOAD"):
+        monkeypatch.setattr(shim, name, getattr(shim, name))  # put back whatever the swap changes
+    monkeypatch.setattr(shim, "WARMUP_ADDRESSES", ["1 Main St"])
+    monkeypatch.setattr(shim, "ADMIN_TOKEN", "secret")
+    shim.RESULT_CACHE.invalidate("old-version")
+    client = TestClient(shim.app)
+    assert client.get("/geocode", params={"address": "9 Swap St"}).json()["results"][0]["Locator"] == "old"
+
+    responses = []
+    with old.acquire():  # a request still running on the old locator
+        reload = threading.Thread(target=lambda: responses.append(
+            client.post("/admin/reload", params={"path": str(new_path)}, headers={"X-Admin-Token": "secret"})
+        ))
+        reload.start()
+        time.sleep(0.3)
+        assert reload.is_alive()  # draining
+        # new requests already go to the new locator, and the old cached result is gone
+        assert client.get("/geocode", params={"address": "9 Swap St"}).json()["results"][0]["Locator"] == str(new_path)
+    reload.join()
+
+    assert responses[0].status_code == 200
+    assert responses[0].json()["drained"] is True
+    assert client.post("/admin/reload", params={"path": str(new_path)}).status_code == 403
+
+
+def test_memory_check_refuses_when_short(monkeypatch, tmp_path):
+    locator = tmp_path / "big.loc"
+    locator.write_bytes(b"x" * 1024)
+    monkeypatch.setattr(locator_reload, "available_memory_bytes", lambda: 1000)
+    with pytest.raises(MemoryError):
+        locator_reload.check_memory_headroom(str(locator), instances=2, reserve_bytes=0)
+    monkeypatch.setattr(locator_reload, "available_memory_bytes", lambda: 4096)
+    locator_reload.check_memory_headroom(str(locator), instances=2, reserve_bytes=0)
+
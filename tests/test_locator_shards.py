@@ -0,0 +1,35 @@
+import contextlib
+import os
+import types
+
+import arcpy
+
+from unbox import locator_shards
+
+
+def test_subregion_criterion_routes_on_name_and_fips():
+    criterion = locator_shards.subregion_criterion(["06001"], ["Alameda"])
+    assert "Subregion = '06001'" in criterion
+    assert "Subregion = 'Alameda'" in criterion
+    assert "Subregion = 'Alameda County'" in criterion
+
+
+def test_subregion_criterion_escapes_quotes():
+    assert "Subregion = 'O''Brien'" in locator_shards.subregion_criterion([], ["O'Brien"])
+
+
+def test_member_names_are_valid():
+    assert locator_shards._member_name("bay area-1") == "bay_area_1"
+
+
+def test_build_shard_filters_each_table_by_its_own_field_type(monkeypatch, tmp_path):
+    field_types = {"Addresses": "String", "Parcels": "Integer"}
+    monkeypatch.setattr(arcpy, "ListFields", lambda table, field: [types.SimpleNamespace(type=field_types[os.path.basename(table)])], raising=False)
+    monkeypatch.setattr(arcpy, "EnvManager", lambda **kwargs: contextlib.nullcontext(), raising=False)
+    calls = {}
+    monkeypatch.setattr(locator_shards.build_locator, "make_temp_gdb", lambda folder, name: str(tmp_path / "temp" / name))
+    monkeypatch.setattr(locator_shards.build_locator, "make_locator", lambda **kwargs: calls.update(kwargs))
+
+    locator_shards.build_shard("input.gdb", ["06001", "06003"], str(tmp_path / "shard" / "shard.loc"))
+    assert calls["where_clause"] == "FIPS_CODE IN ('06001', '06003')"
+    assert calls["parcel_where_clause"] == "FIPS_CODE IN (6001, 6003)"
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from unbox import perturb
+
+
+def _corpus():
+    return {
+        "ID": np.array(["1", "2", "3"]),
+        "STREET": np.array(["10860 GOLD CENTER DR", "MAIN ST", "12 OAK AVE APT 3"]),
+        "CITY": np.array(["RANCHO CORDOVA", "SACRAMENTO", ""]),
+        "STATE": np.array(["CA", "CA", "CA"]),
+        "ZIP": np.array(["95670", "", "95814-1234"]),
+        "COUNTY": np.array(["06067", "06067", "06067"]),
+    }
+
+
+@pytest.mark.parametrize("name, streets, zips, applied", [
+    ("drop_house_number", ["GOLD CENTER DR", "MAIN ST", "OAK AVE APT 3"], None, [True, False, True]),
+    ("drop_street_type", ["10860 GOLD CENTER", "MAIN", "12 OAK AVE APT 3"], None, [True, True, False]),
+    ("drop_zip", None, ["", "", ""], [True, False, True]),
+    ("drop_city", None, None, [True, True, False]),
+])
+def test_each_perturbation(name, streets, zips, applied):
+    corpus = _corpus()
+    output = perturb.perturb(corpus, {name: 1})
+    assert output["PERTURBATION"].tolist() == [name if a else "none" for a in applied]
+    assert output["ORIGINAL_ID"].tolist() == ["1", "2", "3"] and output["ID"].tolist() == ["1-1", "2-1", "3-1"]
+    assert output["STREET"].tolist() == (streets or corpus["STREET"].tolist())
+    assert output["ZIP"].tolist() == (zips or corpus["ZIP"].tolist())
+    assert output["COUNTY"].tolist() == corpus["COUNTY"].tolist()
+
+
+def test_random_perturbations_change_what_they_say():
+    rng = np.random.default_rng(0)
+    count = 20_000
+    corpus = {
+        "ID": np.arange(count).astype(str),
+        "STREET": np.char.add(rng.integers(1, 99999, count).astype(str), " GOLD CENTER DR"),
+        "CITY": np.full(count, "RANCHO CORDOVA"),
+        "STATE": np.full(count, "CA"),
+        "ZIP": np.full(count, "95670"),
+    }
+    output = perturb.perturb(corpus, {"wrong_house_number": 1, "typo": 1, "wrong_zip": 1, "none": 1}, copies=2, seed=3)
+    assert len(output["ID"]) == 2 * count and len(set(output["ID"])) == 2 * count
+    original = np.tile(np.arange(count), 2)
+    changed_street = output["STREET"] != corpus["STREET"][original]
+    changed_zip = output["ZIP"] != corpus["ZIP"][original]
+    kinds = output["PERTURBATION"]
+    assert changed_street[kinds == "wrong_house_number"].all() and changed_street[kinds == "typo"].all()
+    assert np.char.endswith(output["STREET"][kinds == "wrong_house_number"], " GOLD CENTER DR").all()
+    assert (np.char.str_len(output["STREET"][kinds == "typo"]) == np.char.str_len(corpus["STREET"][original][kinds == "typo"])).all()
+    assert changed_zip[kinds == "wrong_zip"].all() and np.char.startswith(output["ZIP"][kinds == "wrong_zip"], "9567").all()
+    assert not (changed_street | changed_zip)[kinds == "none"].any()
+    assert abs((kinds == "none").mean() - 0.25) < 0.02
+    # the same seed gives the same corpus
+    assert (perturb.perturb(corpus, {"typo": 1, "none": 1}, seed=3)["STREET"] == perturb.perturb(corpus, {"typo": 1, "none": 1}, seed=3)["STREET"]).all()
+
+    with pytest.raises(ValueError):
+        perturb.perturb(corpus, {"shuffle": 1})
+
+
+def test_report_joins_geocodes_back_on_id(tmp_path):
+    output = perturb.perturb(_corpus(), {"drop_zip": 1}, copies=2)
+    path = tmp_path / "perturbed.csv"
+    perturb.write_columns(output, str(path))
+    perturbed = perturb.read_columns(str(path))
+    assert list(perturbed)[:3] == ["ID", "ORIGINAL_ID", "PERTURBATION"]
+
+    geocoded = {  # bulk geocoding output, out of order and with one row missing
+        "ID": np.array(["3-2", "1-1", "2-1", "1-2", "3-1"]),
+        "STATUS": np.array(["U", "M", "M", "M", "M"]),
+        "SCORE": np.array(["", "100", "90", "80", "98"]),
+        "X": np.array(["", "-121.3", "-121.5", "-121.3", "-121.4"]),
+        "Y": np.array(["", "38.6", "38.5", "38.601", "38.5"]),
+    }
+    baseline = {"ID": np.array(["1", "2", "3"]), "STATUS": np.array(["M", "M", "M"]),
+                "X": np.array(["-121.3", "-121.5", "-121.4"]), "Y": np.array(["38.6", "38.5", "38.5"])}
+    report = perturb.perturbation_report(perturbed, geocoded, baseline)
+    assert report["drop_zip"]["rows"] == 4 and report["drop_zip"]["matched"] == 3 and report["drop_zip"]["match_rate"] == 0.75
+    assert report["drop_zip"]["mean_score"] == 92.67
+    assert report["none"]["rows"] == 2 and report["none"]["matched"] == 1  # row 2 has no ZIP to drop; 2-2 wasn't geocoded
+    assert report["drop_zip"]["compared"] == 3 and report["drop_zip"]["within_100m"] == round(2 / 3, 4)
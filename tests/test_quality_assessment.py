@@ -0,0 +1,198 @@
+import re
+import types
+
+import arcpy
+import numpy as np
+
+from unbox import quality_assessment
+from unbox.projection import geodesic_distance
+from unbox.result_store import ResultStore
+from unbox.tdigest import TDigest
+
+
+class _Table:
+    """Stands in for a geocoded points table - OBJECTID plus a couple of distance fields with some nulls"""
+
+    def __init__(self, rows=200_000, seed=0):
+        rng = np.random.default_rng(seed)
+        self.oids = np.arange(1, rows + 1)
+        self.columns = {"NEAR_DIST_BING": rng.lognormal(3, 1.2, rows), "NEAR_DIST_SMP": rng.lognormal(2, 1, rows)}
+        self.columns["NEAR_DIST_SMP"][::7] = np.nan  # nulls
+        self.reads = []
+
+    def to_numpy(self, table, fields, where_clause=None, skip_nulls=False, null_value=None):
+        self.reads.append(where_clause)
+        keep = np.ones(len(self.oids), dtype=bool)
+        if where_clause:
+            low, high = map(int, re.findall(r"\d+", where_clause))
+            keep = (self.oids > low) & (self.oids <= high)
+        array = np.zeros(int(keep.sum()), dtype=[(field, "f8") for field in fields])
+        for field in fields:
+            array[field] = self.columns[field][keep]
+        return array
+
+
+def _patch(monkeypatch, table):
+    class _Cursor:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __enter__(self):
+            return iter([(int(table.oids.max()),)])
+
+        def __exit__(self, *args):
+            pass
+
+    monkeypatch.setattr(arcpy.da, "TableToNumPyArray", table.to_numpy, raising=False)
+    monkeypatch.setattr(arcpy.da, "SearchCursor", _Cursor, raising=False)
+    monkeypatch.setattr(arcpy, "Describe", lambda t: types.SimpleNamespace(OIDFieldName="OBJECTID"), raising=False)
+
+
+def test_exact_percentiles_in_one_read(monkeypatch):
+    table = _Table()
+    _patch(monkeypatch, table)
+    result = quality_assessment.percentiles("points")
+    assert table.reads == [None]
+    smp = table.columns["NEAR_DIST_SMP"]
+    expected = np.percentile(smp[~np.isnan(smp)], quality_assessment.DEFAULT_PERCENTILES)
+    assert np.allclose(list(result["NEAR_DIST_SMP"].values()), expected)
+    assert list(result["NEAR_DIST_BING"]) == list(quality_assessment.DEFAULT_PERCENTILES)
+
+
+def test_streaming_percentiles_are_close(monkeypatch):
+    table = _Table()
+    _patch(monkeypatch, table)
+    exact = quality_assessment.percentiles("points")
+    streamed = quality_assessment.percentiles("points", streaming=True, chunk_size=30_000)
+    assert len(table.reads) == 1 + 7  # one bulk read, then 200,000 rows in 30,000 OID chunks
+    for field, values in exact.items():
+        for p, value in values.items():
+            assert abs(streamed[field][p] - value) / value < 0.01, (field, p)
+
+
+def test_tdigest_merge_matches_one_digest():
+    rng = np.random.default_rng(3)
+    values = rng.exponential(50, 100_000)
+    whole = TDigest().update(values)
+    merged = TDigest().update(values[:40_000]).merge(TDigest().update(values[40_000:]))
+    assert merged.count == whole.count == 100_000
+    assert merged.min == values.min() and merged.max == values.max()
+    for p, value in merged.percentiles([50, 90, 99]).items():
+        assert abs(value - whole.percentiles([p])[p]) / value < 0.01
+    assert np.isnan(TDigest().percentiles([50])[50])
+
+
+def test_geodesic_distance_matches_vincenty_reference():
+    # Flinders Peak to Buninyong, the worked example from Vincenty's paper
+    assert abs(geodesic_distance(144.42486789, -37.95103342, 143.92649554, -37.65282114) - 54972.271) < 0.001
+    distances = geodesic_distance([-121.5, -121.5, np.nan], [38.5, 38.5, 0], [-121.5, -121.5, 0], [38.5, 38.501, 0])
+    assert distances[0] == 0 and abs(distances[1] - 111.0) < 0.5 and np.isnan(distances[2])
+
+
+def test_join_on_id():
+    rows = quality_assessment.join_on_id(np.array(["a", "b", "c", "d"]), np.array(["c", "a", "a", "x"]))
+    assert rows.tolist() == [1, -1, 0, -1]
+    assert quality_assessment.join_on_id(np.array([1, 2]), np.array(["2"])).tolist() == [-1, 0]
+    assert quality_assessment.join_on_id(np.array([1, 2]), np.array([], dtype=int)).tolist() == [-1, -1]
+
+
+def test_compare_joins_on_id_not_nearest(monkeypatch):
+    points = {
+        # the comparison geocoder swaps where it put 1 and 2 - Near would call both perfect matches
+        "base": [(1, -121.50, 38.50), (2, -121.40, 38.50), (3, -121.30, 38.50)],
+        "comparison": [(2, -121.50, 38.50), (1, -121.40, 38.50), (3, -121.30, 38.5001), (4, -120.0, 38.0)],
+    }
+    extended, lines = [], []
+
+    def to_numpy(path, fields, spatial_reference=None, skip_nulls=False):
+        return np.array(points[path], dtype=[("ID", "i8"), ("SHAPE@X", "f8"), ("SHAPE@Y", "f8")])
+
+    monkeypatch.setattr(arcpy.da, "FeatureClassToNumPyArray", to_numpy, raising=False)
+    monkeypatch.setattr(arcpy.da, "ExtendTable", lambda table, key, array, array_key, append_only: extended.append(array), raising=False)
+    monkeypatch.setattr(arcpy.da, "NumPyArrayToTable", lambda array, path: None, raising=False)
+    monkeypatch.setattr(arcpy, "SpatialReference", lambda wkid: wkid, raising=False)
+    monkeypatch.setattr(arcpy.management, "XYToLine", lambda *args: lines.append(args), raising=False)
+
+    dataset = quality_assessment.AddressDataset("sample")
+    base = quality_assessment.GeocodedDataset(dataset, quality_assessment.CDT, None, "base")
+    comparison = quality_assessment.GeocodedDataset(dataset, quality_assessment.ESRI, None, "comparison")
+    result = dataset.compare(base, comparison)
+
+    distances = extended[0]
+    assert distances.dtype.names == ("ID", "NEAR_DIST_SMP")
+    assert distances["ID"].tolist() == [1, 2, 3]
+    assert abs(distances["NEAR_DIST_SMP"][0] - 8700) < 100 and abs(distances["NEAR_DIST_SMP"][2] - 11.1) < 0.1
+    assert result["matched"] == 3 and result["unmatched"] == 0 and result["lines"] is None and not lines
+    assert dataset.comparisons[2][1] is dataset.comparisons[1][2]
+    assert quality_assessment.AddressDataset("other").comparisons == {}
+
+    dataset.compare(base, comparison, lines="lines")
+    assert len(lines) == 1 and lines[0][1] == "lines"
+
+
+def test_compare_all_pairs_in_one_pass(monkeypatch, tmp_path):
+    points = {
+        "cdt": [(1, -121.5, 38.5), (2, -121.4, 38.5), (3, -121.3, 38.5)],
+        "smp": [(1, -121.5, 38.5001), (2, -121.4, 38.5004), (4, -121.2, 38.5)],  # 11 m and 44 m off, no 3
+        "bing": [(3, -121.3, 38.5), (2, -121.4, 38.501), (1, -121.5, 38.5)],  # 111 m off on 2
+    }
+    reads = []
+
+    def to_numpy(path, fields, spatial_reference=None, skip_nulls=False):
+        reads.append(path)
+        return np.array(points[path], dtype=[("ID", "i8"), ("SHAPE@X", "f8"), ("SHAPE@Y", "f8")])
+
+    monkeypatch.setattr(arcpy.da, "FeatureClassToNumPyArray", to_numpy, raising=False)
+    monkeypatch.setattr(arcpy, "SpatialReference", lambda wkid: wkid, raising=False)
+
+    dataset = quality_assessment.AddressDataset("sample")
+    for geocoder, path in ((quality_assessment.CDT, "cdt"), (quality_assessment.ESRI, "smp"), (quality_assessment.BING, "bing")):
+        quality_assessment.GeocodedDataset(dataset, geocoder, None, path)
+    output = tmp_path / "comparison.csv"
+    results = dataset.compare_all(output=output)
+
+    assert sorted(reads) == ["bing", "cdt", "smp"]
+    by_pair = {(r["BASE"], r["COMPARISON"]): r for r in results}
+    assert list(by_pair) == [("CDT", "SMP"), ("CDT", "Bing"), ("SMP", "Bing")]
+    cdt_smp = by_pair[("CDT", "SMP")]
+    assert (cdt_smp["COMPARED"], cdt_smp["BASE_ONLY"], cdt_smp["COMPARISON_ONLY"]) == (2, 1, 1)
+    assert (cdt_smp["WITHIN_25M"], cdt_smp["WITHIN_50M"], cdt_smp["WITHIN_100M"]) == (0.5, 1.0, 1.0)
+    cdt_bing = by_pair[("CDT", "Bing")]
+    assert cdt_bing["COMPARED"] == 3 and cdt_bing["P10"] == 0 and abs(cdt_bing["P99"] - 109) < 2
+    assert abs(cdt_bing["WITHIN_100M"] - 2 / 3) < 1e-9
+    assert dataset.comparisons[3][1] is cdt_bing
+
+    lines = output.read_text().splitlines()
+    assert lines[0].startswith("DATASET,BASE,COMPARISON,COMPARED") and len(lines) == 4
+
+
+def test_comparison_matrix_in_chunks_matches_one_pass():
+    rng = np.random.default_rng(4)
+    lons = -121.5 + rng.normal(0, 0.001, (4, 20_000))
+    lats = 38.5 + rng.normal(0, 0.001, (4, 20_000))
+    lons[rng.random(lons.shape) < 0.1] = np.nan  # each geocoder misses some addresses
+    names = ["CDT", "SMP", "Bing", "Azure"]
+    whole = quality_assessment.comparison_matrix(names, lons, lats)
+    chunked = quality_assessment.comparison_matrix(names, lons, lats, chunk_distances=6 * 1_000)
+    assert len(whole) == len(chunked) == 6
+    for exact, approximate in zip(whole, chunked):
+        for column in ("BASE", "COMPARISON", "COMPARED", "BASE_ONLY", "COMPARISON_ONLY", "WITHIN_25M", "WITHIN_100M"):
+            assert exact[column] == approximate[column]
+        assert abs(exact["MEAN"] - approximate["MEAN"]) < 1e-6
+        for column in ("P10", "P50", "P90", "P99"):
+            assert abs(exact[column] - approximate[column]) / exact[column] < 0.01
+
+
+def test_compare_all_reads_from_the_result_store(monkeypatch):
+    monkeypatch.setattr(arcpy.da, "FeatureClassToNumPyArray", None, raising=False)  # nothing should read feature classes
+    store = ResultStore(":memory:")
+    store.put("sample", "CDT", "build-1", [{"id": "1", "address": "1 A ST", "status": "M", "x": -121.5, "y": 38.5},
+                                           {"id": "2", "address": "2 A ST", "status": "U"}])
+    store.put("sample", "SMP", "2026.1", [{"id": "1", "address": "1 A ST", "status": "M", "x": -121.5, "y": 38.5001},
+                                          {"id": "2", "address": "2 A ST", "status": "M", "x": -121.4, "y": 38.5}])
+    dataset = quality_assessment.AddressDataset("sample")
+    quality_assessment.GeocodedDataset(dataset, quality_assessment.CDT, None)
+    quality_assessment.GeocodedDataset(dataset, quality_assessment.ESRI, None, build_id="2026.1")
+    [result] = dataset.compare_all(store=store)
+    assert (result["COMPARED"], result["BASE_ONLY"], result["COMPARISON_ONLY"]) == (1, 0, 1)
+    assert abs(result["P50"] - 11.1) < 0.1
@@ -0,0 +1,93 @@
+from concurrent.futures import Future
+
+from unbox import result_store
+from unbox.result_store import ResultStore
+
+
+class _InlinePool:
+    """Stands in for LocatorPool - geocodes each chunk right away in this process and remembers what it was sent"""
+    workers = 2
+
+    def __init__(self):
+        self.addresses = []
+
+    def submit(self, addresses, max_locations=1, out_fields=None):
+        self.addresses.extend(addresses)
+        future = Future()
+        future.set_result([
+            {"results": [{"Match_addr": address.upper(), "Score": 97.5, "Addr_type": "PointAddress", "X": -121.5, "Y": 38.5}]}
+            if "NOWHERE" not in address else {"results": []} for address in addresses
+        ])
+        return future
+
+
+def _rows(count, changed=()):
+    return [{"id": f"r{row}", "address": f"{row} {'ELM' if row in changed else 'MAIN'} ST, {'NOWHERE' if row == 3 else 'SACRAMENTO'}, CA"}
+            for row in range(count)]
+
+
+def test_only_new_or_changed_rows_are_geocoded():
+    store = ResultStore(":memory:")
+    pool = _InlinePool()
+    assert result_store.geocode_incremental(store, "qa", "CDT", "build-1", _rows(10), pool, chunk_size=4) == {"rows": 10, "geocoded": 10, "skipped": 0}
+
+    pool.addresses.clear()
+    counts = result_store.geocode_incremental(store, "qa", "CDT", "build-1", _rows(12, changed={5}), pool, chunk_size=4)
+    assert counts == {"rows": 12, "geocoded": 3, "skipped": 9}
+    assert pool.addresses == ["5 ELM ST, SACRAMENTO, CA", "10 MAIN ST, SACRAMENTO, CA", "11 MAIN ST, SACRAMENTO, CA"]
+
+    # a new build geocodes everything again, and the old build's results stay put
+    pool.addresses.clear()
+    assert result_store.geocode_incremental(store, "qa", "CDT", "build-2", _rows(12), pool)["geocoded"] == 12
+    assert store.builds("qa", "CDT") == ["build-1", "build-2"]
+    assert len(store.read("qa", "CDT", "build-1")["address_id"]) == 12
+
+
+def test_read_gives_columns():
+    store = ResultStore(":memory:")
+    result_store.geocode_incremental(store, "qa", "CDT", "build-1", _rows(5), _InlinePool())
+    results = store.read("qa", "CDT")
+    assert results["address_id"].tolist() == ["r0", "r1", "r2", "r3", "r4"]
+    assert results["status"].tolist() == ["M", "M", "M", "U", "M"]
+    assert results["x"][0] == -121.5 and results["score"][0] == 97.5 and results["match_type"][0] == "PointAddress"
+    assert results["x"][3] != results["x"][3]  # NaN
+    assert results["input_hash"][1] == result_store.input_hash("1 MAIN ST, SACRAMENTO, CA")
+    assert store.read("qa", "CDT", matched_only=True)["address_id"].tolist() == ["r0", "r1", "r2", "r4"]
+    assert len(store.read("qa", "Bing")["address_id"]) == 0
+
+
+def test_import_results_from_a_geocoder_script(tmp_path):
+    path = tmp_path / "bing_geocodes.csv"
+    path.write_text("ID,STREET,CITY,STATE,ZIP,X,Y,calculationMethod,confidence,entityType\n"
+                    "7,1 Main St,Sacramento,CA,95814,-121.49,38.58,Rooftop,High,Address\n"
+                    "8,2 Main St,Sacramento,CA,95814,,,,,\n")
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    assert result_store.import_results(store, "qa", "Bing", "2026-10", str(path)) == 2
+    results = store.read("qa", "Bing")
+    assert results["status"].tolist() == ["M", "U"] and results["match_type"][0] == "Address"
+    # the same input hashes as geocoding the standard schema rows would give, so later runs skip them
+    rows = [{"id": "7", "address": "1 Main St, Sacramento, CA 95814"}]
+    assert list(store.pending("qa", "Bing", "2026-10", rows)) == []
+    store.close()
+
+
+class _FailingPool(_InlinePool):
+    """A geocoder that's down - every address comes back as an error"""
+
+    def submit(self, addresses, max_locations=1, out_fields=None):
+        self.addresses.extend(addresses)
+        future = Future()
+        future.set_result([{"error": "Stub locator error"} for _ in addresses])
+        return future
+
+
+def test_rows_that_failed_are_geocoded_again():
+    store = ResultStore(":memory:")
+    assert result_store.geocode_incremental(store, "qa", "CDT", "build-1", _rows(5), _FailingPool())["geocoded"] == 5
+    assert store.read("qa", "CDT")["status"].tolist() == ["E"] * 5
+
+    pool = _InlinePool()
+    assert result_store.geocode_incremental(store, "qa", "CDT", "build-1", _rows(5), pool) == {"rows": 5, "geocoded": 5, "skipped": 0}
+    assert store.read("qa", "CDT")["status"].tolist() == ["M", "M", "M", "U", "M"]
+    # unmatched isn't an error, so nothing is retried now
+    assert result_store.geocode_incremental(store, "qa", "CDT", "build-1", _rows(5), pool)["geocoded"] == 0
@@ -0,0 +1,105 @@
+import arcpy
+import numpy as np
+
+from fastapi.testclient import TestClient
+
+from unbox import locator_api_dev_shim as shim
+from unbox import reverse_index
+from unbox.admission import LocatorSlots
+from unbox.geocode_cache import haversine_meters
+from unbox.projection import to_california_albers
+
+
+def _random_index(tmp_path, count, seed=0):
+    rng = np.random.default_rng(seed)
+    lons, lats = rng.uniform(-121.6, -121.4, count), rng.uniform(38.5, 38.6, count)
+    folder = str(tmp_path / "reverse_index")
+    reverse_index.write_reverse_index(folder, lons, lats, np.arange(count) + 1000, [f"{i} MAIN ST".encode() for i in range(count)])
+    return reverse_index.ReverseIndex(folder), lons, lats
+
+
+def test_projection_distances_are_meters():
+    x, _ = to_california_albers(-120.0, 37.0)
+    assert abs(x) < 1e-6  # on the central meridian
+    (x1, x2), (y1, y2) = to_california_albers([-121.4936, -121.2797], [38.5767, 38.5915])
+    projected = np.hypot(x2 - x1, y2 - y1)
+    assert abs(projected - haversine_meters(-121.4936, 38.5767, -121.2797, 38.5915)) / projected < 0.005
+
+
+def test_batch_query_matches_brute_force(tmp_path):
+    for count in (1, 20, 3000):
+        index, lons, lats = _random_index(tmp_path, count, seed=count)
+        rng = np.random.default_rng(1)
+        query_lons, query_lats = rng.uniform(-121.7, -121.3, 2000), rng.uniform(38.45, 38.65, 2000)
+        nearest = index.query(query_lons, query_lats)
+
+        px, py = to_california_albers(lons, lats)
+        qx, qy = to_california_albers(query_lons, query_lats)
+        distances = np.sqrt((px[None, :] - qx[:, None]) ** 2 + (py[None, :] - qy[:, None]) ** 2)
+        assert np.allclose(nearest["distance"], distances.min(axis=1))
+        assert np.allclose(distances[np.arange(2000), nearest["lid"] - 1000], distances.min(axis=1))
+
+
+def test_results_beyond_max_distance_are_none(tmp_path):
+    index, lons, lats = _random_index(tmp_path, 500)
+    near, far = index.results([lons[7], -119.0], [lats[7], 36.0], max_distance=50)
+    assert near["address_lid"] == 1007
+    assert near["Match_addr"] == "7 MAIN ST"
+    assert near["Distance"] == 0
+    assert far is None
+    assert index.stats()["within_rate"] == 0.5
+
+
+class _ReverseLocator:
+    def __init__(self):
+        self.calls = 0
+
+    def reverseGeocode(self, location, forStorage=True):
+        self.calls += 1
+        return {"Match_addr": "LOCATOR MATCH", "Addr_type": "StreetAddress"}
+
+
+def test_reverse_falls_back_to_the_locator(monkeypatch, tmp_path):
+    index, lons, lats = _random_index(tmp_path, 500)
+    locator = _ReverseLocator()
+    monkeypatch.setattr(shim, "REVERSE_INDEX", index)
+    monkeypatch.setattr(shim, "LOCATOR_SLOTS", LocatorSlots([locator]))
+    monkeypatch.setattr(arcpy, "Point", lambda X, Y: (X, Y), raising=False)
+    monkeypatch.setattr(arcpy, "PointGeometry", lambda point, sr: point, raising=False)
+    monkeypatch.setattr(arcpy, "SpatialReference", lambda wkid: wkid, raising=False)
+    shim.REVERSE_CACHE.invalidate("test")
+    client = TestClient(shim.app)
+
+    near = client.get("/reverse", params={"lon": lons[3], "lat": lats[3]}).json()["result"]
+    assert near["address_lid"] == 1003
+    assert locator.calls == 0
+    far = client.get("/reverse", params={"lon": -119.0, "lat": 36.0}).json()["result"]
+    assert far["Match_addr"] == "LOCATOR MATCH"
+    assert locator.calls == 1
+
+    points = [{"id": "a", "lon": lons[3], "lat": lats[3]}, {"id": "b", "lon": -118.0, "lat": 35.0}]
+    body = client.post("/reverse/batch", json={"points": points, "out_fields": ["Match_addr"]}).json()
+    assert [r["source"] for r in body["results"]] == ["index", "locator"]
+    assert body["results"][0]["result"] == {"Match_addr": "3 MAIN ST"}
+    assert body["stats"]["from_index"] == 1
+
+
+def test_overloaded_fallback_fails_only_that_point(monkeypatch, tmp_path):
+    from unbox.admission import Overloaded
+
+    class _FullSlots:
+        def acquire(self):
+            raise Overloaded("Queue is full (0 waiting)", 1)
+
+    index, lons, lats = _random_index(tmp_path, 500)
+    monkeypatch.setattr(shim, "REVERSE_INDEX", index)
+    monkeypatch.setattr(shim, "LOCATOR_SLOTS", _FullSlots())
+    shim.REVERSE_CACHE.invalidate("overloaded-test")
+    points = [{"id": "a", "lon": lons[3], "lat": lats[3]}, {"id": "b", "lon": -117.0, "lat": 34.0}]
+    response = TestClient(shim.app).post("/reverse/batch", json={"points": points})
+
+    assert response.status_code == 200
+    near, far = response.json()["results"]
+    assert near["result"]["address_lid"] == 1003
+    assert "result" not in far and far["error"].startswith("Service overloaded")
+    assert response.json()["stats"]["errors"] == 1
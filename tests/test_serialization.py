@@ -0,0 +1,50 @@
+import json
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from unbox import serialization
+
+# about the shape of a real /geocode candidate - 60 attributes
+FULL_RESULT = {f"Field{index}": "" for index in range(52)}
+FULL_RESULT.update({"Match_addr": "10860 Gold Center Dr, Rancho Cordova, 95670", "Score": 100, "Addr_type": "PointAddress",
+                    "X": -121.2797034602203, "Y": 38.591489370123995, "Xmin": -121.28, "Xmax": -121.27, "Shape": object()})
+FIELDS = ["Match_addr", "Score", "X", "Y", "Addr_type"]
+
+
+def _batch(count=500):
+    return [{"id": str(row), "results": [dict(FULL_RESULT)]} for row in range(count)]
+
+
+def test_project_is_case_insensitive_and_drops_shape():
+    results = [dict(FULL_RESULT)]
+    projected = serialization.project(results, serialization.parse_out_fields("match_addr, SCORE,Shape"))
+    assert projected == [{"Match_addr": FULL_RESULT["Match_addr"], "Score": 100}]
+    assert "Shape" not in serialization.project(results)[0]
+    assert "Shape" in results[0]  # the originals aren't touched
+    assert serialization.parse_out_fields("*") is None
+
+
+def test_projected_fast_path_matches_old_path():
+    """
+    A 500 address batch response: the old path (drop Shape, walk everything with FastAPI's encoder, serialize every
+    field) against projecting to five fields and serializing with dumps
+    """
+    def old_path():
+        batch = _batch()
+        for row in batch:
+            row["results"] = [{key: value for key, value in result.items() if key != "Shape"} for result in row["results"]]
+        return JSONResponse(jsonable_encoder(batch)).body
+
+    def new_path():
+        batch = _batch()
+        for row in batch:
+            row["results"] = serialization.project(row["results"], FIELDS)
+        return serialization.dumps(batch)
+
+    old_body, new_body = old_path(), new_path()
+    old_rows, new_rows = json.loads(old_body), json.loads(new_body)
+    assert new_rows == [{"id": row["id"], "results": [{field: result[field] for field in FIELDS} for result in row["results"]]}
+                        for row in old_rows]
+    assert new_rows[0]["results"][0] == {field: FULL_RESULT[field] for field in FIELDS}
+    assert len(new_body) < len(old_body) / 4
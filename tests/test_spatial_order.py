@@ -0,0 +1,36 @@
+import pytest
+
+from unbox import spatial_order
+
+
+def _cells_in_curve_order(index_function, order):
+    size = 1 << order
+    return sorted(((x, y) for x in range(size) for y in range(size)), key=lambda cell: index_function(cell[0], cell[1], order))
+
+
+def test_hilbert_index_visits_every_cell_once_through_neighbors():
+    """
+    Consecutive positions on the Hilbert curve are always adjacent cells - that's what keeps nearby features together
+    """
+    order = 4
+    indexes = {spatial_order.hilbert_index(x, y, order) for x in range(16) for y in range(16)}
+    assert indexes == set(range(256))
+
+    cells = _cells_in_curve_order(spatial_order.hilbert_index, order)
+    for (x1, y1), (x2, y2) in zip(cells, cells[1:]):
+        assert abs(x1 - x2) + abs(y1 - y2) == 1
+
+
+def test_zorder_index_interleaves_bits():
+    assert spatial_order.zorder_index(0b11, 0b00, 2) == 0b0101
+    assert spatial_order.zorder_index(0b00, 0b11, 2) == 0b1010
+    assert len({spatial_order.zorder_index(x, y, 3) for x in range(8) for y in range(8)}) == 64
+
+
+def test_curve_key_clamps_to_extent():
+    extent = (0.0, 0.0, 100.0, 100.0)
+    assert spatial_order.curve_key(0, 0, extent, order=4) == 0
+    assert spatial_order.curve_key(-50, -50, extent, order=4) == spatial_order.curve_key(0, 0, extent, order=4)
+    assert spatial_order.curve_key(100, 0, extent, order=4) == 255  # Hilbert curve ends in the bottom right corner
+    with pytest.raises(ValueError):
+        spatial_order.curve_key(1, 1, extent, curve="peano")
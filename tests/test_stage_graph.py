@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from unbox import stage_graph
+
+
+def _sleep_and_return(value, seconds=0.2):
+    time.sleep(seconds)
+    return value
+
+
+def _join(left=None, right=None):
+    return f"{left}+{right}"
+
+
+def _fail():
+    raise RuntimeError("stage failed")
+
+
+def _stages():
+    return [
+        stage_graph.Stage("left", _sleep_and_return, kwargs={"value": "a", "seconds": 0.5}),
+        stage_graph.Stage("right", _sleep_and_return, kwargs={"value": "b", "seconds": 0.1}),
+        stage_graph.Stage("join", _join, depends_on=["left", "right"],
+                          resolve=lambda done: {"left": done["left"], "right": done["right"]}),
+    ]
+
+
+def test_independent_stages_overlap():
+    """
+    Independent stages should run at the same time, and the dependent stage should get their outputs
+    """
+    stages = _stages()
+    results = stage_graph.run_stage_graph(stages, max_workers=2)
+
+    assert results["join"].value == "a+b"
+    assert results["right"].started < results["left"].finished  # they overlapped
+    assert results["join"].started >= results["left"].finished
+
+    path, seconds = stage_graph.critical_path(stages, results)
+    assert path == ["left", "join"]
+    assert seconds >= 0.5
+
+
+def test_sequential_matches_parallel():
+    results = stage_graph.run_stage_graph(_stages(), parallel=False)
+    assert results["join"].value == "a+b"
+    assert "Critical path: left -> join" in stage_graph.format_stage_report(_stages(), results)
+
+
+def test_stage_failure_raises():
+    with pytest.raises(RuntimeError):
+        stage_graph.run_stage_graph([stage_graph.Stage("fail", _fail), stage_graph.Stage("after", _join, depends_on=["fail"])])
+
+
+def test_stage_failure_doesnt_wait_for_running_stages():
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError):
+        stage_graph.run_stage_graph([stage_graph.Stage("slow", _sleep_and_return, kwargs={"value": "a", "seconds": 60}),
+                                     stage_graph.Stage("fail", _fail)], max_workers=2)
+    assert time.perf_counter() - start < 30
+
+
+def test_unknown_dependency_and_cycle():
+    with pytest.raises(ValueError):
+        stage_graph.run_stage_graph([stage_graph.Stage("a", _join, depends_on=["missing"])])
+    with pytest.raises(ValueError):
+        stage_graph.run_stage_graph([stage_graph.Stage("a", _join, depends_on=["b"]), stage_graph.Stage("b", _join, depends_on=["a"])])
@@ -0,0 +1,77 @@
+import csv
+
+import numpy as np
+
+from unbox import stratified_sample
+from unbox.stratified_sample import StratifiedSampler
+
+
+def _addresses(count=100_000, seed=0):
+    rng = np.random.default_rng(seed)
+    lids = rng.permutation(count).astype(np.int64) + 1
+    counties = rng.choice(["06001", "06037", "06105"], count, p=[0.3, 0.69, 0.01])
+    acres = np.where(rng.random(count) < 0.05, np.nan, rng.lognormal(-1.5, 1.5, count))
+    columns = {name: np.full(count, value, dtype=object) for name, value in
+               (("house_number", "10"), ("address", "MAIN ST"), ("unit", None), ("city", "SACRAMENTO"), ("state", "CA"), ("zip", "95814"))}
+    return lids, counties, acres, columns
+
+
+def _add(sampler, lids, counties, acres, columns, order, batch_size):
+    for start in range(0, len(order), batch_size):
+        rows = order[start:start + batch_size]
+        sampler.add(lids[rows], counties[rows], acres[rows], {name: values[rows] for name, values in columns.items()})
+
+
+def test_sample_is_reproducible_whatever_the_row_order():
+    lids, counties, acres, columns = _addresses()
+    first = StratifiedSampler(fraction=0.05, seed=1)
+    _add(first, lids, counties, acres, columns, np.arange(len(lids)), 7_000)
+    second = StratifiedSampler(fraction=0.05, seed=1)
+    _add(second, lids, counties, acres, columns, np.random.default_rng(5).permutation(len(lids)), 13_000)
+    assert first.sample()["lid"].tolist() == second.sample()["lid"].tolist()
+
+    other_seed = StratifiedSampler(fraction=0.05, seed=2)
+    _add(other_seed, lids, counties, acres, columns, np.arange(len(lids)), 7_000)
+    assert first.sample()["lid"].tolist() != other_seed.sample()["lid"].tolist()
+
+
+def test_each_stratum_is_sampled_at_the_fraction_and_capped():
+    lids, counties, acres, columns = _addresses()
+    sampler = StratifiedSampler(fraction=0.05, seed=1)
+    _add(sampler, lids, counties, acres, columns, np.arange(len(lids)), 10_000)
+    sample = sampler.sample()
+    assert abs(len(sample["lid"]) / len(lids) - 0.05) < 0.005
+    small_county = (counties == "06105").sum()
+    assert abs((sample["county"] == "06105").sum() / small_county - 0.05) < 0.02
+
+    capped = StratifiedSampler(fraction=0.05, per_stratum=20, seed=1)
+    _add(capped, lids, counties, acres, columns, np.arange(len(lids)), 10_000)
+    sample = capped.sample()
+    strata = list(zip(sample["county"], stratified_sample.acreage_bucket(sample["acres"])))
+    assert max(strata.count(stratum) for stratum in set(strata)) == 20
+    assert capped.stats()["strata_sampled"] == len(set(strata))
+    # the capped sample is the lowest keys of the fraction sample in each stratum
+    assert set(sample["lid"]) <= set(sampler.sample()["lid"])
+
+
+def test_acreage_lookup_joins_through_the_relation():
+    address_lids, acres = stratified_sample.acreage_lookup(
+        parcel_lids=np.array([30, 10, 20]), parcel_acres=np.array([3.0, 0.05, np.nan]),
+        relation_address_lids=np.array([2, 1, 2, 3, 4]), relation_parcel_lids=np.array([10, 30, 30, 20, 99]))
+    assert address_lids.tolist() == [1, 2, 3, 4]
+    assert acres[:2].tolist() == [3.0, 3.0] and np.isnan(acres[2]) and np.isnan(acres[3])
+    assert stratified_sample.acreage_bucket([np.nan, 0.05, 0.1, 0.3, 1000]).tolist() == [0, 1, 1, 3, 8]
+
+
+def test_corpus_is_in_the_standard_input_schema(tmp_path):
+    sampler = StratifiedSampler(fraction=None, per_stratum=5)
+    sampler.add(np.array([7, 3]), np.array(["06001", "06001"]), np.array([0.2, np.nan]),
+                {"house_number": ["12", None], "address": ["OAK AVE", "1 ELM ST"], "unit": ["APT 2", None],
+                 "city": ["OAKLAND", "OAKLAND"], "state": ["CA", "CA"], "zip": ["94601", None]})
+    output = tmp_path / "sample.csv"
+    assert stratified_sample.write_corpus(sampler.sample(), str(output)) == 2
+    with open(output, newline="") as corpus:
+        rows = list(csv.DictReader(corpus))
+    assert list(rows[0]) == stratified_sample.OUTPUT_FIELDS
+    assert rows[0] == {"ID": "3", "STREET": "1 ELM ST", "CITY": "OAKLAND", "STATE": "CA", "ZIP": "", "COUNTY": "06001", "ACRES": ""}
+    assert rows[1]["STREET"] == "12 OAK AVE APT 2" and rows[1]["ACRES"] == "0.2"
@@ -1,5 +1,33 @@
-from . import build_locator
-from . import compile_gdbs
+from . import address_index
+from . import address_normalize
+from . import admission
+from . import bulk_geocode
+from . import coalesce
+from . import enrichment
+from . import geocode_cache
+from . import load_test
 from . import locator_api_dev_shim
+from . import locator_pool
+from . import locator_reload
+from . import perturb
+from . import projection
+from . import result_store
+from . import reverse_index
+from . import serialization
+from . import shim_metrics
+from . import stage_graph
+from . import stratified_sample
+from . import stub_locator
+from . import tdigest
 
-__ALL__ = ["build_locator", "compile_gdbs", "locator_api_dev_shim"]
\ No newline at end of file
+try:  # these need arcpy - without it (load testing the shim against the stub locator, say) they're left out
+    from . import build_locator
+    from . import build_planner
+    from . import compile_gdbs
+    from . import locator_matrix
+    from . import locator_shards
+    from . import spatial_order
+except ImportError:
+    pass
+
+__ALL__ = ["address_index", "address_normalize", "admission", "build_locator", "build_planner", "bulk_geocode", "coalesce", "compile_gdbs", "enrichment", "geocode_cache", "load_test", "locator_api_dev_shim", "locator_matrix", "locator_pool", "locator_reload", "locator_shards", "perturb", "projection", "result_store", "reverse_index", "serialization", "shim_metrics", "spatial_order", "stage_graph", "stratified_sample", "stub_locator", "tdigest"]
\ No newline at end of file
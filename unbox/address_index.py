@@ -0,0 +1,215 @@
+"""
+Exact-match address index - a fast path in front of the locator for well-formed addresses.
+
+The index is built from the prepared address points table that prepare_address_data writes. Each point is keyed by a
+64 bit hash of its normalized full address, in a couple of forms (with and without the ZIP code). The index is saved
+as flat numpy arrays - sorted hashes, the row each hash points to, coordinates, address_lid and labels - and opened
+memory-mapped, so every worker process shares one copy in the OS page cache. A lookup is one hash and a binary search.
+
+Keys that point at more than one location (say, a building's units without unit numbers) are dropped, so anything
+ambiguous falls through to the locator.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+from array import array
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from .address_normalize import normalize_address
+
+INDEX_FIELDS = ["house_number", "address", "unit", "city", "state", "ZIP5", "address_lid", "SHAPE@XY"]
+# each point is indexed under each of these forms of its address. The commas keep the fields apart when they're
+# normalized, so a city that starts with a directional (West Sacramento) isn't read as part of the street.
+KEY_FORMATS = (
+    "{address}, {unit}, {city}, {state} {zip}",
+    "{address}, {unit}, {city}, {state}",
+)
+# the fields of an index match - a subset of the locator's ~60 candidate fields, plus the address point's LID
+RESULT_FIELDS = ("Match_addr", "LongLabel", "Status", "Score", "Addr_type", "X", "Y", "DisplayX", "DisplayY", "address_lid")
+ARRAYS = ("hashes", "rows", "x", "y", "lid", "label_offsets")
+_ZIP_EXTENSION = re.compile(r"(\d{5})-\d{4}$")
+
+
+def address_hash(normalized: str) -> int:
+    return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _street(house_number, address) -> str:
+    """The street line, with the house number added if the address field doesn't start with it already"""
+    address = (address or "").strip()
+    house_number = str(house_number or "").strip()
+    if house_number and not address.startswith(house_number):
+        return f"{house_number} {address}"
+    return address
+
+
+def _label(address, unit, city, zip5) -> str:
+    street = f"{address} {unit}" if unit else address
+    return ", ".join(part for part in (street, city, zip5) if part)
+
+
+def build_address_index(address_points: str, index_folder: str) -> Dict[str, Any]:
+    """
+    Builds the index from a prepared address points table (see build_locator.prepare_address_data) into
+    index_folder. The arrays are written to a temporary folder first, then swapped in, so running workers never see
+    a half written index.
+    """
+    import arcpy  # imported here so serving from an existing index doesn't need arcpy
+
+    start = time.perf_counter()
+    hashes, rows, xs, ys, lids = array("Q"), array("q"), array("d"), array("d"), array("q")
+    label_offsets, labels = array("q", [0]), bytearray()
+    with arcpy.da.SearchCursor(address_points, INDEX_FIELDS, spatial_reference=arcpy.SpatialReference(4326)) as cursor:
+        for row, (house_number, address, unit, city, state, zip5, lid, (x, y)) in enumerate(cursor):
+            address = _street(house_number, address)
+            values = {"address": address, "unit": unit or "", "city": city or "", "state": state or "", "zip": zip5 or ""}
+            for key_format in KEY_FORMATS:
+                hashes.append(address_hash(normalize_address(key_format.format(**values))))
+                rows.append(row)
+            xs.append(x)
+            ys.append(y)
+            lids.append(int(lid) if lid is not None else -1)
+            labels.extend(_label(address, unit, city, zip5).encode("utf-8"))
+            label_offsets.append(len(labels))
+
+    hashes, rows = np.frombuffer(hashes, dtype=np.uint64), np.frombuffer(rows, dtype=np.int64)
+    if len(xs) < 2 ** 31:
+        rows = rows.astype(np.int32)  # a third less to map than int64
+    xs, ys = np.frombuffer(xs, dtype=np.float64), np.frombuffer(ys, dtype=np.float64)
+    hashes, rows, ambiguous = _unique_keys(hashes, rows, xs, ys)
+
+    temp_folder = f"{index_folder}_building"
+    shutil.rmtree(temp_folder, ignore_errors=True)
+    os.makedirs(temp_folder)
+    arrays = {
+        "hashes": hashes,
+        "rows": rows,
+        "x": xs,
+        "y": ys,
+        "lid": np.frombuffer(lids, dtype=np.int64),
+        "label_offsets": np.frombuffer(label_offsets, dtype=np.int64),
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(temp_folder, f"{name}.npy"), values)
+    with open(os.path.join(temp_folder, "labels.bin"), "wb") as labels_file:
+        labels_file.write(labels)
+    meta = {
+        "source": address_points,
+        "built": time.time(),
+        "points": len(xs),
+        "keys": len(hashes),
+        "ambiguous_keys_dropped": ambiguous,
+        "seconds": round(time.perf_counter() - start, 1),
+    }
+    with open(os.path.join(temp_folder, "meta.json"), "w") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+
+    if os.path.exists(index_folder):
+        old_folder = f"{index_folder}_old_{int(time.time())}"
+        os.replace(index_folder, old_folder)
+        shutil.rmtree(old_folder, ignore_errors=True)  # Windows won't delete files that are mapped - leave them
+    os.replace(temp_folder, index_folder)
+    print(f"Built address index with {len(hashes)} keys for {len(xs)} points in {meta['seconds']} seconds")
+    return meta
+
+
+def _unique_keys(hashes: np.ndarray, rows: np.ndarray, xs: np.ndarray, ys: np.ndarray):
+    """
+    Sorts by hash and collapses duplicate keys - keeping one row when every copy is at the same location and dropping
+    the key entirely when they disagree. Returns the sorted hashes, their rows and the number of keys dropped.
+    """
+    order = np.argsort(hashes, kind="stable")
+    hashes, rows = hashes[order], rows[order]
+    if not len(hashes):
+        return hashes, rows, 0
+    starts = np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]])
+    counts = np.diff(np.r_[starts, len(hashes)])
+    # a run agrees if its points' coordinates span (almost) nothing
+    spread = np.maximum(
+        np.maximum.reduceat(xs[rows], starts) - np.minimum.reduceat(xs[rows], starts),
+        np.maximum.reduceat(ys[rows], starts) - np.minimum.reduceat(ys[rows], starts),
+    )
+    keep = (counts == 1) | (spread < 1e-7)
+    return hashes[starts[keep]], rows[starts[keep]], int((~keep).sum())
+
+
+class AddressIndex(object):
+    """An index built by build_address_index, opened memory-mapped"""
+
+    def __init__(self, index_folder: str):
+        self.index_folder = index_folder
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(index_folder, f"{name}.npy"), mmap_mode="r"))
+        labels_path = os.path.join(index_folder, "labels.bin")
+        self.labels = np.memmap(labels_path, dtype=np.uint8, mode="r") if os.path.getsize(labels_path) else np.zeros(0, np.uint8)
+        with open(os.path.join(index_folder, "meta.json")) as meta_file:
+            self.meta = json.load(meta_file)
+        self._lock = threading.Lock()
+        self.lookups = self.hits = 0
+
+    def _find(self, normalized: str) -> Optional[int]:
+        key = np.uint64(address_hash(normalized))
+        position = int(np.searchsorted(self.hashes, key))
+        if position < len(self.hashes) and self.hashes[position] == key:
+            return int(self.rows[position])
+        return None
+
+    def lookup(self, address: str, normalized: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        A PointAddress result, or None when the address isn't an exact match. It only has RESULT_FIELDS, not every
+        field a locator candidate has, and it's the only candidate.
+        """
+        normalized = normalized or normalize_address(address)
+        row = self._find(normalized)
+        if row is None and _ZIP_EXTENSION.search(normalized):
+            row = self._find(_ZIP_EXTENSION.sub(r"\1", normalized))
+        with self._lock:
+            self.lookups += 1
+            self.hits += row is not None
+        if row is None:
+            return None
+        label = bytes(self.labels[self.label_offsets[row]:self.label_offsets[row + 1]]).decode("utf-8")
+        x, y = float(self.x[row]), float(self.y[row])
+        return {
+            "Match_addr": label,
+            "LongLabel": label,
+            "Status": "M",
+            "Score": 100,
+            "Addr_type": "PointAddress",
+            "X": x,
+            "Y": y,
+            "DisplayX": x,
+            "DisplayY": y,
+            "address_lid": int(self.lid[row]),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "index_folder": self.index_folder,
+                "keys": len(self.hashes),
+                "points": len(self.x),
+                "built": self.meta.get("built"),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else None,
+            }
+
+
+def open_or_build(index_folder: str, address_points: Optional[str] = None) -> AddressIndex:
+    """Opens the index, building it first if it doesn't exist yet and we know where the address points are"""
+    if not os.path.exists(os.path.join(index_folder, "meta.json")):
+        if not address_points:
+            raise FileNotFoundError(f"No address index at {index_folder} and no address points table to build one from")
+        build_address_index(address_points, index_folder)
+    return AddressIndex(index_folder)
@@ -0,0 +1,144 @@
+"""
+Light normalization of single line addresses so that trivially different spellings of the same address share a key.
+
+This isn't full address parsing, but it does look at where a word sits before abbreviating it, so that a street named
+North or Court doesn't end up with the same key as N or CT, and a city named West Sacramento isn't read as a street's
+directional. The address is split on commas first - the first segment is the street, and the rest are the unit, city,
+state and ZIP. Case, punctuation and whitespace are folded, and the common USPS words are abbreviated only in the
+positions they mean something:
+
+    - directionals in the street segment, right after the house number (when a street name follows) or right after
+      the street suffix (when nothing but a unit follows - without commas, "Main St West Sacramento" may be a city)
+    - the street suffix - the first suffix word after the street name, or the last of a run of them ("Park Place Way")
+    - unit designators after the street, or at the start of a segment of their own
+    - California as the state, at the end or before the ZIP
+
+"10860 Gold Center Drive, Rancho Cordova" and "10860 GOLD CENTER DR RANCHO CORDOVA" normalize to the same string, but
+"123 North St" and "123 N St" don't, and neither do "123 Main St W, Sacramento" and "123 Main St, West Sacramento".
+The output has no commas, so keys for the index (see address_index) should be built with them between the fields.
+"""
+
+import re
+
+# USPS Publication 28 standard abbreviations for the words we see most in California addresses
+STREET_SUFFIXES = {
+    "ALLEY": "ALY",
+    "AVENUE": "AVE",
+    "BOULEVARD": "BLVD",
+    "CIRCLE": "CIR",
+    "COURT": "CT",
+    "DRIVE": "DR",
+    "EXPRESSWAY": "EXPY",
+    "FREEWAY": "FWY",
+    "HIGHWAY": "HWY",
+    "LANE": "LN",
+    "LOOP": "LOOP",
+    "PARKWAY": "PKWY",
+    "PLACE": "PL",
+    "PLAZA": "PLZ",
+    "ROAD": "RD",
+    "SQUARE": "SQ",
+    "STREET": "ST",
+    "TERRACE": "TER",
+    "TRAIL": "TRL",
+    "WAY": "WAY",
+}
+DIRECTIONALS = {
+    "NORTH": "N",
+    "SOUTH": "S",
+    "EAST": "E",
+    "WEST": "W",
+    "NORTHEAST": "NE",
+    "NORTHWEST": "NW",
+    "SOUTHEAST": "SE",
+    "SOUTHWEST": "SW",
+}
+UNIT_DESIGNATORS = {
+    "APARTMENT": "APT",
+    "BUILDING": "BLDG",
+    "FLOOR": "FL",
+    "SUITE": "STE",
+    "UNIT": "UNIT",
+}
+STATES = {
+    "CALIFORNIA": "CA",
+}
+ABBREVIATIONS = {**STREET_SUFFIXES, **DIRECTIONALS, **UNIT_DESIGNATORS, **STATES}
+
+# spelled out or already abbreviated
+_SUFFIX_WORDS = set(STREET_SUFFIXES) | set(STREET_SUFFIXES.values())
+_DIRECTIONAL_WORDS = set(DIRECTIONALS) | set(DIRECTIONALS.values())
+_UNIT_WORDS = set(UNIT_DESIGNATORS) | set(UNIT_DESIGNATORS.values())
+
+# anything other than letters, digits, whitespace, hyphens (unit and number ranges) and slashes (1/2 addresses)
+_PUNCTUATION = re.compile(r"[^\w\s\-/]|_")
+_ZIP = re.compile(r"\d{5}(-\d{4})?$")
+
+
+def normalize_address(address: str) -> str:
+    segments = [_PUNCTUATION.sub(" ", segment.upper()).split() for segment in address.split(",")]
+    segments = [tokens for tokens in segments if tokens]
+    if not segments:
+        return ""
+    street, street_end = _normalize_street(segments[0])
+    output = street + [token for segment in segments[1:] for token in _normalize_segment(segment)]
+    tokens = [token for segment in segments for token in segment]
+
+    # the state is in a segment after the street, or after the street's words when there are no commas
+    state = len(tokens) - 2 if len(tokens) > 1 and _ZIP.match(tokens[-1]) else len(tokens) - 1
+    if state >= (len(segments[0]) if len(segments) > 1 else street_end) and tokens[state] in STATES:
+        output[state] = STATES[tokens[state]]
+
+    return " ".join(output)
+
+
+def _normalize_street(tokens):
+    """The street segment with its directionals, suffix and units abbreviated, and where the street itself ends"""
+    output = list(tokens)
+    name = 1 if any(character.isdigit() for character in tokens[0]) else 0  # skip the house number
+
+    if name < len(tokens) - 1 and tokens[name] in _DIRECTIONAL_WORDS and not _ends_street(tokens, name + 1):
+        output[name] = DIRECTIONALS.get(tokens[name], tokens[name])
+        name += 1
+
+    suffix = _street_suffix(tokens, name)
+    street_end = name + 1
+    if suffix is not None:
+        output[suffix] = STREET_SUFFIXES.get(tokens[suffix], tokens[suffix])
+        street_end = suffix + 1
+        # a directional after the suffix only counts when nothing but a unit follows it - otherwise, without commas,
+        # it may be the start of the city ("Main St West Sacramento")
+        following = tokens[street_end + 1:street_end + 2]
+        directional = street_end < len(tokens) and tokens[street_end] in _DIRECTIONAL_WORDS
+        if directional and (not following or following[0] in _UNIT_WORDS):
+            output[street_end] = DIRECTIONALS.get(tokens[street_end], tokens[street_end])
+            street_end += 1
+
+    for index in range(street_end, len(tokens)):
+        if tokens[index] in _UNIT_WORDS:
+            output[index] = UNIT_DESIGNATORS.get(tokens[index], tokens[index])
+    return output, street_end
+
+
+def _normalize_segment(tokens):
+    """A segment after the street - a unit ("Apt 4") gets its designator abbreviated, anything else is left alone"""
+    if tokens[0] in _UNIT_WORDS:
+        return [UNIT_DESIGNATORS.get(token, token) if token in _UNIT_WORDS else token for token in tokens]
+    return tokens
+
+
+def _ends_street(tokens, index) -> bool:
+    """Whether tokens[index] is the street suffix - a suffix word that isn't followed by another one"""
+    return tokens[index] in _SUFFIX_WORDS and not (index + 1 < len(tokens) and tokens[index + 1] in _SUFFIX_WORDS)
+
+
+def _street_suffix(tokens, name):
+    """Index of the street suffix, looking after the first street name word and before any unit designator"""
+    for index in range(name + 1, len(tokens)):
+        if tokens[index] in _UNIT_WORDS:
+            return None
+        if tokens[index] in _SUFFIX_WORDS:
+            while index + 1 < len(tokens) and tokens[index + 1] in _SUFFIX_WORDS:
+                index += 1
+            return index
+    return None
@@ -0,0 +1,129 @@
+"""
+Admission control for the dev shim.
+
+FastAPI runs our sync handlers on a thread pool that knows nothing about how many geocodes the locator can actually
+do at once, so under a spike every request starts, they all slow down together, and latency grows without bound.
+LocatorSlots puts a fixed set of Locator instances behind a bounded queue instead. A request takes an instance when
+one is free, waits in the queue when none are, and is turned away immediately with an Overloaded error (which the shim
+turns into a 503 with Retry-After) when the queue is already full or it has waited too long.
+
+Time spent waiting for an instance and time spent in the locator are recorded separately.
+"""
+
+import math
+import statistics
+import threading
+import time
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+
+class Overloaded(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _summary_ms(samples) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"mean": None, "p50": None, "p99": None}
+    ordered = sorted(samples)
+    return {
+        "mean": round(statistics.fmean(ordered) * 1000, 3),
+        "p50": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 3),
+    }
+
+
+class LocatorSlots(object):
+    """
+    A fixed set of Locator instances with a bounded queue in front of them.
+
+    :param locators: The instances to hand out. Their count is the maximum number of geocodes in flight.
+    :param max_queue: How many requests may wait for an instance before new ones are rejected
+    :param queue_timeout: Seconds a request may wait before it's rejected instead
+    :param sample_size: How many recent wait and service times to keep for the stats
+    """
+
+    def __init__(self, locators: List[Any], max_queue: int = 32, queue_timeout: float = 5.0, sample_size: int = 2000):
+        if not locators:
+            raise ValueError("LocatorSlots needs at least one locator instance")
+        self.locators = list(locators)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._free = list(locators)
+        self._condition = threading.Condition()
+        self.waiting = 0
+        self.admitted = self.rejected_full = self.rejected_timeout = 0
+        self.queue_waits = deque(maxlen=sample_size)
+        self.service_times = deque(maxlen=sample_size)
+
+    @property
+    def max_in_flight(self) -> int:
+        return len(self.locators)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.locators) - len(self._free)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained, based on recent service times"""
+        service = statistics.fmean(self.service_times) if self.service_times else 0.1
+        return max(1, math.ceil(service * (self.waiting + 1) / self.max_in_flight))
+
+    @contextmanager
+    def acquire(self):
+        """
+        Yields a free Locator instance and the seconds spent waiting for it. Raises Overloaded rather than waiting
+        when the queue is full or the wait passes queue_timeout.
+        """
+        start = time.perf_counter()
+        with self._condition:
+            if not self._free:
+                if self.waiting >= self.max_queue:
+                    self.rejected_full += 1
+                    raise Overloaded(f"Queue is full ({self.max_queue} waiting)", self.retry_after())
+                self.waiting += 1
+                try:
+                    if not self._condition.wait_for(lambda: self._free, timeout=self.queue_timeout):
+                        self.rejected_timeout += 1
+                        raise Overloaded(f"No locator free after {self.queue_timeout} seconds", self.retry_after())
+                finally:
+                    self.waiting -= 1
+                    self._condition.notify_all()
+            locator = self._free.pop()
+            self.admitted += 1
+        waited = time.perf_counter() - start
+
+        started = time.perf_counter()
+        try:
+            yield locator, waited
+        finally:
+            service = time.perf_counter() - started
+            with self._condition:
+                self._free.append(locator)
+                self.queue_waits.append(waited)
+                self.service_times.append(service)
+                self._condition.notify_all()  # a waiting request and anyone draining
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Waits for every instance to come back and the queue to empty. Returns False if that timed out."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self.waiting and len(self._free) == len(self.locators), timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "queue_timeout": self.queue_timeout,
+                "in_flight": self.in_flight,
+                "queued": self.waiting,
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_full,
+                "rejected_timeout": self.rejected_timeout,
+                "queue_wait_ms": _summary_ms(list(self.queue_waits)),
+                "locator_ms": _summary_ms(list(self.service_times)),
+            }
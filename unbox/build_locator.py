@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import csv
 import os
 import tempfile
+import time
 
 from dataclasses import dataclass
 from typing import Dict, Iterable, List, Optional, Tuple
@@ -9,6 +11,18 @@ from typing import Dict, Iterable, List, Optional, Tuple
 import arcpy
 import arcgis
 
+from . import stage_graph
+from .locator_reload import locator_size  # lives there so the shim can use it without arcpy
+from .spatial_order import spatially_ordered_copy
+
+# Fields joined onto parcels from the primary assessment in prepare_parcel_data
+PARCEL_ADDRESS_FIELDS = ["COUNTY", "SITE_ADDR", "SITE_HOUSE_NUMBER", "SITE_DIRECTION", "SITE_STREET_NAME", "SITE_MODE", "SITE_QUADRANT", "SITE_UNIT_PREFIX", "SITE_UNIT_NUMBER", "SITE_CITY", "SITE_STATE", "SITE_ZIP", "SITE_PLUS_4"]
+# Fields added to address points in prepare_address_data
+ADDRESS_ZIP_FIELDS = ["ZIP5", "ZIPEXT"]
+
+PREPARED_PARCELS_NAME = "parcels_with_addresses"
+PREPARED_ADDRESSES_NAME = "address_points"
+
 @dataclass
 class BuildConfig:
     input_gdb: str
@@ -33,18 +47,52 @@ class BuildConfig:
     output_folder: str = None
     parcel_gdb_name: str = "temp_parcels.gdb"
 
+    # Run the preparation stages concurrently in worker processes
+    parallel_stages: bool = True
+    max_workers: Optional[int] = None
+
+    # Sharded builds - one locator per county (shard_by="county") or per named group of county FIPS codes in
+    # region_groups, combined into a composite locator at output_locator_path. See locator_shards.
+    shard_by: Optional[str] = None
+    region_groups: Optional[Dict[str, List[str]]] = None
+    shard_manifest: Optional[str] = None
+
+    # JSON lines file where each build's row counts, timings and output size are recorded. The dry run planner
+    # uses these to estimate how long the next build will take. Nothing is recorded unless this is set.
+    telemetry_path: Optional[str] = None
+
+    # Write the prepared parcels and address points in "hilbert" or "zorder" curve order so features that are near
+    # each other are stored together. None leaves them in source order. See spatial_order.
+    spatial_order: Optional[str] = None
+
+    precision_type: str = "GLOBAL_EXTRA_HIGH"
+
     # Free-form config values: --config KEY=VALUE (repeatable)
     extra: Dict[str, str] | None = None
 
     def run_build(self):
+        """
+        Builds the locator. Returns the timings for each stage of the build (see make_locator), or a summary of
+        the shards that were rebuilt for sharded builds.
+        """
         if not self.output_folder:
             self.output_folder = os.path.dirname(self.output_locator_path)
 
+        if self.shard_by or self.region_groups:
+            if self.shard_by not in (None, "county"):
+                raise ValueError(f"Unsupported shard_by value {self.shard_by!r} - use 'county' or provide region_groups")
+            from . import locator_shards  # imported here because locator_shards builds on this module
+            return locator_shards.build_sharded_locator(self)
+
         if not self.temp_gdb:
             # Create the temporary geodatabase before running the rest of the code
             self.temp_gdb = make_temp_gdb(self.output_folder, self.parcel_gdb_name)
 
-        make_locator(
+        from . import build_planner  # imported here because build_planner builds on this module
+        row_counts = build_planner.role_row_counts(self) if self.telemetry_path else None
+
+        start = time.time()
+        results = make_locator(
             input_smartfabric_gdb=self.input_gdb,
             output_locator_path=self.output_locator_path,
             include_address_points=self.include_address_points,
@@ -57,8 +105,26 @@ class BuildConfig:
             temp_gdb=self.temp_gdb,
             portal_auth=self.portal_auth,
             portal=self.portal,
+            parallel=self.parallel_stages,
+            max_workers=self.max_workers,
+            spatial_order=self.spatial_order,
+            precision_type=self.precision_type,
         )
 
+        if self.telemetry_path:
+            build_planner.record_build(self, row_counts, results, time.time() - start)
+        return results
+
+    def run_matrix(self, variants: List[Dict], sample_addresses: Optional[List[str]] = None, max_workers: Optional[int] = None):
+        """
+        Builds several variants of this config from one shared preparation run and compares them. See locator_matrix.
+        """
+        if not self.output_folder:
+            self.output_folder = os.path.dirname(self.output_locator_path)
+
+        from . import locator_matrix  # imported here because locator_matrix builds on this module
+        return locator_matrix.run_build_matrix(self, variants, sample_addresses=sample_addresses, max_workers=max_workers)
+
 
 def make_temp_gdb(output_folder: str, gdb_name: str = "temp_parcels.gdb"):
     temp_folder = tempfile.mkdtemp(prefix="parcels_with_addresses_", dir=output_folder)
@@ -66,13 +132,15 @@ def make_temp_gdb(output_folder: str, gdb_name: str = "temp_parcels.gdb"):
     print(f"Temp GDB: {temp_gdb}")
     return temp_gdb
 
-def prepare_parcel_data(parcels, assessments, temp_gdb):
+def prepare_parcel_data(parcels, assessments, temp_gdb, where_clause=None, spatial_order=None):
     """
     Copies parcels to a temporary geodatabase and joins address information for use in building a locator.
 
     Args:
         parcels: Path to input parcels feature class
         assessments: Path to assessments table containing primary address information
+        where_clause: Optional SQL filter for the parcels to copy (e.g., a single county for sharded builds)
+        spatial_order: Optional curve ("hilbert" or "zorder") to order the copied parcels along
 
     Returns:
         Path to the output parcels feature class with joined address fields
@@ -80,8 +148,8 @@ def prepare_parcel_data(parcels, assessments, temp_gdb):
 
     print("Preparing statewide parcel data for locator by attaching address information")
     # Copy parcels to temp gdb
-    output_parcels = os.path.join(temp_gdb, "parcels_with_addresses")
-    arcpy.management.CopyFeatures(parcels, output_parcels)
+    output_parcels = os.path.join(temp_gdb, PREPARED_PARCELS_NAME)
+    _copy_features(parcels, output_parcels, where_clause, spatial_order)
 
     # Join address fields
     arcpy.management.JoinField(
@@ -89,17 +157,17 @@ def prepare_parcel_data(parcels, assessments, temp_gdb):
         in_field="PRIMARY_ASSESSMENT_LID",
         join_table=assessments,
         join_field="ASSESSMENT_LID",
-        fields=["COUNTY", "SITE_ADDR", "SITE_HOUSE_NUMBER", "SITE_DIRECTION", "SITE_STREET_NAME", "SITE_MODE", "SITE_QUADRANT", "SITE_UNIT_PREFIX", "SITE_UNIT_NUMBER", "SITE_CITY", "SITE_STATE", "SITE_ZIP", "SITE_PLUS_4"],
+        fields=PARCEL_ADDRESS_FIELDS,
         index_join_fields="NEW_INDEXES"
     )
 
     return output_parcels
 
-def prepare_address_data(addresses, temp_gdb):
+def prepare_address_data(addresses, temp_gdb, where_clause=None, spatial_order=None):
     # copy it out to temp, make zip5 and zip4 fields
     print("Preparing statewide address data for locator by splitting ZIP codes into separate fields for 5 digit and extension")
-    output_addresses = os.path.join(temp_gdb, "address_points")
-    arcpy.management.CopyFeatures(addresses, output_addresses)
+    output_addresses = os.path.join(temp_gdb, PREPARED_ADDRESSES_NAME)
+    _copy_features(addresses, output_addresses, where_clause, spatial_order)
 
     arcpy.management.AddField(output_addresses, "ZIP5", field_type="TEXT", field_length=5, field_is_nullable=True)
     arcpy.management.AddField(output_addresses, "ZIPEXT", field_type="TEXT", field_length=4, field_is_nullable=True)
@@ -109,6 +177,16 @@ def prepare_address_data(addresses, temp_gdb):
 
     return output_addresses
 
+def _copy_features(in_features, out_features, where_clause=None, spatial_order=None):
+    copy_path = f"{out_features}_unordered" if spatial_order else out_features
+    if where_clause:
+        arcpy.conversion.ExportFeatures(in_features, copy_path, where_clause=where_clause)
+    else:
+        arcpy.management.CopyFeatures(in_features, copy_path)
+
+    if spatial_order:
+        spatially_ordered_copy(copy_path, out_features, curve=spatial_order, delete_input=True)
+
 def copy_remote_to_local(cities=None, counties=None, zips=None, temp_gdb=None, portal_auth="pro", portal=None):
     if not ((cities and cities.startswith("http")) or (counties and counties.startswith("http")) or (zips and zips.startswith("http"))):
         return cities, counties, zips
@@ -158,43 +236,163 @@ def make_locator(
     temp_gdb=None,
     portal_auth="pro",
     portal=None,
+    parallel=True,
+    max_workers=None,
+    where_clause=None,
+    parcel_where_clause=None,
+    spatial_order=None,
+    precision_type="GLOBAL_EXTRA_HIGH",
 ):
+    """
+    Prepares the locator inputs and builds the locator. Remote downloads, parcel preparation and address point
+    preparation don't depend on each other, so they run as separate stages in worker processes, and CreateLocator
+    starts once all of them finish. Pass parallel=False to run them one after another in this process instead.
+
+    where_clause optionally limits the parcels and address points that go into the locator (for example, to the
+    counties in one shard - see locator_shards). parcel_where_clause, if given, is used for the parcels instead, for
+    when the same filter needs different SQL on each table (a field that's text in one and a number in the other). spatial_order optionally writes the prepared parcels and address
+    points in "hilbert" or "zorder" curve order (see spatial_order).
+
+    Returns:
+        dict of stage_graph.StageResult objects keyed by stage name, with timings for each stage
+    """
 
     if not temp_gdb:
         temp_gdb = make_temp_gdb(os.path.dirname(output_locator_path), "temp_parcels.gdb")
 
-    # do this first because we've had multiple failures in the download process and better to fail before doing
-    # the other setup work that takes time.
-    if cities or counties or zip_boundaries:
-        cities, counties, zip_boundaries = copy_remote_to_local(
+    # validate anything we were handed up front so we fail before doing the setup work that takes time
+    if include_parcels and parcels_with_addresses and not arcpy.Exists(parcels_with_addresses):
+        raise ValueError(f"Parcels with addresses path provided ({parcels_with_addresses}) does not exist as a valid ArcGIS-readable dataset.")
+    if zip_boundaries and not zip_boundaries.startswith("http") and not arcpy.Exists(zip_boundaries):
+        raise ValueError(f"ZIP boundaries path provided ({zip_boundaries}) does not exist as a valid ArcGIS-readable dataset.")
+
+    stages = _preparation_stages(
+        input_smartfabric_gdb=input_smartfabric_gdb,
+        include_address_points=include_address_points,
+        processed_address_points=processed_address_points,
+        include_parcels=include_parcels,
+        cities=cities,
+        counties=counties,
+        zip_boundaries=zip_boundaries,
+        parcels_with_addresses=parcels_with_addresses,
+        temp_gdb=temp_gdb,
+        portal_auth=portal_auth,
+        portal=portal,
+        where_clause=where_clause,
+        parcel_where_clause=parcel_where_clause,
+        spatial_order=spatial_order,
+    )
+
+    stages.append(stage_graph.Stage(
+        name="create_locator",
+        func=create_locator,
+        kwargs=dict(
+            input_smartfabric_gdb=input_smartfabric_gdb,
+            output_locator_path=output_locator_path,
+            addresses=processed_address_points if include_address_points else None,
+            parcels_with_addresses=parcels_with_addresses if include_parcels else None,
             cities=cities,
             counties=counties,
-            zips=zip_boundaries,
-            temp_gdb=temp_gdb,
-            portal_auth=portal_auth,
-            portal=portal,
-        )
+            tiger=tiger,
+            zip_boundaries=zip_boundaries,
+            precision_type=precision_type,
+        ),
+        depends_on=[stage.name for stage in stages],
+        resolve=_prepared_inputs,
+    ))
+
+    results = stage_graph.run_stage_graph(stages, max_workers=max_workers, parallel=parallel)
+    print(stage_graph.format_stage_report(stages, results))
+    return results
 
-    # prepare and validate parcel inputs
-    if include_parcels:
-        if not parcels_with_addresses:
-            # Prepare parcel data with address information
-            parcels_with_addresses = prepare_parcel_data(
+
+def _preparation_stages(
+    input_smartfabric_gdb,
+    include_address_points=True,
+    processed_address_points=None,
+    include_parcels=True,
+    cities=None,
+    counties=None,
+    zip_boundaries=None,
+    parcels_with_addresses=None,
+    temp_gdb=None,
+    portal_auth="pro",
+    portal=None,
+    where_clause=None,
+    parcel_where_clause=None,
+    spatial_order=None,
+) -> list[stage_graph.Stage]:
+    """
+    The stages that need to run before CreateLocator. They read different sources and write different
+    tables in the temp GDB, so none of them depend on each other.
+    """
+    stages = []
+
+    # we've had multiple failures in the download process - it runs alongside the slow preparation stages, and if it
+    # fails, run_stage_graph stops them right away rather than failing only after they finish
+    if any(layer and layer.startswith("http") for layer in (cities, counties, zip_boundaries)):
+        stages.append(stage_graph.Stage(
+            name="download_remote",
+            func=copy_remote_to_local,
+            kwargs=dict(cities=cities, counties=counties, zips=zip_boundaries, temp_gdb=temp_gdb, portal_auth=portal_auth, portal=portal),
+        ))
+
+    if include_parcels and not parcels_with_addresses:
+        stages.append(stage_graph.Stage(
+            name="prepare_parcels",
+            func=prepare_parcel_data,
+            kwargs=dict(
                 parcels=os.path.join(input_smartfabric_gdb, "Parcels"),
                 assessments=os.path.join(input_smartfabric_gdb, "Assessments"),
-                temp_gdb=temp_gdb
-            )
-        else:
-            if not arcpy.Exists(parcels_with_addresses):
-                raise ValueError(f"Parcels with addresses path provided ({parcels_with_addresses}) does not exist as a valid ArcGIS-readable dataset.")
-
+                temp_gdb=temp_gdb,
+                where_clause=parcel_where_clause or where_clause,
+                spatial_order=spatial_order,
+            ),
+        ))
+
+    if include_address_points and not processed_address_points:
+        stages.append(stage_graph.Stage(
+            name="prepare_addresses",
+            func=prepare_address_data,
+            kwargs=dict(addresses=os.path.join(input_smartfabric_gdb, "Addresses"), temp_gdb=temp_gdb, where_clause=where_clause, spatial_order=spatial_order),
+        ))
+
+    return stages
+
+
+def _prepared_inputs(completed: Dict[str, object]) -> Dict[str, str]:
+    """Maps outputs of the preparation stages onto create_locator's arguments"""
+    inputs = {}
+    if "download_remote" in completed:
+        inputs["cities"], inputs["counties"], inputs["zip_boundaries"] = completed["download_remote"]
+    if "prepare_parcels" in completed:
+        inputs["parcels_with_addresses"] = completed["prepare_parcels"]
+    if "prepare_addresses" in completed:
+        inputs["addresses"] = completed["prepare_addresses"]
+    return inputs
+
+
+def create_locator(
+    input_smartfabric_gdb,
+    output_locator_path,
+    addresses=None,
+    parcels_with_addresses=None,
+    cities=None,
+    counties=None,
+    tiger=None,
+    zip_boundaries=None,
+    precision_type="GLOBAL_EXTRA_HIGH",
+):
+    """
+    Runs CreateLocator on inputs that have already been prepared. Any role left as None is left out of the locator.
+    """
     # Prepare ZIP boundaries (optional)
     if zip_boundaries and not arcpy.Exists(zip_boundaries):
             raise ValueError(f"ZIP boundaries path provided ({zip_boundaries}) does not exist as a valid ArcGIS-readable dataset.")
 
     # prepare the data for the table mapping input
     table_mapping = []
-    if include_parcels:
+    if parcels_with_addresses:
         parcels_table = os.path.split(parcels_with_addresses)[1]  # in the field mapping, we just need the table name - we use the full path in the TABLE_MAPPING
         table_mapping.append((parcels_with_addresses, "Parcel"))
     else:
@@ -212,12 +410,7 @@ def make_locator(
     else:
         counties_table = None
 
-    if include_address_points:
-        if not processed_address_points:
-            initial_addresses_table = os.path.join(input_smartfabric_gdb, "Addresses")
-            addresses = prepare_address_data(initial_addresses_table, temp_gdb)
-        else:
-            addresses = processed_address_points
+    if addresses:
         table_mapping.insert(0, (addresses, "PointAddress"))
         addresses_table = os.path.split(addresses)[1]
     else:
@@ -266,10 +459,12 @@ def make_locator(
             alternatename_tables=None,
             alternate_field_mapping=None,
             custom_output_fields=None,
-            precision_type="GLOBAL_EXTRA_HIGH",
+            precision_type=precision_type,
             version_compatibility="CURRENT_VERSION"
         )
 
+    return output_locator_path
+
 
 def _get_locator_fields(
     addresses_table=None,
@@ -364,3 +559,45 @@ def _get_locator_fields(
         ])
 
     return values_mapping
+
+
+def read_address_corpus(csv_path) -> List[str]:
+    """Reads single line addresses from a CSV in our standard input schema (ID, STREET, CITY, STATE, ZIP)"""
+    with open(csv_path, "r") as csvfile:
+        return [f"{row['STREET']}, {row['CITY']}, {row['STATE']} {row['ZIP']}" for row in csv.DictReader(csvfile)]
+
+
+def geocode_benchmark(locator_path, addresses, max_results=1) -> Dict[str, float]:
+    """
+    Geocodes each single line address one at a time against a locator and reports latency, throughput and
+    match rate. Used to compare locator variants against each other on the same sample of addresses.
+    """
+    locator = arcpy.geocoding.Locator(locator_path)
+    if addresses:
+        locator.geocode(addresses[0], False, maxResults=max_results)  # the first query pages the locator in - don't count it
+
+    latencies = []
+    matched = 0
+    start = time.perf_counter()
+    for address in addresses:
+        call_start = time.perf_counter()
+        results = locator.geocode(address, False, maxResults=max_results)
+        latencies.append(time.perf_counter() - call_start)
+        if results:
+            matched += 1
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))] * 1000, 3) if latencies else None
+
+    return {
+        "addresses": len(addresses),
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(addresses) / elapsed, 1) if elapsed else None,
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "match_rate": round(matched / len(addresses), 4) if addresses else None,
+    }
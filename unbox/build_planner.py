@@ -0,0 +1,277 @@
+"""
+Dry run planning for locator builds.
+
+Checks everything CreateLocator needs before any of the expensive preparation runs: that every role table resolves,
+that every field referenced in the locator field mapping exists, and how many rows each role has. The prepared tables
+(parcels_with_addresses, address_points) don't exist yet during a dry run, so their schemas are worked out from their
+sources plus the fields the preparation steps add. Only metadata is read - field lists and row counts, which file
+geodatabases and feature services return without scanning the data.
+
+When BuildConfig.telemetry_path is set, each build records its row counts, stage timings and locator size, and those
+previous runs are used to estimate how long the next build will take and how large the locator will be.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import statistics
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import arcpy
+import arcgis
+
+from . import build_locator
+
+if TYPE_CHECKING:
+    from .build_locator import BuildConfig
+    from .stage_graph import StageResult
+
+
+@dataclass
+class RoleTable:
+    role: str
+    table_name: str  # the table name used in the locator field mapping
+    source: str  # path or URL the data will be read from
+
+    # fields the preparation step adds to the source before it goes into the locator
+    added_fields: List[str] = field(default_factory=list)
+
+    # other tables preparation reads, with the fields it needs from them: [(path, [fields])]
+    prep_requirements: List[Tuple[str, List[str]]] = field(default_factory=list)
+
+    fields: Optional[Dict[str, str]] = None  # lower-cased name: actual name, including added_fields
+    rows: Optional[int] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class BuildPlan:
+    roles: List[RoleTable]
+    errors: List[str]
+    warnings: List[str]
+    estimate: Optional[Dict[str, Any]] = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def report(self) -> str:
+        lines = [f"{'Role':<16}{'Table':<28}{'Rows':>14}  Source"]
+        for role in self.roles:
+            rows = f"{role.rows:,}" if role.rows is not None else "?"
+            lines.append(f"{role.role:<16}{role.table_name:<28}{rows:>14}  {role.source}")
+
+        for title, messages in (("Errors", self.errors), ("Warnings", self.warnings)):
+            if messages:
+                lines.append(f"{title}:")
+                lines.extend(f"  - {message}" for message in messages)
+
+        if self.estimate:
+            lines.append(
+                f"Estimated build time: {round(self.estimate['seconds'] / 3600, 2)} hours, estimated locator size: "
+                f"{round(self.estimate['locator_bytes'] / 1024 ** 3, 2)} GB "
+                f"(based on {self.estimate['runs_used']} previous run(s))"
+            )
+        else:
+            lines.append("No telemetry from previous runs - can't estimate build time or size")
+
+        lines.append("Plan OK" if self.ok else f"Plan has {len(self.errors)} error(s) - fix these before building")
+        return "\n".join(lines)
+
+
+def _is_url(source: str) -> bool:
+    return source.startswith("http")
+
+
+def _read_metadata(source) -> Tuple[Dict[str, str], int]:
+    """Returns ({lower-cased field name: field name}, row count) without reading any rows"""
+    if _is_url(source):
+        layer = arcgis.features.FeatureLayer(source)
+        names = [layer_field["name"] for layer_field in layer.properties.fields]
+        rows = layer.query(return_count_only=True)
+    else:
+        if not arcpy.Exists(source):
+            raise ValueError(f"{source} does not exist as a valid ArcGIS-readable dataset")
+        names = [table_field.name for table_field in arcpy.ListFields(source)]
+        rows = int(arcpy.management.GetCount(source)[0])
+    return {name.lower(): name for name in names}, rows
+
+
+def resolve_roles(cfg: "BuildConfig") -> List[RoleTable]:
+    """Works out which table fills each locator role and what it will be called in the field mapping"""
+    roles = []
+    gdb = cfg.input_gdb
+
+    if cfg.include_address_points:
+        addresses = os.path.join(gdb, "Addresses")
+        roles.append(RoleTable("PointAddress", build_locator.PREPARED_ADDRESSES_NAME, addresses,
+                               added_fields=build_locator.ADDRESS_ZIP_FIELDS,
+                               prep_requirements=[(addresses, ["ZIP"])]))
+
+    if cfg.include_parcels:
+        if cfg.parcels_with_addresses:
+            roles.append(RoleTable("Parcel", os.path.split(cfg.parcels_with_addresses)[1], cfg.parcels_with_addresses))
+        else:
+            parcels = os.path.join(gdb, "Parcels")
+            assessments = os.path.join(gdb, "Assessments")
+            roles.append(RoleTable("Parcel", build_locator.PREPARED_PARCELS_NAME, parcels,
+                                   added_fields=build_locator.PARCEL_ADDRESS_FIELDS,
+                                   prep_requirements=[(parcels, ["PRIMARY_ASSESSMENT_LID"]),
+                                                      (assessments, ["ASSESSMENT_LID"] + build_locator.PARCEL_ADDRESS_FIELDS)]))
+
+    # remote layers are saved into the temp GDB under these names by copy_remote_to_local
+    for role, source, remote_name in (("City", cfg.cities, "cities"),
+                                      ("Subregion", cfg.counties, "counties"),
+                                      ("StreetAddress", cfg.tiger, None),
+                                      ("Postal", cfg.zip_boundaries, "zip_boundaries")):
+        if source:
+            table_name = remote_name if _is_url(source) and remote_name else os.path.split(source)[1]
+            roles.append(RoleTable(role, table_name, source))
+
+    return roles
+
+
+def _load_metadata(roles: List[RoleTable], cfg: "BuildConfig"):
+    remote = [role for role in roles if _is_url(role.source)]
+    if remote:
+        try:
+            # same as copy_remote_to_local - creating the GIS makes it the active one used by FeatureLayer
+            arcgis.GIS(cfg.portal_auth if cfg.portal_auth == "pro" else cfg.portal)
+        except Exception as e:
+            for role in remote:
+                role.error = f"Could not sign in to read {role.role} source {role.source}: {e!s}"
+
+    for role in roles:
+        if role.error:
+            continue
+        try:
+            role.fields, role.rows = _read_metadata(role.source)
+            role.fields.update({added.lower(): added for added in role.added_fields})
+        except Exception as e:
+            role.error = f"Could not read {role.role} source {role.source}: {e!s}"
+
+
+def role_row_counts(cfg: "BuildConfig") -> Dict[str, int]:
+    """
+    Row counts of the local role tables, for telemetry. Remote layers are left out so recording a build never signs
+    in to the portal - they're small next to the parcels and address points anyway.
+    """
+    roles = [role for role in resolve_roles(cfg) if not _is_url(role.source)]
+    _load_metadata(roles, cfg)
+    return _local_row_counts(roles)
+
+
+def _local_row_counts(roles: List[RoleTable]) -> Dict[str, int]:
+    return {role.role: role.rows for role in roles if role.rows is not None and not _is_url(role.source)}
+
+
+def plan_build(cfg: "BuildConfig") -> BuildPlan:
+    roles = resolve_roles(cfg)
+    errors = []
+    warnings = []
+
+    if not roles:
+        errors.append("No input tables provided for locator - likely misconfiguration of input flags")
+
+    _load_metadata(roles, cfg)
+    for role in roles:
+        if role.error:
+            errors.append(role.error)
+        elif role.rows == 0:
+            warnings.append(f"{role.role} source {role.source} has no rows")
+
+    by_table = {role.table_name.lower(): role for role in roles}
+    mapping = build_locator._get_locator_fields(**_mapping_table_names(roles))
+
+    seen = set()
+    for entry in mapping:
+        role_field, table_field = entry.split(" ", 1)
+        table_name, field_name = table_field.rsplit(".", 1)
+        if role_field in seen:
+            warnings.append(f"{role_field} is mapped more than once - only one of the mappings will be used")
+        seen.add(role_field)
+
+        role = by_table.get(table_name.lower())
+        if role is None:
+            errors.append(f"{role_field} refers to table {table_name}, which isn't one of the locator's inputs")
+        elif role.fields is not None and field_name.lower() not in role.fields:
+            errors.append(f"{role_field} is mapped to {table_name}.{field_name}, but {role.source} has no field {field_name}")
+
+    for role in roles:
+        for path, required in role.prep_requirements:
+            try:
+                available, _ = _read_metadata(path)
+            except Exception as e:
+                errors.append(f"Could not read {path}, needed to prepare {role.role}: {e!s}")
+                continue
+            missing = [name for name in required if name.lower() not in available]
+            if missing:
+                errors.append(f"Preparing {role.role} needs field(s) {', '.join(missing)} on {path}")
+
+    # telemetry only has local row counts (see role_row_counts), so estimate from the same ones
+    estimate = estimate_build(_local_row_counts(roles), cfg.telemetry_path) if cfg.telemetry_path else None
+    return BuildPlan(roles=roles, errors=errors, warnings=warnings, estimate=estimate)
+
+
+def _mapping_table_names(roles: List[RoleTable]) -> Dict[str, str]:
+    """Table names keyed by _get_locator_fields' argument names"""
+    keys = {"PointAddress": "addresses_table", "Parcel": "parcels_table", "City": "cities_table",
+            "Subregion": "counties_table", "StreetAddress": "tiger_table", "Postal": "zips_table"}
+    return {keys[role.role]: role.table_name for role in roles}
+
+
+def read_telemetry(telemetry_path) -> List[Dict[str, Any]]:
+    if not telemetry_path or not os.path.exists(telemetry_path):
+        return []
+    runs = []
+    with open(telemetry_path, "r") as telemetry_file:
+        for line in telemetry_file:
+            if line.strip():
+                try:
+                    runs.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # a partially written line from an interrupted run
+    return runs
+
+
+def estimate_build(row_counts: Dict[str, int], telemetry_path, max_runs: int = 10) -> Optional[Dict[str, Any]]:
+    """
+    Scales the median seconds-per-row and bytes-per-row of recent runs to these row counts. Runs that used
+    the same set of roles are preferred since, for example, TIGER rows are much cheaper than address points.
+    """
+    runs = [run for run in read_telemetry(telemetry_path) if run.get("total_rows") and run.get("seconds")]
+    if not runs or not row_counts:
+        return None
+
+    same_roles = [run for run in runs if set(run.get("row_counts", {})) == set(row_counts)]
+    runs = (same_roles or runs)[-max_runs:]
+    total_rows = sum(row_counts.values())
+
+    return {
+        "runs_used": len(runs),
+        "seconds": total_rows * statistics.median(run["seconds"] / run["total_rows"] for run in runs),
+        "locator_bytes": total_rows * statistics.median(run.get("locator_bytes", 0) / run["total_rows"] for run in runs),
+    }
+
+
+def record_build(cfg: "BuildConfig", row_counts: Optional[Dict[str, int]], results: Dict[str, "StageResult"], seconds: float):
+    """Appends a finished build to the telemetry file. Problems here never fail the build."""
+    try:
+        record = {
+            "recorded_at": datetime.datetime.now().isoformat(),
+            "output_locator": cfg.output_locator_path,
+            "row_counts": row_counts or {},
+            "total_rows": sum((row_counts or {}).values()),
+            "seconds": round(seconds, 1),
+            "stages": {name: round(result.duration, 1) for name, result in results.items()},
+            "locator_bytes": build_locator.locator_size(cfg.output_locator_path),
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(cfg.telemetry_path)), exist_ok=True)
+        with open(cfg.telemetry_path, "a") as telemetry_file:
+            telemetry_file.write(json.dumps(record) + "\n")
+    except Exception as e:
+        print(f"Could not record build telemetry to {cfg.telemetry_path}: {e!s}")
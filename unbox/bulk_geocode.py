@@ -0,0 +1,244 @@
+"""
+Streaming bulk geocoding - for files too big to send through /batch as one JSON array.
+
+Rows are read a chunk at a time from a CSV or NDJSON stream, geocoded in LocatorPool worker processes, and written out
+(or streamed back to the client) in input order as chunks finish. Only a bounded number of chunks are in flight at
+once, so memory use stays the same no matter how big the input is.
+
+Inputs either have a single line "address" column or our standard input schema (ID, STREET, CITY, STATE, ZIP). Rows
+are identified by their ID column, or by their row number when there isn't one. Since output is in input order,
+resuming after an interruption only needs the last ID that was written - rows up to and including it are skipped.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import json
+import os
+
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from .locator_pool import LocatorPool
+
+OUTPUT_FIELDS = ["id", "address", "status", "score", "match_addr", "addr_type", "x", "y", "error"]
+# the locator fields output_row uses - workers send back only these
+LOCATOR_FIELDS = ["Score", "Match_addr", "Addr_type", "X", "Y"]
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _input_row(record: Dict[str, Any], row_number: int) -> Dict[str, Any]:
+    fields = {key.lower(): value for key, value in record.items() if key}
+    address = fields.get("address")
+    if address is None:
+        address = f"{fields.get('street', '')}, {fields.get('city', '')}, {fields.get('state', '')} {fields.get('zip', '')}"
+    row_id = fields.get("id")
+    return {"id": str(row_id) if row_id not in (None, "") else str(row_number), "address": address.strip(" ,")}
+
+
+def read_rows(lines: Iterable[str], input_format: str) -> Iterator[Dict[str, Any]]:
+    """Parses CSV or NDJSON lines into {"id", "address"} dicts, lazily"""
+    if input_format == "csv":
+        records = csv.DictReader(lines)
+    else:
+        records = (json.loads(line) for line in lines if line.strip())
+    for row_number, record in enumerate(records, start=1):
+        yield _input_row(record, row_number)
+
+
+async def aread_rows(chunks: AsyncIterator[bytes], input_format: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    read_rows for an uploaded request body arriving in arbitrary byte chunks. CSV rows are parsed a line at a time,
+    so quoted values can't contain line breaks here.
+    """
+    header = None
+    row_number = 0
+    async for line in _aiter_lines(chunks):
+        if not line.strip():
+            continue
+        if input_format == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = values
+                continue
+            record = dict(zip(header, values))
+        else:
+            record = json.loads(line)
+        row_number += 1
+        yield _input_row(record, row_number)
+
+
+async def _aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    remainder = b""
+    async for chunk in chunks:
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if remainder:
+        yield remainder.decode("utf-8-sig").rstrip("\r")
+
+
+def _resume_not_found(resume_after: str) -> ValueError:
+    return ValueError(f"Row ID {resume_after} to resume after isn't in the input - check that it's the same input file")
+
+
+def skip_completed(rows: Iterable[Dict[str, Any]], resume_after: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """Skips rows up to and including the one with ID resume_after. Raises ValueError if there isn't one."""
+    rows = iter(rows)
+    if resume_after is not None:
+        for row in rows:
+            if row["id"] == resume_after:
+                break
+        else:
+            raise _resume_not_found(resume_after)
+    yield from rows
+
+
+async def askip_completed(rows: AsyncIterator[Dict[str, Any]], resume_after: Optional[str]) -> AsyncIterator[Dict[str, Any]]:
+    skipping = resume_after is not None
+    async for row in rows:
+        if skipping:
+            skipping = row["id"] != resume_after
+            continue
+        yield row
+    if skipping:
+        raise _resume_not_found(resume_after)
+
+
+def output_row(row: Dict[str, Any], output: Dict[str, Any]) -> Dict[str, Any]:
+    """Flattens the best candidate for a row into our output schema"""
+    out = {field: None for field in OUTPUT_FIELDS}
+    out.update(id=row["id"], address=row["address"])
+    if "error" in output:
+        out.update(status="E", error=output["error"])
+    elif output.get("results"):
+        best = output["results"][0]
+        out.update(status="M", score=best.get("Score"), match_addr=best.get("Match_addr"), addr_type=best.get("Addr_type"), x=best.get("X"), y=best.get("Y"))
+    else:
+        out["status"] = "U"
+    return out
+
+
+def format_row(row: Dict[str, Any], output_format: str) -> str:
+    if output_format == "ndjson":
+        return json.dumps(row) + "\n"
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(["" if row[field] is None else row[field] for field in OUTPUT_FIELDS])
+    return buffer.getvalue()
+
+
+def format_header(output_format: str) -> str:
+    return ",".join(OUTPUT_FIELDS) + "\n" if output_format == "csv" else ""
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def geocode_rows(rows: Iterable[Dict[str, Any]], pool: LocatorPool, chunk_size: int = DEFAULT_CHUNK_SIZE, max_pending: Optional[int] = None, max_locations: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Geocodes rows across the pool and yields output rows in input order. At most max_pending chunks (two per worker
+    by default) are read ahead of the output.
+    """
+    max_pending = max_pending or pool.workers * 2
+    pending = deque()
+    for chunk in _chunks(rows, chunk_size):
+        pending.append((chunk, pool.submit([row["address"] for row in chunk], max_locations, LOCATOR_FIELDS)))
+        while len(pending) >= max_pending:
+            chunk_done, future = pending.popleft()
+            yield from map(output_row, chunk_done, future.result())
+    while pending:
+        chunk_done, future = pending.popleft()
+        yield from map(output_row, chunk_done, future.result())
+
+
+async def ageocode_rows(rows: AsyncIterator[Dict[str, Any]], pool: LocatorPool, chunk_size: int = DEFAULT_CHUNK_SIZE, max_pending: Optional[int] = None, max_locations: int = 1) -> AsyncIterator[Dict[str, Any]]:
+    """geocode_rows for the shim's streaming endpoint, without blocking the event loop"""
+    max_pending = max_pending or pool.workers * 2
+    pending = deque()
+    chunk = []
+
+    async def drain(limit):
+        while len(pending) > limit:
+            chunk_done, future = pending.popleft()
+            for row, output in zip(chunk_done, await asyncio.wrap_future(future)):
+                yield output_row(row, output)
+
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            pending.append((chunk, pool.submit([item["address"] for item in chunk], max_locations, LOCATOR_FIELDS)))
+            chunk = []
+            async for out in drain(max_pending - 1):
+                yield out
+    if chunk:
+        pending.append((chunk, pool.submit([item["address"] for item in chunk], max_locations, LOCATOR_FIELDS)))
+    async for out in drain(0):
+        yield out
+
+
+def last_written_id(output_path: str, output_format: str) -> Optional[str]:
+    """
+    ID of the last complete row in an output file, so a run can pick up after it. A partial last line (from being
+    killed mid-write) is cut off the file.
+    """
+    if not os.path.exists(output_path):
+        return None
+    with open(output_path, "rb+") as output_file:
+        output_file.seek(0, os.SEEK_END)
+        size = output_file.tell()
+        output_file.seek(max(0, size - 65536))
+        tail = output_file.read()
+        if tail and not tail.endswith(b"\n"):
+            complete = tail.rfind(b"\n") + 1
+            output_file.truncate(size - len(tail) + complete)
+            tail = tail[:complete]
+    lines = [line for line in tail.decode("utf-8").split("\n") if line.strip()]
+    if not lines:
+        return None
+    if output_format == "ndjson":
+        return str(json.loads(lines[-1])["id"])
+    values = next(csv.reader([lines[-1]]))
+    return None if values == OUTPUT_FIELDS else values[0]
+
+
+def geocode_file(input_path: str, output_path: str, pool: LocatorPool, chunk_size: int = DEFAULT_CHUNK_SIZE, resume: bool = False, input_format: Optional[str] = None, output_format: Optional[str] = None) -> int:
+    """
+    Geocodes a CSV or NDJSON file into another one, flushing as chunks finish. With resume, rows already in the output
+    file are skipped and new rows are appended. Returns the number of rows geocoded in this run.
+    """
+    input_format = input_format or _format_for(input_path)
+    output_format = output_format or _format_for(output_path)
+    resume_after = last_written_id(output_path, output_format) if resume else None
+    appending = resume and os.path.exists(output_path) and os.path.getsize(output_path) > 0
+
+    count = 0
+    with open(input_path, "r", newline="", encoding="utf-8-sig") as input_file, \
+            open(output_path, "a" if appending else "w", newline="", encoding="utf-8") as output_file:
+        if not appending:
+            output_file.write(format_header(output_format))
+        rows = skip_completed(read_rows(input_file, input_format), resume_after)
+        for out in geocode_rows(rows, pool, chunk_size=chunk_size):
+            output_file.write(format_row(out, output_format))
+            count += 1
+            if count % chunk_size == 0:
+                output_file.flush()
+                print(f"{count} rows geocoded")
+    return count
+
+
+def _format_for(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension in ("ndjson", "jsonl"):
+        return "ndjson"
+    return "csv"
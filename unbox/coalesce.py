@@ -0,0 +1,74 @@
+"""
+Single-flight request coalescing for the dev shim.
+
+When a client retries, or lots of clients ask for the same address at once before it's in the result cache, every one
+of those requests would otherwise make its own identical locator call. SingleFlight lets the first request for a key
+make the call while the rest wait for it and get the same result (or the same exception). Locator load stays flat
+during a spike even with a cold cache.
+
+Results are shared between the requests, so callers must not mutate them - the shim only ever copies results
+(serialization.project) before changing anything.
+"""
+
+import threading
+
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Runs at most one call per key at a time - concurrent callers with the same key share it"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        """Returns function()'s result, calling it only if no call for key is already running"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]  # later requests start a new call (or hit the cache the result went into)
+            call.done.set()
+        return call.result
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.calls + self.coalesced
+            return {
+                "calls": self.calls,
+                "calls_saved": self.coalesced,
+                "in_flight": len(self._calls),
+                "saved_rate": round(self.coalesced / requests, 4) if requests else None,
+            }
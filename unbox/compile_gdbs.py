@@ -8,6 +8,8 @@ import arcpy
 
 import logging
 
+from .spatial_order import reorder_in_place
+
 # Remove indexes before appending.
 # Run Check/Repair Geometry on counties before merge
 # Copy zoning data into GDB too!
@@ -55,6 +57,9 @@ class GDBMerge(object):
 
     _create_indexes = True
 
+    spatial_order = None  # "hilbert" or "zorder" to rewrite SPATIAL_ORDER_TABLES in space-filling curve order after appending
+    SPATIAL_ORDER_TABLES = ["Parcels", "Buildings", "Addresses"]
+
     MANYTOMANY_RELATIONSHIPS = [
         {
             "RelationName": "BuildingParcelRelation",
@@ -301,6 +306,9 @@ class GDBMerge(object):
 
         self.append_all_gdbs()
 
+        if self.spatial_order:
+            self.spatially_order_tables()  # before the indexes are rebuilt so the rewrite doesn't have to maintain them
+
         if self._create_indexes:
             self.create_indexes(drop_first=False)  # Our ideal is for this to happen after the appends and before the relationship classes. Since we're building relationship classes manually, this now happens last, except for non-attributed relationships
             self.recreate_spatial_indexes() # we want this after the append so that the optimal grid size gets recalculated and the index is rebuilt
@@ -415,6 +423,18 @@ class GDBMerge(object):
                 input_data = [os.path.join(self._zip_to_gdb_name(z), dataset) for z in self.zips_by_size] # get a list with all the inputs and we can run them at once!
                 arcpy.management.Append(input_data, os.path.join(self.output_gdb_path, dataset))
 
+    def spatially_order_tables(self, tables=None):
+        """
+            Rewrites the merged tables so features are stored in space-filling curve order of their centroids rather than
+            county-append order. Can also be run on its own against an existing merged GDB (see _bypass_merge) - run
+            recreate_spatial_indexes afterward in that case.
+        """
+        if tables is None:
+            tables = self.SPATIAL_ORDER_TABLES
+
+        for table in tables:
+            reorder_in_place(os.path.join(self.output_gdb_path, table), curve=self.spatial_order or "hilbert")
+
     def _get_field_listing(self, table, drop_sys=None, prefixes=None):
         if prefixes is None:
             prefixes = {"Buildings":"Buildings_", "Assessments": "Assessments_", "Parcels": "Parcels_", "Addresses": "Addresses_", "BuildingParcelRelation": "BPR_"}
@@ -0,0 +1,251 @@
+"""
+Point-in-polygon enrichment - tags geocode results with their county FIPS, city GEOID, ZIP and census block group.
+
+Each boundary layer (the cities, counties and ZIP layers copy_remote_to_local downloads, plus optional block groups) is
+bulk loaded into an in-memory PolygonLayer:
+
+* a uniform grid over the layer, with each cell listing the polygon edges that pass through it
+* a reference point inside each cell, with the polygon that contains it worked out when the layer is loaded
+
+To find the polygon a point is in, we walk from the point to its cell's reference point - across, then up or down -
+and count how many times that path crosses each polygon's edges. Each crossing flips in/out, so the point is in the
+reference point's polygon unless we crossed out of it, or in whichever polygon we crossed into. The path never leaves
+the cell, so only the cell's own edges are checked, and it's all done with numpy for a whole batch of points at once.
+
+Polygons in a layer are assumed not to overlap, as is the case for all of these layers.
+"""
+
+from __future__ import annotations
+
+import math
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# result field: (layer value field, grid cell size in degrees). Field names match the locator build's field mappings.
+LAYERS = {
+    "county_fips": ("CENSUS_GEOID", 0.02),
+    "city_geoid": ("CENSUS_GEOID", 0.01),
+    "zip": ("ZIP_CODE", 0.01),
+    "block_group": ("GEOID", 0.005),
+}
+QUERY_CHUNK_SIZE = 65536
+# reference points sit just off each cell's center so they don't line up with the round coordinates real vertices
+# tend to have
+_REFERENCE_OFFSET = (0.5037, 0.4971)
+
+
+class PolygonLayer(object):
+    """
+    One layer's polygons, gridded for fast lookups.
+
+    :param polygons: (value, rings) for each polygon, where rings are (n, 2) arrays of lon/lat vertices. Holes and
+        multipart polygons are just more rings - the even-odd rule sorts them out.
+    :param cell_size: Grid cell size in degrees. Smaller cells mean fewer edges to check per point, but more memory.
+    """
+
+    def __init__(self, name: str, polygons: Iterable[Tuple[Any, Sequence[np.ndarray]]], cell_size: float = 0.01):
+        self.name = name
+        self.cell_size = cell_size
+        self.values: List[Any] = []
+        x1, y1, x2, y2, owner = [], [], [], [], []
+        for value, rings in polygons:
+            polygon_id = len(self.values)
+            self.values.append(value)
+            for ring in rings:
+                ring = np.asarray(ring, dtype=np.float64)
+                if len(ring) < 3:
+                    continue
+                closed = np.vstack([ring, ring[:1]]) if (ring[0] != ring[-1]).any() else ring
+                x1.append(closed[:-1, 0])
+                y1.append(closed[:-1, 1])
+                x2.append(closed[1:, 0])
+                y2.append(closed[1:, 1])
+                owner.append(np.full(len(closed) - 1, polygon_id, dtype=np.int32))
+        empty = np.zeros(0)
+        self.x1, self.y1, self.x2, self.y2 = (np.concatenate(part) if part else empty for part in (x1, y1, x2, y2))
+        self.owner = np.concatenate(owner) if owner else np.zeros(0, dtype=np.int32)
+        self._build_grid()
+        self._build_references()
+
+    def _cell_range(self, low, high, origin, count):
+        first = np.clip(np.floor((low - origin) / self.cell_size).astype(np.int64), 0, count - 1)
+        last = np.clip(np.floor((high - origin) / self.cell_size).astype(np.int64), 0, count - 1)
+        return first, last
+
+    def _build_grid(self):
+        """Lists each edge under every cell its bounding box touches, as a CSR array sorted by cell"""
+        if len(self.x1):
+            self.x0 = float(min(self.x1.min(), self.x2.min())) - self.cell_size / 2
+            self.y0 = float(min(self.y1.min(), self.y2.min())) - self.cell_size / 2
+            self.nx = math.ceil((max(self.x1.max(), self.x2.max()) - self.x0) / self.cell_size) + 1
+            self.ny = math.ceil((max(self.y1.max(), self.y2.max()) - self.y0) / self.cell_size) + 1
+        else:
+            self.x0 = self.y0 = 0.0
+            self.nx = self.ny = 1
+        i0, i1 = self._cell_range(np.minimum(self.x1, self.x2), np.maximum(self.x1, self.x2), self.x0, self.nx)
+        j0, j1 = self._cell_range(np.minimum(self.y1, self.y2), np.maximum(self.y1, self.y2), self.y0, self.ny)
+        widths = i1 - i0 + 1
+        counts = widths * (j1 - j0 + 1)
+        edge = np.repeat(np.arange(len(self.x1)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = (j0[edge] + local // widths[edge]) * self.nx + i0[edge] + local % widths[edge]
+        order = np.argsort(cells, kind="stable")
+        self.cell_edges = edge[order]
+        self.cell_offsets = np.r_[0, np.cumsum(np.bincount(cells, minlength=self.nx * self.ny))]
+
+    def _reference_points(self, cells):
+        i, j = cells % self.nx, cells // self.nx
+        return self.x0 + (i + _REFERENCE_OFFSET[0]) * self.cell_size, self.y0 + (j + _REFERENCE_OFFSET[1]) * self.cell_size
+
+    def _build_references(self):
+        """
+        Finds the polygon containing each cell's reference point, a grid row at a time. Along a row's line, each
+        polygon's edge crossings pair up (sorted by x) into the spans that are inside it, and each reference point is
+        looked up among those spans.
+        """
+        self.reference = np.full(self.nx * self.ny, -1, dtype=np.int32)
+        centers = self.x0 + (np.arange(self.nx) + _REFERENCE_OFFSET[0]) * self.cell_size
+        for row in range(self.ny):
+            y = self.y0 + (row + _REFERENCE_OFFSET[1]) * self.cell_size
+            edges = np.unique(self.cell_edges[self.cell_offsets[row * self.nx]:self.cell_offsets[(row + 1) * self.nx]])
+            edges = edges[(self.y1[edges] > y) != (self.y2[edges] > y)]
+            if not len(edges):
+                continue
+            x1, y1, x2, y2 = self.x1[edges], self.y1[edges], self.x2[edges], self.y2[edges]
+            crossings = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+            owners = self.owner[edges]
+            order = np.lexsort((crossings, owners))
+            crossings, owners = crossings[order], owners[order]
+            group_starts = np.r_[0, np.flatnonzero(owners[1:] != owners[:-1]) + 1]
+            rank = np.arange(len(owners)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(owners)]))
+            opens = np.flatnonzero((rank % 2 == 0)[:-1] & (owners[1:] == owners[:-1]))
+            starts, ends, span_owner = crossings[opens], crossings[opens + 1], owners[opens]
+            by_start = np.argsort(starts)
+            starts, ends, span_owner = starts[by_start], ends[by_start], span_owner[by_start]
+            span = np.searchsorted(starts, centers, side="right") - 1
+            inside = (span >= 0) & (centers < ends[np.maximum(span, 0)])
+            self.reference[row * self.nx:(row + 1) * self.nx] = np.where(inside, span_owner[np.maximum(span, 0)], -1)
+
+    def _lookup_chunk(self, px: np.ndarray, py: np.ndarray) -> np.ndarray:
+        found = np.full(len(px), -1, dtype=np.int64)
+        i = np.floor((px - self.x0) / self.cell_size)
+        j = np.floor((py - self.y0) / self.cell_size)
+        valid = np.flatnonzero((i >= 0) & (i < self.nx) & (j >= 0) & (j < self.ny))
+        if not len(valid):
+            return found
+        px, py = px[valid], py[valid]
+        cells = j[valid].astype(np.int64) * self.nx + i[valid].astype(np.int64)
+        rx, ry = self._reference_points(cells)
+        reference = self.reference[cells].astype(np.int64)
+
+        # every (point, edge in the point's cell) pair
+        starts, counts = self.cell_offsets[cells], self.cell_offsets[cells + 1] - self.cell_offsets[cells]
+        point = np.repeat(np.arange(len(cells)), counts)
+        edge = self.cell_edges[np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())]
+        x1, y1, x2, y2 = self.x1[edge], self.y1[edge], self.x2[edge], self.y2[edge]
+        qx, qy, rxp, ryp = px[point], py[point], rx[point], ry[point]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # across, from the point to the reference point's x
+            at_x = x1 + (qy - y1) * (x2 - x1) / (y2 - y1)
+            across = ((y1 > qy) != (y2 > qy)) & (at_x > np.minimum(qx, rxp)) & (at_x <= np.maximum(qx, rxp))
+            # then up or down to the reference point
+            at_y = y1 + (rxp - x1) * (y2 - y1) / (x2 - x1)
+            vertical = ((x1 > rxp) != (x2 > rxp)) & (at_y > np.minimum(qy, ryp)) & (at_y <= np.maximum(qy, ryp))
+        crossed = across != vertical  # crossing the same edge on both legs cancels out
+
+        # polygons crossed an odd number of times
+        polygons = max(len(self.values), 1)
+        keys, crossings = np.unique(point[crossed] * polygons + self.owner[edge[crossed]], return_counts=True)
+        odd = keys[crossings % 2 == 1]
+        odd_point, odd_polygon = odd // polygons, odd % polygons
+        left = odd_polygon == reference[odd_point]
+        result = reference.copy()
+        result[odd_point[left]] = -1
+        result[odd_point[~left]] = odd_polygon[~left]
+        found[valid] = result
+        return found
+
+    def lookup(self, lons, lats) -> np.ndarray:
+        """Index into .values of the polygon containing each point, or -1 for points in no polygon"""
+        lons, lats = np.atleast_1d(np.asarray(lons, dtype=np.float64)), np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        found = np.empty(len(lons), dtype=np.int64)
+        for start in range(0, len(lons), QUERY_CHUNK_SIZE):
+            chunk = slice(start, start + QUERY_CHUNK_SIZE)
+            found[chunk] = self._lookup_chunk(lons[chunk], lats[chunk])
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "polygons": len(self.values),
+            "edges": len(self.x1),
+            "cells": self.nx * self.ny,
+            "mean_edges_per_cell": round(len(self.cell_edges) / max(1, int((np.diff(self.cell_offsets) > 0).sum())), 1),
+        }
+
+
+def read_polygons(feature_class: str, value_field: str) -> Iterable[Tuple[Any, List[np.ndarray]]]:
+    """(value, rings) for every polygon in a feature class, in WGS84"""
+    import arcpy  # imported here so the index itself can be used and tested without arcpy
+
+    with arcpy.da.SearchCursor(feature_class, [value_field, "SHAPE@"], spatial_reference=arcpy.SpatialReference(4326)) as cursor:
+        for value, shape in cursor:
+            if shape is None:
+                continue
+            rings = []
+            for part in shape:
+                ring = []
+                for point in part:
+                    if point is None:  # an interior ring starts
+                        rings.append(np.array(ring))
+                        ring = []
+                    else:
+                        ring.append((point.X, point.Y))
+                rings.append(np.array(ring))
+            yield value, rings
+
+
+class PolygonEnricher(object):
+    """Tags points, or geocode results with X and Y, with the value of the polygon they're in for each layer"""
+
+    def __init__(self, layers: Dict[str, PolygonLayer]):
+        self.layers = layers
+
+    @classmethod
+    def from_feature_classes(cls, counties: Optional[str] = None, cities: Optional[str] = None, zip_boundaries: Optional[str] = None,
+                             block_groups: Optional[str] = None) -> "PolygonEnricher":
+        """Loads whichever of the layers are given, e.g. the ones copy_remote_to_local saved into a temp GDB"""
+        sources = {"county_fips": counties, "city_geoid": cities, "zip": zip_boundaries, "block_group": block_groups}
+        layers = {}
+        for field, source in sources.items():
+            if source:
+                value_field, cell_size = LAYERS[field]
+                layers[field] = PolygonLayer(field, read_polygons(source, value_field), cell_size=cell_size)
+                print(f"Loaded {field} enrichment layer: {layers[field].stats()}")
+        return cls(layers)
+
+    def enrich(self, lons, lats) -> Dict[str, List[Any]]:
+        """Each layer's value for each point (None outside every polygon)"""
+        output = {}
+        for field, layer in self.layers.items():
+            found = layer.lookup(lons, lats)
+            output[field] = [layer.values[index] if index >= 0 else None for index in found]
+        return output
+
+    def annotate(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Copies of the results with the layers' fields added - results may be shared with the cache, so they're never
+        changed in place. Results without X and Y come back as they are.
+        """
+        located = [index for index, result in enumerate(results) if result.get("X") is not None and result.get("Y") is not None]
+        if not located or not self.layers:
+            return list(results)
+        values = self.enrich([results[index]["X"] for index in located], [results[index]["Y"] for index in located])
+        annotated = list(results)
+        for position, index in enumerate(located):
+            annotated[index] = {**results[index], **{field: column[position] for field, column in values.items()}}
+        return annotated
+
+    def stats(self) -> Dict[str, Any]:
+        return {field: layer.stats() for field, layer in self.layers.items()}
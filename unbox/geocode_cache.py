@@ -0,0 +1,256 @@
+"""
+Result cache for the dev shim.
+
+ResultCache is an in-process LRU with a time to live on every entry and a cap on the number of entries. It can sit in
+front of an optional SQLite file that survives restarts and is shared by every worker process pointed at it. Entries
+are scoped to a locator version (path, size and modified time of the .loc), so rebuilding or swapping the locator
+means old results are never served - the memory tier is cleared and the disk tier just stops matching.
+
+ReverseCache does the same for reverse geocodes, keyed on the grid cell a point falls in rather than exact coordinates.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .stub_locator import is_stub
+
+_MISSING = object()
+
+
+def locator_version(locator_path: str) -> str:
+    if is_stub(locator_path):
+        return locator_path
+    stat = os.stat(locator_path)
+    return f"{os.path.abspath(locator_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+class SQLiteTier(object):
+    """
+    Shared on-disk cache tier. Values are stored as JSON, so they need to be JSON serializable - the shim's results
+    are by the time they're cached. Expiry uses wall clock time since several processes read the same file.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._connection = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")  # readers in other workers don't block on a writer
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS results (version TEXT, key TEXT, value TEXT, stored REAL, PRIMARY KEY (version, key))"
+        )
+
+    def get(self, version: str, key: str) -> Any:
+        row = self._connection.execute(
+            "SELECT value FROM results WHERE version = ? AND key = ? AND stored > ?",
+            (version, key, time.time() - self.ttl_seconds),
+        ).fetchone()
+        return _MISSING if row is None else json.loads(row[0])
+
+    def put(self, version: str, key: str, value: Any):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO results (version, key, value, stored) VALUES (?, ?, ?, ?)",
+            (version, key, json.dumps(value), time.time()),
+        )
+
+    def prune(self, version: str):
+        """Drops rows for other locator versions and expired rows"""
+        self._connection.execute(
+            "DELETE FROM results WHERE version != ? OR stored <= ?", (version, time.time() - self.ttl_seconds)
+        )
+
+    def close(self):
+        self._connection.close()
+
+
+class ResultCache(object):
+    """
+    Size and TTL bounded LRU cache, optionally backed by a SQLiteTier.
+
+    :param max_entries: Entries kept in memory before the least recently used is evicted
+    :param ttl_seconds: How long an entry is served after it's stored
+    :param disk_path: Path to a SQLite file for the shared tier. Memory only when not provided.
+    :param clock: Time source for the memory tier - here for tests
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600, disk_path: Optional[str] = None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.version = None
+        self.disk = SQLiteTier(disk_path, ttl_seconds) if disk_path else None
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.disk_hits = self.evictions = self.expirations = self.invalidations = 0
+
+    @staticmethod
+    def _disk_key(key: Hashable) -> str:
+        return json.dumps(key)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Returns (found, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.disk and self.version:
+            value = self.disk.get(self.version, self._disk_key(key))
+            if value is not _MISSING:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._store(key, value)
+                return True, value
+
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def put(self, key: Hashable, value: Any, version: Optional[str] = None):
+        """
+        Pass the version that was current when the value was looked up, and the value is dropped if the locator has
+        been swapped since - otherwise a slow request to the old locator could cache its result for the new one.
+        """
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._store(key, value)
+        if self.disk and self.version:
+            self.disk.put(self.version, self._disk_key(key), value)
+
+    def _store(self, key, value):
+        """Callers hold the lock"""
+        self._entries[key] = (self.clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, version: Optional[str] = None):
+        """Clears the memory tier and scopes the cache to a new locator version"""
+        with self._lock:
+            self._entries.clear()
+            self.version = version
+            self.invalidations += 1
+        if self.disk and version:
+            self.disk.prune(version)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "disk_path": self.disk.path if self.disk else None,
+                "locator_version": self.version,
+            }
+
+
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+
+def haversine_meters(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    lon1, lat1, lon2, lat2 = map(math.radians, (lon1, lat1, lon2, lat2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+
+def grid_cell(lon: float, lat: float, cell_meters: float) -> Tuple[int, int]:
+    """
+    Cell on a fixed grid of roughly cell_meters square cells. Rows are a constant height in latitude, and each row's
+    width in longitude is scaled by the cosine of the row's latitude so that cells stay close to square.
+    """
+    row = math.floor(lat * METERS_PER_DEGREE / cell_meters)
+    row_latitude = (row + 0.5) * cell_meters / METERS_PER_DEGREE
+    column = math.floor(lon * METERS_PER_DEGREE * math.cos(math.radians(row_latitude)) / cell_meters)
+    return column, row
+
+
+class ReverseCache(object):
+    """
+    Reverse geocode cache keyed on the grid cell of the query point plus the search distance.
+
+    Points in the same cell can still be closer to a different address than the one cached for the cell, so a cached
+    result is only returned if its matched location is within tolerance_meters of the new point (and within the
+    requested search distance). Otherwise it counts as a tolerance rejection, the locator is called and the cell's
+    entry is replaced.
+
+    :param cell_meters: Grid cell size. Smaller cells mean fewer rejections but fewer hits for dense traffic.
+    :param tolerance_meters: Largest distance between a new point and a cached match that still reuses the match
+    """
+
+    def __init__(self, cell_meters: float = 10, tolerance_meters: float = 25, max_entries: int = 50000, ttl_seconds: float = 3600, clock=time.monotonic):
+        self.cell_meters = cell_meters
+        self.tolerance_meters = tolerance_meters
+        self.cache = ResultCache(max_entries=max_entries, ttl_seconds=ttl_seconds, clock=clock)
+        self.tolerance_rejections = 0
+
+    def key(self, lon: float, lat: float, distance: Optional[float]) -> Hashable:
+        return grid_cell(lon, lat, self.cell_meters) + (distance,)
+
+    @staticmethod
+    def _match_location(entry) -> Tuple[float, float]:
+        """Where the cached result matched - its X/Y when they're geographic, otherwise the point that was queried"""
+        query_lon, query_lat, result = entry
+        x, y = (result or {}).get("X"), (result or {}).get("Y")
+        if isinstance(x, (int, float)) and isinstance(y, (int, float)) and -180 <= x <= 180 and -90 <= y <= 90:
+            return x, y
+        return query_lon, query_lat
+
+    def get(self, lon: float, lat: float, distance: Optional[float] = None) -> Tuple[bool, Any]:
+        found, entry = self.cache.get(self.key(lon, lat, distance))
+        if not found:
+            return False, None
+        match_lon, match_lat = self._match_location(entry)
+        tolerance = min(self.tolerance_meters, distance) if distance else self.tolerance_meters
+        if haversine_meters(lon, lat, match_lon, match_lat) > tolerance:
+            with self.cache._lock:
+                # the inner cache counted this as a hit - move it over to the misses
+                self.cache.hits -= 1
+                self.cache.misses += 1
+                self.tolerance_rejections += 1
+            return False, None
+        return True, entry[2]
+
+    def put(self, lon: float, lat: float, distance: Optional[float], result: Any, version: Optional[str] = None):
+        self.cache.put(self.key(lon, lat, distance), (lon, lat, result), version)
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.cache.version
+
+    def invalidate(self, version: Optional[str] = None):
+        self.cache.invalidate(version)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        stats.update({
+            "cell_meters": self.cell_meters,
+            "tolerance_meters": self.tolerance_meters,
+            "tolerance_rejections": self.tolerance_rejections,
+        })
+        stats.pop("disk_hits")
+        stats.pop("disk_path")
+        return stats
@@ -0,0 +1,271 @@
+"""
+Load test and replay harness for the dev shim.
+
+Replays a corpus of addresses (for /geocode and /batch) or coordinates (for /reverse and /reverse/batch) against a
+running shim and reports latency percentiles, throughput and error rate as JSON. There are two ways to drive it:
+
+* closed loop (the default) - `concurrency` clients each send a request, wait for the answer and send the next
+* fixed rate - requests are scheduled `rate` times a second no matter how the shim keeps up. Latency is measured from
+  when a request was scheduled, not when a client got around to sending it, so a shim that falls behind shows it in
+  the percentiles instead of quietly lowering the rate. `concurrency` caps the requests outstanding at once.
+
+With --stub, the harness starts the shim itself in this process on a StubLocator (see stub_locator.py) with the given
+latency, so it runs anywhere - no arcpy or locator needed:
+
+    python -m unbox.load_test --stub 0.005 --endpoint geocode --concurrency 16 --duration 20
+    python -m unbox.load_test --url http://localhost:8000 --corpus addresses.csv --rate 200 --output report.json
+
+Corpora are CSV or NDJSON files, with the same address columns bulk geocoding takes (an address column, or ID, STREET,
+CITY, STATE, ZIP) or with lon and lat (or x and y) columns.
+"""
+
+from __future__ import annotations
+
+import csv
+import http.client
+import itertools
+import json
+import random
+import socket
+import threading
+import time
+
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from .bulk_geocode import _input_row
+
+ENDPOINTS = ("geocode", "reverse", "batch", "reverse_batch")
+# (method, path, body, items in the request)
+Request = Tuple[str, str, Optional[bytes], int]
+
+
+def read_corpus(path: str) -> List[Dict[str, Any]]:
+    """Rows of a CSV or NDJSON corpus as dicts with lower case keys"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as corpus:
+        if path.lower().endswith((".ndjson", ".jsonl", ".json")):
+            records = [json.loads(line) for line in corpus if line.strip()]
+        else:
+            records = list(csv.DictReader(corpus))
+    return [{key.lower(): value for key, value in record.items() if key} for record in records]
+
+
+def synthetic_corpus(count: int = 1000, seed: int = 0) -> List[Dict[str, Any]]:
+    """Made up addresses and points around Sacramento, for running against the stub locator"""
+    rng = random.Random(seed)
+    streets = ["MAIN ST", "CAPITOL MALL", "J ST", "FOLSOM BLVD", "GOLD CENTER DR", "10TH ST", "BROADWAY"]
+    return [{
+        "id": str(number),
+        "address": f"{rng.randint(1, 9999)} {rng.choice(streets)}, SACRAMENTO, CA 95814",
+        "lon": round(-121.5 + rng.uniform(-0.1, 0.1), 6),
+        "lat": round(38.58 + rng.uniform(-0.1, 0.1), 6),
+    } for number in range(1, count + 1)]
+
+
+def _coordinates(record: Dict[str, Any]) -> Tuple[float, float]:
+    lon = record.get("lon", record.get("x"))
+    lat = record.get("lat", record.get("y"))
+    if lon in (None, "") or lat in (None, ""):
+        raise ValueError(f"Corpus row has no lon/lat (or x/y) columns: {record}")
+    return float(lon), float(lat)
+
+
+def build_requests(records: List[Dict[str, Any]], endpoint: str, batch_size: int = 100, out_fields: Optional[str] = None) -> List[Request]:
+    """Turns corpus rows into the requests to replay - one per row, or one per batch_size rows for batch endpoints"""
+    if endpoint not in ENDPOINTS:
+        raise ValueError(f"endpoint must be one of {ENDPOINTS}")
+    extra = {"outFields": out_fields} if out_fields else {}
+    if endpoint == "geocode":
+        return [("GET", "/geocode?" + urlencode({"address": _input_row(r, i)["address"], "max_locations": 1, **extra}), None, 1)
+                for i, r in enumerate(records, start=1)]
+    if endpoint == "reverse":
+        return [("GET", "/reverse?" + urlencode({"lon": lon, "lat": lat, **extra}), None, 1)
+                for lon, lat in map(_coordinates, records)]
+
+    requests = []
+    for start in range(0, len(records), batch_size):
+        chunk = records[start:start + batch_size]
+        fields = {"out_fields": out_fields.split(",")} if out_fields else {}
+        if endpoint == "batch":
+            rows = [_input_row(record, start + i) for i, record in enumerate(chunk, start=1)]
+            body = {"addresses": [{"id": row["id"], "address": row["address"]} for row in rows], "max_locations": 1, **fields}
+            path = "/batch"
+        else:
+            points = [{"id": str(start + i), "lon": lon, "lat": lat} for i, (lon, lat) in enumerate(map(_coordinates, chunk), start=1)]
+            body = {"points": points, **fields}
+            path = "/reverse/batch"
+        requests.append(("POST", path, json.dumps(body).encode("utf-8"), len(chunk)))
+    return requests
+
+
+class _Client(object):
+    """One keep-alive connection per thread"""
+
+    def __init__(self, base_url: str, timeout: float):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def send(self, method: str, path: str, body: Optional[bytes]) -> int:
+        """The response's status code, or 0 when the request didn't get one"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            headers = {"Content-Type": "application/json"} if body else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            return 0
+
+
+def summarize(samples: List[Tuple[float, int, int]], seconds: float) -> Dict[str, Any]:
+    """Report for (latency seconds, status, items) samples collected over `seconds` of wall time"""
+    latencies = np.array([sample[0] for sample in samples]) * 1000
+    statuses = [sample[1] for sample in samples]
+    errors = sum(1 for status in statuses if status == 0 or status >= 400)
+    items = sum(sample[2] for sample in samples if 0 < sample[1] < 400)
+    status_counts: Dict[str, int] = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    if len(latencies):
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        latency = {"mean": latencies.mean(), "p50": p50, "p90": p90, "p99": p99, "max": latencies.max()}
+        latency = {name: round(float(value), 3) for name, value in latency.items()}
+    else:
+        latency = {name: None for name in ("mean", "p50", "p90", "p99", "max")}
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else None,
+        "status_counts": status_counts,
+        "seconds": round(seconds, 2),
+        "throughput_rps": round(len(samples) / seconds, 1) if seconds else None,
+        "items_per_second": round(items / seconds, 1) if seconds else None,
+        "latency_ms": latency,
+    }
+
+
+def run_load_test(base_url: str, requests: List[Request], duration: float = 30, concurrency: int = 8,
+                  rate: Optional[float] = None, timeout: float = 30, max_requests: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Replays requests (cycling through them as often as needed) against base_url for `duration` seconds or
+    `max_requests` requests, whichever comes first, and returns the summarize() report plus the settings used.
+
+    :param rate: Requests per second to schedule. None for a closed loop of `concurrency` clients.
+    """
+    if not requests:
+        raise ValueError("Nothing to replay - the corpus is empty")
+    client = _Client(base_url, timeout)
+    counter = itertools.count()
+    counter_lock = threading.Lock()
+    samples: List[Tuple[float, int, int]] = []
+    samples_lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def worker():
+        local = []
+        while True:
+            with counter_lock:
+                number = next(counter)
+            if max_requests is not None and number >= max_requests:
+                break
+            if rate:
+                scheduled = start + number / rate
+                if scheduled >= deadline:
+                    break
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= deadline:
+                    break
+            method, path, body, items = requests[number % len(requests)]
+            status = client.send(method, path, body)
+            local.append((time.perf_counter() - scheduled, status, items))
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, name=f"load-test-{i}", daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = summarize(samples, time.perf_counter() - start)
+    report["settings"] = {
+        "url": base_url,
+        "mode": "fixed_rate" if rate else "closed_loop",
+        "rate": rate,
+        "concurrency": concurrency,
+        "duration": duration,
+        "distinct_requests": len(requests),
+    }
+    return report
+
+
+def start_stub_shim(latency: float = 0.005, jitter: float = 0.0, error_rate: float = 0.0, max_in_flight: Optional[int] = None,
+                    max_queue: Optional[int] = None, port: Optional[int] = None):
+    """
+    Starts the shim on a StubLocator in a background thread of this process. Returns the uvicorn server (call
+    .should_exit = True to stop it) and its base URL.
+    """
+    import uvicorn  # imported here so the harness itself only needs the standard library and numpy
+
+    from . import locator_api_dev_shim as shim
+
+    if max_in_flight:
+        shim.MAX_IN_FLIGHT = max_in_flight
+    if max_queue is not None:
+        shim.MAX_QUEUE = max_queue
+    shim.set_locator(f"stub:latency={latency},jitter={jitter},error_rate={error_rate}")
+    if port is None:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(shim.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="stub-shim", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+if __name__ == "__main__":
+    import click
+
+    @click.command()
+    @click.option("--url", default=None, help="Base URL of a running shim, e.g. http://localhost:8000")
+    @click.option("--stub", "stub_latency", default=None, type=float, help="Instead of --url, start a shim on a stub locator with this latency (seconds)")
+    @click.option("--corpus", default=None, help="CSV or NDJSON of addresses or lon/lat points. Made up ones by default.")
+    @click.option("--endpoint", default="geocode", type=click.Choice(ENDPOINTS))
+    @click.option("--concurrency", default=8, type=int, help="Clients in a closed loop, or the most requests outstanding at a fixed rate")
+    @click.option("--rate", default=None, type=float, help="Send this many requests per second instead of a closed loop")
+    @click.option("--duration", default=30.0, type=float, help="Seconds to run for")
+    @click.option("--batch_size", default=100, type=int, help="Rows per request for the batch endpoints")
+    @click.option("--out_fields", default=None, help="outFields to ask for, e.g. Match_addr,Score,X,Y")
+    @click.option("--output", default=None, help="Also write the JSON report here")
+    def main(url, stub_latency, corpus, endpoint, concurrency, rate, duration, batch_size, out_fields, output):
+        server = None
+        if stub_latency is not None:
+            server, url = start_stub_shim(stub_latency)
+        if not url:
+            raise click.UsageError("Pass --url or --stub")
+        records = read_corpus(corpus) if corpus else synthetic_corpus()
+        report = run_load_test(url, build_requests(records, endpoint, batch_size, out_fields), duration=duration,
+                               concurrency=concurrency, rate=rate)
+        report["settings"]["endpoint"] = endpoint
+        if server:
+            server.should_exit = True
+        print(json.dumps(report, indent=2))
+        if output:
+            with open(output, "w") as report_file:
+                json.dump(report, report_file, indent=2)
+
+    main()
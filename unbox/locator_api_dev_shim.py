@@ -6,8 +6,15 @@ Run this in an arcgis-based Python environment - it's likely safe to run this fr
 ArcGIS Pro (Nick to test)
 
 Endpoints:
-  - GET /geocode?address=FULL_ADDRESS&[max_locations=5]
-  - GET /reverse?lon=-122.4194&lat=37.7749
+  - GET /geocode?address=FULL_ADDRESS&[max_locations=5]&[outFields=Match_addr,Score,X,Y]
+  - GET /reverse?lon=-122.4194&lat=37.7749&[outFields=Match_addr,X,Y]
+  - POST /reverse/batch  {"points": [{"id": "1", "lon": -122.4194, "lat": 37.7749}, ...], "max_distance": 50}
+  - POST /batch  {"addresses": [{"id": "1", "address": "FULL_ADDRESS"}, ...], "max_locations": 1, "out_fields": ["Match_addr", "Score"]}
+  - POST /bulk?format=csv|ndjson[&resume_after=ROW_ID]  (request body is the file, streamed)
+  - GET /stats
+  - GET /ready
+  - GET /metrics  (Prometheus text format)
+  - POST /admin/reload[?path=NEW_LOCATOR.loc]  (swaps in a rebuilt locator without downtime)
 
 Example:
     curl http://localhost:8000/geocode?address=10860+Gold+Center+Drive+Rancho+Cordova
@@ -90,26 +97,48 @@ Install:
 Run:
   uvicorn unbox:locator_api_dev_shim --reload --host 0.0.0.0 --port 8000
 
+  or, with one worker process per CPU, each loading and warming up the locator before it takes requests:
+  python -m unbox.locator_api_dev_shim --locator /path/to/locator.loc --workers 8 [--warmup_file addresses.csv]
+
   Core of this code primarily developed by GenAI with Nick Santos - designed to be used *only*
   for QA of built locators in comparison to other geocoding APIs - not for use in production.
   Edited and tested by Nick to add more documentation, fix errors, etc.
 """
 
 from __future__ import annotations
+import gc
 import os
-
-from typing import Any, Dict, Optional
-
-import arcpy
-from fastapi import FastAPI, HTTPException, Query
+import threading
+import time
+
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Union
+
+import anyio
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from .address_index import RESULT_FIELDS as INDEX_RESULT_FIELDS, AddressIndex, open_or_build
+from .address_normalize import normalize_address
+from .admission import LocatorSlots, Overloaded
+from .bulk_geocode import DEFAULT_CHUNK_SIZE, ageocode_rows, aread_rows, askip_completed, format_header, format_row
+from .coalesce import SingleFlight
+from .enrichment import PolygonEnricher
+from .geocode_cache import ResultCache, ReverseCache, locator_version
+from .locator_pool import LocatorPool
+from .locator_reload import LocatorWatcher, check_memory_headroom
+from .reverse_index import ReverseIndex, open_or_build as open_or_build_reverse
+from .serialization import dumps, parse_out_fields, project
+from .shim_metrics import ShimMetrics, record, snapshot, timed
+from .stub_locator import StubLocator, is_stub
 
 try:
+    import arcpy
     from arcpy.geocoding import Locator
-except Exception as e:  # pragma: no cover
-    raise RuntimeError(
-        "Could not import arcgis.geocoding.Locator. "
-        "Run this service inside an environment that has arcpy available."
-    ) from e
+except ImportError:  # only stub: locator paths work without arcpy - see stub_locator.py
+    arcpy = None
+    Locator = None
 
 
 # -----------------------------------------------------------------------------
@@ -126,81 +155,554 @@ LOCATOR_PATH = r"C:\Users\nick.santos\Downloads\LBX_Delivery_20251015\PROFESSION
 
 DEFAULT_MAX_LOCATIONS = 5
 
+# When serving with several worker processes, each worker reads the locator path from here, loads it once, and runs
+# the warm-up queries before it accepts requests. The warm-up file is either a CSV in our standard input schema or a
+# text file with one address per line.
+LOCATOR_PATH_ENV = "UNBOX_LOCATOR_PATH"
+WARMUP_FILE_ENV = "UNBOX_WARMUP_FILE"
+WARMUP_ADDRESSES = [
+    "10860 Gold Center Dr, Rancho Cordova, CA 95670",
+    "1315 10th St, Sacramento, CA 95814",
+    "200 N Spring St, Los Angeles, CA 90012",
+    "1 Dr Carlton B Goodlett Pl, San Francisco, CA 94102",
+    "1600 Pacific Hwy, San Diego, CA 92101",
+    "2600 Fresno St, Fresno, CA 93721",
+    "1221 Oak St, Oakland, CA 94612",
+    "50 W San Fernando St, San Jose, CA 95113",
+]
+
+# /batch fans addresses out to worker processes that each load their own copy of the locator. Workers start on the
+# first batch request, so a shim that only serves /geocode doesn't pay for them.
+MAX_BATCH_SIZE = int(os.environ.get("UNBOX_MAX_BATCH_SIZE", 10000))
+BATCH_WORKERS = int(os.environ.get("UNBOX_BATCH_WORKERS", 0)) or os.cpu_count()
+
+# /geocode results are cached by normalized address and max_locations. UNBOX_CACHE_DB points every worker at a shared
+# SQLite file so cached results survive restarts.
+RESULT_CACHE = ResultCache(
+    max_entries=int(os.environ.get("UNBOX_CACHE_SIZE", 50000)),
+    ttl_seconds=float(os.environ.get("UNBOX_CACHE_TTL", 24 * 3600)),
+    disk_path=os.environ.get("UNBOX_CACHE_DB") or None,
+)
+
+# /reverse results are cached by grid cell. A cached match is only reused when it's within UNBOX_REVERSE_TOLERANCE
+# meters of the new point.
+REVERSE_CACHE = ReverseCache(
+    cell_meters=float(os.environ.get("UNBOX_REVERSE_CELL_METERS", 10)),
+    tolerance_meters=float(os.environ.get("UNBOX_REVERSE_TOLERANCE", 25)),
+    max_entries=int(os.environ.get("UNBOX_CACHE_SIZE", 50000)),
+    ttl_seconds=float(os.environ.get("UNBOX_CACHE_TTL", 24 * 3600)),
+)
+
+# Identical geocodes that miss the caches at the same time share one locator call - see coalesce.py. Forward geocodes
+# are keyed like the result cache, reverse geocodes by the point rounded to about 10 cm. Keys include the cache
+# version so requests after a locator reload never join a call still running on the old locator.
+GEOCODE_FLIGHTS = SingleFlight()
+REVERSE_FLIGHTS = SingleFlight()
+
+# Admission control - geocodes that miss the caches share MAX_IN_FLIGHT Locator instances. Up to MAX_QUEUE requests
+# wait for one (for at most QUEUE_TIMEOUT seconds) and anything past that gets a 503 with Retry-After straight away.
+MAX_IN_FLIGHT = int(os.environ.get("UNBOX_MAX_IN_FLIGHT", 2))
+MAX_QUEUE = int(os.environ.get("UNBOX_MAX_QUEUE", 32))
+QUEUE_TIMEOUT = float(os.environ.get("UNBOX_QUEUE_TIMEOUT", 5))
+
+# Exact-match fast path - an index of the prepared address points (build_locator.PREPARED_ADDRESSES_NAME) opened from
+# UNBOX_ADDRESS_INDEX. It's built there from UNBOX_ADDRESS_POINTS first if it doesn't exist yet.
+ADDRESS_INDEX_ENV = "UNBOX_ADDRESS_INDEX"
+ADDRESS_POINTS_ENV = "UNBOX_ADDRESS_POINTS"
+ADDRESS_INDEX: Optional[AddressIndex] = None
+
+# Nearest-address fast path for /reverse - a KD-tree over the same address points, opened from UNBOX_REVERSE_INDEX
+# (and built from UNBOX_ADDRESS_POINTS if it doesn't exist yet). Points whose nearest address is more than
+# UNBOX_REVERSE_MAX_METERS away go to the locator instead, which can also match street segments.
+REVERSE_INDEX_ENV = "UNBOX_REVERSE_INDEX"
+REVERSE_MAX_DISTANCE = float(os.environ.get("UNBOX_REVERSE_MAX_METERS", 50))
+REVERSE_INDEX: Optional[ReverseIndex] = None
+
+# Point-in-polygon enrichment - results get county_fips, city_geoid, zip and block_group fields from whichever of
+# these boundary layers are set (local feature classes, like the ones copy_remote_to_local saves into a temp GDB).
+ENRICHMENT_ENV = {
+    "counties": "UNBOX_COUNTIES",
+    "cities": "UNBOX_CITIES",
+    "zip_boundaries": "UNBOX_ZIP_BOUNDARIES",
+    "block_groups": "UNBOX_BLOCK_GROUPS",
+}
+ENRICHER: Optional[PolygonEnricher] = None
+
+# Hot reloads - POST /admin/reload, or set UNBOX_WATCH_LOCATOR to a number of seconds to poll the locator file and
+# reload it when it changes. /admin/reload only takes requests from this machine unless UNBOX_ADMIN_TOKEN is set, in
+# which case it takes requests with that token in an X-Admin-Token header.
+WATCH_INTERVAL = float(os.environ.get("UNBOX_WATCH_LOCATOR", 0))
+ADMIN_TOKEN = os.environ.get("UNBOX_ADMIN_TOKEN")
+RELOAD_MEMORY_FACTOR = float(os.environ.get("UNBOX_RELOAD_MEMORY_FACTOR", 1.0))
+RELOAD_LOCK = threading.Lock()
+LAST_RELOAD: Dict[str, Any] = {}
+WATCHER: Optional[LocatorWatcher] = None
+
 LOCATOR = None
-app = FastAPI(title="Local Locator Dev API", version="0.1.0")
-
-def _as_jsonable(obj: Any) -> Any:
-    """Best-effort conversion to JSON-serializable data."""
-    if obj is None:
-        return None
-    if isinstance(obj, (str, int, float, bool, list, dict)):
-        return obj
-    if hasattr(obj, "as_dict"):
-        return obj.as_dict
-    if hasattr(obj, "__dict__"):
-        return obj.__dict__
-    return str(obj)
-
-
-def set_locator(locator_path=LOCATOR_PATH, set_global=True) -> Locator:
-    if not locator_path or locator_path.strip() in {"/ABSOLUTE/PATH/TO/YOUR/LOCATOR.loc"} or not os.path.exists(locator_path):
+LOCATOR_SLOTS: Optional[LocatorSlots] = None
+ACTIVE_LOCATOR_PATH = None
+LOCATOR_LOADED_AT = None
+BATCH_POOL: Optional[LocatorPool] = None
+BATCH_POOL_LOCK = threading.Lock()  # so concurrent first batch requests don't each start a pool
+READY = False
+WARMUP_STATS: Dict[str, Any] = {}
+
+
+def read_warmup_addresses(path: Optional[str] = None) -> List[str]:
+    if not path:
+        return list(WARMUP_ADDRESSES)
+    if path.lower().endswith(".csv"):
+        from .build_locator import read_address_corpus
+        return read_address_corpus(path)
+    with open(path, "r") as warmup_file:
+        return [line.strip() for line in warmup_file if line.strip()]
+
+
+def warm_up(addresses: List[str], locators: Optional[List[Any]] = None) -> Dict[str, Any]:
+    """
+    Runs forward and reverse geocodes straight against the locator (not the caches) so its files are paged in before
+    real requests arrive. Marks the worker ready when done, unless it was warming up specific locators for a reload.
+    """
+    global READY, WARMUP_STATS
+    start = time.perf_counter()
+    failures = 0
+    reloading = locators is not None
+    locators = locators or (LOCATOR_SLOTS.locators if LOCATOR_SLOTS else [LOCATOR])
+    for index, address in enumerate(addresses):
+        locator = locators[index % len(locators)]  # spread across instances so each one has been used
+        try:
+            results = locator.geocode(address, True, maxResults=1)
+            if results and "X" in results[0] and "Y" in results[0]:
+                locator.reverseGeocode(location=_point(results[0]["X"], results[0]["Y"], locator), forStorage=True)
+        except Exception:
+            failures += 1
+    stats = {"queries": len(addresses), "failures": failures, "seconds": round(time.perf_counter() - start, 2)}
+    if not reloading:
+        WARMUP_STATS = stats
+        READY = True
+    return stats
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    # requests waiting in the admission queue hold a thread each, so make sure there are enough threads for the queue
+    # to actually fill up and start shedding load
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = max(limiter.total_tokens, MAX_IN_FLIGHT + MAX_QUEUE + 8)
+    global ADDRESS_INDEX, REVERSE_INDEX
+    if ADDRESS_INDEX is None and os.environ.get(ADDRESS_INDEX_ENV):
+        ADDRESS_INDEX = open_or_build(os.environ[ADDRESS_INDEX_ENV], os.environ.get(ADDRESS_POINTS_ENV))
+    if REVERSE_INDEX is None and os.environ.get(REVERSE_INDEX_ENV):
+        REVERSE_INDEX = open_or_build_reverse(os.environ[REVERSE_INDEX_ENV], os.environ.get(ADDRESS_POINTS_ENV))
+    global ENRICHER
+    layers = {layer: os.environ.get(variable) for layer, variable in ENRICHMENT_ENV.items()}
+    if ENRICHER is None and any(layers.values()):
+        ENRICHER = PolygonEnricher.from_feature_classes(**layers)
+    # uvicorn doesn't hand a worker any requests until this finishes, so clients never see a cold locator
+    if LOCATOR is None and os.environ.get(LOCATOR_PATH_ENV):
+        set_locator(os.environ[LOCATOR_PATH_ENV])
+    if LOCATOR is not None and not READY:
+        warm_up(read_warmup_addresses(os.environ.get(WARMUP_FILE_ENV)))
+    global WATCHER
+    if WATCH_INTERVAL and ACTIVE_LOCATOR_PATH and WATCHER is None:
+        WATCHER = LocatorWatcher(ACTIVE_LOCATOR_PATH, swap_locator, locator_version, interval=WATCH_INTERVAL).start()
+    yield
+    if WATCHER:
+        WATCHER.stop()
+    _close_batch_pool()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse through serialization.dumps - orjson when it's installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+app = FastAPI(title="Local Locator Dev API", version="0.1.0", lifespan=lifespan, default_response_class=FastJSONResponse)
+METRICS = ShimMetrics()
+app.middleware("http")(METRICS.middleware())
+
+def load_locator(locator_path: str):
+    """A Locator for the path, or a StubLocator for a stub: path"""
+    if is_stub(locator_path):
+        return StubLocator.from_path(locator_path)
+    if Locator is None:
+        raise RuntimeError(
+            "Could not import arcpy.geocoding.Locator. "
+            "Run this service inside an environment that has arcpy available, or use a stub: locator path."
+        )
+    return Locator(locator_path)
+
+
+def _point(lon: float, lat: float, locator):
+    if arcpy is None or isinstance(locator, StubLocator):
+        return lon, lat  # the stub locator takes plain coordinates
+    return arcpy.PointGeometry(arcpy.Point(X=lon, Y=lat), arcpy.SpatialReference(4326))
+
+
+def set_locator(locator_path=LOCATOR_PATH, set_global=True):
+    if not locator_path or locator_path.strip() in {"/ABSOLUTE/PATH/TO/YOUR/LOCATOR.loc"} or not (is_stub(locator_path) or os.path.exists(locator_path)):
         raise RuntimeError("locator_path is not configured or does not exist. Set it to your local .loc path.")
-    loc = Locator(locator_path)
+    loc = load_locator(locator_path)
     if set_global:
-        global LOCATOR
+        global LOCATOR, LOCATOR_SLOTS, ACTIVE_LOCATOR_PATH, LOCATOR_LOADED_AT, READY
         LOCATOR = loc
+        LOCATOR_LOADED_AT = time.time()
+        LOCATOR_SLOTS = LocatorSlots(
+            [loc] + [load_locator(locator_path) for _ in range(MAX_IN_FLIGHT - 1)],
+            max_queue=MAX_QUEUE,
+            queue_timeout=QUEUE_TIMEOUT,
+        )
+        READY = False
+        ACTIVE_LOCATOR_PATH = locator_path
+        _close_batch_pool()  # its workers have the old locator loaded
+        RESULT_CACHE.invalidate(locator_version(locator_path))
+        REVERSE_CACHE.invalidate(locator_version(locator_path))
     return loc
 
 
-def _preprocess_results(results):
-    for i, _ in enumerate(results):
-        if "Shape" in results[i]:
-            del results[i]["Shape"]
+def swap_locator(locator_path: str, drain_timeout: float = 60) -> Dict[str, Any]:
+    """
+    Replaces the loaded locator without turning requests away:
+
+    1. checks there's memory for a second copy of the locator next to the current one
+    2. loads and warms up the new locator instances while the old ones keep serving
+    3. switches new requests over to them in one assignment
+    4. flushes the result caches - results that were in flight on the old locator are dropped rather than cached
+    5. waits for in-flight and queued requests on the old locator to finish, then releases it
+
+    /batch workers are replaced too - the old pool finishes the chunks it has and new batches start a new pool.
+    """
+    global LOCATOR, LOCATOR_SLOTS, ACTIVE_LOCATOR_PATH, LOCATOR_LOADED_AT, BATCH_POOL, LAST_RELOAD, ADDRESS_INDEX, REVERSE_INDEX
+    if not locator_path or not (is_stub(locator_path) or os.path.exists(locator_path)):
+        raise FileNotFoundError(f"{locator_path} does not exist")
+    if not RELOAD_LOCK.acquire(blocking=False):
+        raise RuntimeError("A locator reload is already running")
+    try:
+        start = time.perf_counter()
+        if not is_stub(locator_path):
+            check_memory_headroom(locator_path, MAX_IN_FLIGHT, factor=RELOAD_MEMORY_FACTOR)
+        new_locators = [load_locator(locator_path) for _ in range(MAX_IN_FLIGHT)]
+        warmup = warm_up(read_warmup_addresses(os.environ.get(WARMUP_FILE_ENV)), locators=new_locators)
+        new_slots = LocatorSlots(new_locators, max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT)
+        # a rebuilt locator usually comes with rebuilt address indexes - pick them up too
+        new_index = AddressIndex(ADDRESS_INDEX.index_folder) if ADDRESS_INDEX else None
+        new_reverse_index = ReverseIndex(REVERSE_INDEX.index_folder) if REVERSE_INDEX else None
+        with BATCH_POOL_LOCK:
+            old_path, old_slots, old_pool = ACTIVE_LOCATOR_PATH, LOCATOR_SLOTS, BATCH_POOL
+
+            # handlers read LOCATOR_SLOTS once per request, so this is the switch
+            LOCATOR_SLOTS = new_slots
+            ADDRESS_INDEX, REVERSE_INDEX = new_index, new_reverse_index
+            LOCATOR, ACTIVE_LOCATOR_PATH, LOCATOR_LOADED_AT, BATCH_POOL = new_locators[0], locator_path, time.time(), None
+        version = locator_version(locator_path)
+        RESULT_CACHE.invalidate(version)
+        REVERSE_CACHE.invalidate(version)
+
+        drained = old_slots.drain(drain_timeout) if old_slots else True
+        if old_pool:
+            old_pool.close(wait=True, cancel_pending=False)
+        del old_slots, old_pool
+        gc.collect()
+
+        LAST_RELOAD = {
+            "from": old_path,
+            "to": locator_path,
+            "finished": time.time(),
+            "seconds": round(time.perf_counter() - start, 2),
+            "warmup": warmup,
+            "drained": drained,
+        }
+        print(f"Swapped locator {old_path} -> {locator_path} in {LAST_RELOAD['seconds']} seconds")
+        return LAST_RELOAD
+    finally:
+        RELOAD_LOCK.release()
+
+
+def _batch_pool() -> LocatorPool:
+    global BATCH_POOL
+    with BATCH_POOL_LOCK:
+        if BATCH_POOL is None:
+            if not ACTIVE_LOCATOR_PATH:
+                raise RuntimeError("No locator is loaded - call set_locator first")
+            BATCH_POOL = LocatorPool(ACTIVE_LOCATOR_PATH, workers=BATCH_WORKERS)
+        return BATCH_POOL
+
+
+def _close_batch_pool():
+    global BATCH_POOL
+    with BATCH_POOL_LOCK:
+        pool, BATCH_POOL = BATCH_POOL, None
+    if pool is not None:
+        pool.close(wait=False)
+
+
+def _json_response(body: Dict[str, Any]) -> JSONResponse:
+    """Serializes here rather than letting FastAPI do it afterwards, so serialization time shows up in the metrics"""
+    with timed("serialize"):
+        return FastJSONResponse(body)
+
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Service overloaded: {e!s}", headers={"Retry-After": str(e.retry_after)})
+
+
+OUT_FIELDS_DESCRIPTION = "Comma separated fields to return, e.g. Match_addr,Score,X,Y,Addr_type. All fields by default."
+# locator fields enrichment needs, whatever the client asked for
+LOCATION_FIELDS = ["X", "Y"]
+
+
+def _enrich(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Results with the enrichment layers' fields added, when there are any"""
+    if ENRICHER is None:
+        return results
+    with timed("enrich"):
+        return ENRICHER.annotate(results)
+
 
-    return results
 @app.get("/geocode")
 def geocode(
     address: str = Query(..., description="Full address string to geocode"),
     max_locations: int = Query(DEFAULT_MAX_LOCATIONS, ge=1, le=50),
+    out_fields: Optional[str] = Query(None, alias="outFields", description=OUT_FIELDS_DESCRIPTION),
 ) -> Dict[str, Any]:
-    """Calls Locator.geocode(address, ...)."""
+    """
+    Answers exact matches from the address index, then equivalent addresses from the cache, and only calls
+    Locator.geocode(address, ...) for the rest. An index match is a single candidate with fewer fields than the
+    locator's (address_index.RESULT_FIELDS), so the index is only used for max_locations=1 requests whose outFields
+    it can fill.
+    """
+    normalized = normalize_address(address)
+    index_match = ADDRESS_INDEX.lookup(address, normalized) if _index_can_answer(max_locations, out_fields) else None
+    if index_match:
+        found, results = True, [index_match]
+    else:
+        cache_key = (normalized, max_locations)
+        cache_version = RESULT_CACHE.version
+        found, results = RESULT_CACHE.get(cache_key)
+    if not found:
+        try:
+            results = GEOCODE_FLIGHTS.do((cache_version, cache_key), lambda: _locator_geocode(address, max_locations))
+        except Overloaded as e:
+            raise _overloaded(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Geocode failed: {e!s}")
+        RESULT_CACHE.put(cache_key, results, cache_version)
+    return _json_response({
+        "input": {"address": address},
+        "results": project(_enrich(results), parse_out_fields(out_fields)) if out_fields else _enrich(results),
+    })
+
+
+def _index_can_answer(max_locations: int, out_fields: Optional[str]) -> bool:
+    if ADDRESS_INDEX is None or max_locations != 1:
+        return False
+    wanted = parse_out_fields(out_fields)
+    return wanted is None or {field.lower() for field in wanted} <= {field.lower() for field in INDEX_RESULT_FIELDS}
+
+
+def _locator_geocode(address: str, max_locations: int) -> List[Dict[str, Any]]:
+    with LOCATOR_SLOTS.acquire() as (locator, waited):
+        record("queue", waited)
+        with timed("locator"):
+            results = locator.geocode(address, True, maxResults=max_locations)
+    return project(results)  # the cache keeps every field, minus Shape
+
+
+class BatchAddress(BaseModel):
+    id: Union[str, int]
+    address: str
+
+
+class BatchRequest(BaseModel):
+    addresses: List[BatchAddress]
+    max_locations: int = Field(1, ge=1, le=50)
+    out_fields: Optional[List[str]] = Field(None, description="Fields to return for each candidate. All fields by default.")
+
+
+@app.post("/batch")
+def batch_geocode(request: BatchRequest) -> Dict[str, Any]:
+    """
+    Geocodes a list of addresses across the worker pool. Results come back in input order with the client's
+    IDs, and an address that fails gets an "error" instead of "results" rather than failing the whole batch.
+    """
+    if len(request.addresses) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batches are limited to {MAX_BATCH_SIZE} addresses - got {len(request.addresses)}")
+
+    start = time.perf_counter()
+    out_fields = parse_out_fields(",".join(request.out_fields)) if request.out_fields else None
     try:
-        results = LOCATOR.geocode(address, True, maxResults=max_locations)
-        results = _preprocess_results(results)
-        return {
-            "input": {"address": address},
-            "results": _as_jsonable(results),
-        }
+        with timed("locator"):
+            outputs = _batch_pool().geocode_many(
+                [item.address for item in request.addresses],
+                request.max_locations,
+                out_fields + LOCATION_FIELDS if out_fields and ENRICHER else out_fields,
+            )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Geocode failed: {e!s}")
+        raise HTTPException(status_code=500, detail=f"Batch geocode failed: {e!s}")
+    if ENRICHER:
+        # enriched all at once, then trimmed back to what the client asked for
+        candidates = _enrich([result for output in outputs for result in output.get("results", [])])
+        for output in outputs:
+            if "results" in output:
+                output["results"], candidates = candidates[:len(output["results"])], candidates[len(output["results"]):]
+                if out_fields:
+                    output["results"] = project(output["results"], out_fields)
+    seconds = time.perf_counter() - start
+
+    results = []
+    for item, output in zip(request.addresses, outputs):
+        results.append({"id": item.id, "input": {"address": item.address}, **output})
+    return _json_response({
+        "results": results,
+        "stats": {
+            "count": len(results),
+            "errors": sum(1 for output in outputs if "error" in output),
+            "seconds": round(seconds, 3),
+            "per_second": round(len(results) / seconds, 1) if seconds else None,
+            "workers": BATCH_POOL.workers if BATCH_POOL else 0,
+        },
+    })
+
+
+class _UploadStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse normally listens for the client disconnecting while it streams, which swallows the rest of the
+    request body. /bulk keeps reading its upload while the response streams, so it skips that.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post("/bulk")
+async def bulk_geocode(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Format of the uploaded file and of the response"),
+    resume_after: Optional[str] = Query(None, description="Skip rows up to and including this row ID"),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=5000),
+):
+    """
+    Geocodes a CSV or NDJSON file streamed in the request body across the worker pool, streaming rows back in input
+    order as chunks finish. Neither the upload nor the results are ever held in memory all at once.
+    """
+    try:
+        pool = _batch_pool()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Bulk geocode failed: {e!s}")
 
+    rows = askip_completed(aread_rows(request.stream(), format), resume_after)
+    # read up to the first row to geocode before the response starts, so a resume ID that isn't in the upload is a
+    # 400 rather than an empty 200
+    try:
+        first = [await rows.__anext__()]
+    except StopAsyncIteration:
+        first = []
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def all_rows():
+        for row in first:
+            yield row
+        async for row in rows:
+            yield row
+
+    async def body():
+        yield format_header(format)
+        async for row in ageocode_rows(all_rows(), pool, chunk_size=chunk_size):
+            yield format_row(row, format)
+
+    return _UploadStreamingResponse(body(), media_type="text/csv" if format == "csv" else "application/x-ndjson")
+
+
+@app.get("/stats")
+def stats() -> Dict[str, Any]:
+    """Cache and admission counters for the worker that handles the request"""
+    return {
+        "locator": ACTIVE_LOCATOR_PATH,
+        "geocode_cache": RESULT_CACHE.stats(),
+        "reverse_cache": REVERSE_CACHE.stats(),
+        "admission": LOCATOR_SLOTS.stats() if LOCATOR_SLOTS else None,
+        "address_index": ADDRESS_INDEX.stats() if ADDRESS_INDEX else None,
+        "reverse_index": REVERSE_INDEX.stats() if REVERSE_INDEX else None,
+        "coalescing": {"geocode": GEOCODE_FLIGHTS.stats(), "reverse": REVERSE_FLIGHTS.stats()},
+        "enrichment": ENRICHER.stats() if ENRICHER else None,
+        "last_reload": LAST_RELOAD or None,
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics for the worker that handles the request"""
+    lines = []
+    caches = {"geocode": RESULT_CACHE.stats(), "reverse": REVERSE_CACHE.stats()}
+    lines += snapshot("unbox_cache_hits_total", "Result cache hits", [({"cache": name}, c["hits"]) for name, c in caches.items()], "counter")
+    lines += snapshot("unbox_cache_misses_total", "Result cache misses", [({"cache": name}, c["misses"]) for name, c in caches.items()], "counter")
+    lines += snapshot("unbox_cache_evictions_total", "Result cache evictions", [({"cache": name}, c["evictions"]) for name, c in caches.items()], "counter")
+    lines += snapshot("unbox_cache_hit_ratio", "Result cache hits / lookups", [({"cache": name}, c["hit_rate"]) for name, c in caches.items()])
+    lines += snapshot("unbox_cache_entries", "Entries in the result cache", [({"cache": name}, c["entries"]) for name, c in caches.items()])
+    flights = {"geocode": GEOCODE_FLIGHTS.stats(), "reverse": REVERSE_FLIGHTS.stats()}
+    lines += snapshot("unbox_coalesced_calls_saved_total", "Locator calls saved by sharing an identical in-flight call", [({"kind": kind}, f["calls_saved"]) for kind, f in flights.items()], "counter")
+    if ADDRESS_INDEX:
+        index = ADDRESS_INDEX.stats()
+        lines += snapshot("unbox_address_index_lookups_total", "Exact-match index lookups", [({}, index["lookups"])], "counter")
+        lines += snapshot("unbox_address_index_hits_total", "Exact-match index hits", [({}, index["hits"])], "counter")
+        lines += snapshot("unbox_address_index_hit_ratio", "Exact-match index hits / lookups", [({}, index["hit_rate"])])
+    if REVERSE_INDEX:
+        reverse_index = REVERSE_INDEX.stats()
+        lines += snapshot("unbox_reverse_index_queries_total", "Nearest-address index queries", [({}, reverse_index["queries"])], "counter")
+        lines += snapshot("unbox_reverse_index_within_total", "Nearest-address queries answered within the distance limit", [({}, reverse_index["within_distance"])], "counter")
+    if LOCATOR_SLOTS:
+        admission = LOCATOR_SLOTS.stats()
+        lines += snapshot("unbox_admission_in_flight", "Locator calls in progress", [({}, admission["in_flight"])])
+        lines += snapshot("unbox_admission_queued", "Requests waiting for a locator instance", [({}, admission["queued"])])
+        lines += snapshot("unbox_admission_rejected_total", "Requests turned away by admission control", [
+            ({"reason": "queue_full"}, admission["rejected_queue_full"]),
+            ({"reason": "timeout"}, admission["rejected_timeout"]),
+        ], "counter")
+    if ACTIVE_LOCATOR_PATH:
+        lines += snapshot("unbox_locator_info", "The locator this worker has loaded", [({"path": ACTIVE_LOCATOR_PATH}, 1)])
+        lines += snapshot("unbox_locator_loaded_seconds", "Seconds since this worker loaded the locator", [({}, round(time.time() - LOCATOR_LOADED_AT, 1))])
+        if os.path.exists(ACTIVE_LOCATOR_PATH):
+            lines += snapshot("unbox_locator_age_seconds", "Seconds since the locator file was written", [({}, round(time.time() - os.path.getmtime(ACTIVE_LOCATOR_PATH), 1))])
+    return PlainTextResponse(METRICS.render(lines), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/admin/reload")
+def reload_locator(
+    request: Request,
+    path: Optional[str] = Query(None, description="Locator to switch to. Defaults to reloading the current path."),
+    drain_timeout: float = Query(60, gt=0, description="Seconds to wait for requests on the old locator to finish"),
+    x_admin_token: Optional[str] = Header(None),
+) -> Dict[str, Any]:
+    """
+    Loads and warms up a locator next to the current one, then swaps it in. With several server workers, this only
+    reloads the worker that answers - use UNBOX_WATCH_LOCATOR to have every worker reload.
+    """
+    if ADMIN_TOKEN:
+        if x_admin_token != ADMIN_TOKEN:
+            raise HTTPException(status_code=403, detail="Missing or wrong X-Admin-Token")
+    elif request.client is None or request.client.host not in ("127.0.0.1", "::1", "localhost"):
+        raise HTTPException(status_code=403, detail="Reloads are only accepted from this machine unless UNBOX_ADMIN_TOKEN is set")
 
-""" This was a first attempt - I think it'd need to do better tracking returning all inputs
-for each output too.
-"""
+    try:
+        return swap_locator(path or ACTIVE_LOCATOR_PATH, drain_timeout=drain_timeout)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except MemoryError as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving {ACTIVE_LOCATOR_PATH}: {e!s}")
 
-"""
-    @app.post("/batch")
-    def batch_geocode(
-        addresses: List[str],
-        max_locations: int = Query(DEFAULT_MAX_LOCATIONS, ge=1, le=50),
-    ) -> List[Dict[str, Any]]:
-        
-        try:
-            # batch method typically returns a list of result lists
-            batch_results = LOCATOR.batch(addresses)
-
-            response = []
-            for address, results in zip(addresses, batch_results):
-                processed_results = _preprocess_results(results)
-                response.append({
-                    "input": {"address": address},
-                    "results": _as_jsonable(processed_results),
-                })
-            return response
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Batch geocode failed: {e!s}")
-"""
+
+@app.get("/ready")
+def ready():
+    """200 once this worker has loaded the locator and finished its warm-up queries, 503 before that"""
+    body = {"ready": READY, "pid": os.getpid(), "locator": ACTIVE_LOCATOR_PATH, "warmup": WARMUP_STATS}
+    return JSONResponse(body, status_code=200 if READY else 503)
 
 
 @app.get("/reverse")
@@ -208,25 +710,156 @@ def reverse_geocode(
     lon: float = Query(..., ge=-180.0, le=180.0, description="WGS84 longitude"),
     lat: float = Query(..., ge=-90.0, le=90.0, description="WGS84 latitude"),
     distance: Optional[float] = Query(None, gt=0, description="Optional search distance"),
+    out_fields: Optional[str] = Query(None, alias="outFields", description=OUT_FIELDS_DESCRIPTION),
 ) -> Dict[str, Any]:
-    """Calls Locator.reverseGeocode(location={x,y,wkid=4326}, ...)."""
-    try:
-        location = arcpy.PointGeometry(arcpy.Point(X=lon, Y=lat), arcpy.SpatialReference(4326))
-        kwargs: Dict[str, Any] = {}
-
-        result = LOCATOR.reverseGeocode(location=location, forStorage=True,**kwargs)
-        result = _preprocess_results([result])[0]
-        return {
-            "input": {"lon": lon, "lat": lat},
-            "result": _as_jsonable(result),
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Reverse geocode failed: {e!s}")
-
-
-if __name__ == "__main__":
+    """
+    Answers from the nearest-address index when the nearest address point is close enough, then from a nearby cached
+    match, and only calls Locator.reverseGeocode(location={x,y,wkid=4326}, ...) for the rest.
+    """
+    max_distance = min(distance, REVERSE_MAX_DISTANCE) if distance else REVERSE_MAX_DISTANCE
+    result = REVERSE_INDEX.results([lon], [lat], max_distance)[0] if REVERSE_INDEX else None
+    if result is None:
+        try:
+            result = _locator_reverse(lon, lat, distance)
+        except Overloaded as e:
+            raise _overloaded(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Reverse geocode failed: {e!s}")
+    return _json_response({
+        "input": {"lon": lon, "lat": lat},
+        "result": project(_enrich([result]), parse_out_fields(out_fields))[0] if out_fields else _enrich([result])[0],
+    })
+
+
+def _locator_reverse(lon: float, lat: float, distance: Optional[float] = None) -> Dict[str, Any]:
+    """Locator.reverseGeocode for one point, through the reverse cache, coalescing and admission control"""
+    cache_version = REVERSE_CACHE.version
+    found, result = REVERSE_CACHE.get(lon, lat, distance)
+    if found:
+        return result
+
+    def call():
+        with LOCATOR_SLOTS.acquire() as (locator, waited):
+            record("queue", waited)
+            with timed("locator"):
+                return project([locator.reverseGeocode(location=_point(lon, lat, locator), forStorage=True)])[0]
+
+    result = REVERSE_FLIGHTS.do((cache_version, round(lon, 6), round(lat, 6)), call)
+    REVERSE_CACHE.put(lon, lat, distance, result, cache_version)
+    return result
+
+
+class ReversePoint(BaseModel):
+    id: Union[str, int]
+    lon: float = Field(..., ge=-180.0, le=180.0)
+    lat: float = Field(..., ge=-90.0, le=90.0)
+
+
+class ReverseBatchRequest(BaseModel):
+    points: List[ReversePoint]
+    max_distance: Optional[float] = Field(None, gt=0, description="Meters. Defaults to UNBOX_REVERSE_MAX_METERS.")
+    out_fields: Optional[List[str]] = Field(None, description="Fields to return for each point. All fields by default.")
+
+
+@app.post("/reverse/batch")
+def reverse_geocode_batch(request: ReverseBatchRequest) -> Dict[str, Any]:
+    """
+    Reverse geocodes a list of points - all at once against the nearest-address index, then one by one through the
+    locator for points with no address point within max_distance. A point that fails gets an "error" instead.
+    """
+    if len(request.points) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batches are limited to {MAX_BATCH_SIZE} points - got {len(request.points)}")
+
+    start = time.perf_counter()
+    max_distance = request.max_distance or REVERSE_MAX_DISTANCE
+    if REVERSE_INDEX and request.points:
+        with timed("locator"):
+            matches = REVERSE_INDEX.results([p.lon for p in request.points], [p.lat for p in request.points], max_distance)
+    else:
+        matches = [None] * len(request.points)
+    out_fields = parse_out_fields(",".join(request.out_fields)) if request.out_fields else None
+
+    results, found, found_results = [], [], []
+    for point, result in zip(request.points, matches):
+        output = {"id": point.id, "input": {"lon": point.lon, "lat": point.lat}}
+        source = "index"
+        if result is None:
+            source = "locator"
+            try:
+                result = _locator_reverse(point.lon, point.lat)
+            except Overloaded as e:  # keep the rest of the batch, like /batch does
+                output["error"] = f"Service overloaded: {e!s}"
+            except Exception as e:
+                output["error"] = str(e)
+        if result is not None:
+            output["source"] = source
+            found.append(output)
+            found_results.append(result)
+        results.append(output)
+    # enriched all at once
+    for output, result in zip(found, _enrich(found_results)):
+        output["result"] = project([result], out_fields)[0] if out_fields else result
+    seconds = time.perf_counter() - start
+    return _json_response({
+        "results": results,
+        "stats": {
+            "count": len(results),
+            "from_index": sum(1 for output in results if output.get("source") == "index"),
+            "errors": sum(1 for output in results if "error" in output),
+            "seconds": round(seconds, 3),
+            "per_second": round(len(results) / seconds, 1) if seconds else None,
+        },
+    })
+
+
+def serve(locator_path: str = LOCATOR_PATH, workers: Optional[int] = None, host: str = "0.0.0.0", port: int = 8000, warmup_file: Optional[str] = None,
+          address_index: Optional[str] = None, address_points: Optional[str] = None, reverse_index: Optional[str] = None,
+          **enrichment_layers: Optional[str]):
+    """
+    Serves the shim from several worker processes. Each one loads the locator once and warms it up before taking
+    requests. The CPUs are split between the server workers and their /batch pools. When there's an address index,
+    it's built here if needed, before the workers start, so they all map the same files instead of each building one.
+    The same goes for the nearest-address reverse index. enrichment_layers are the counties, cities, zip_boundaries
+    and block_groups feature classes to tag results with - each worker loads them itself.
+    """
     import uvicorn
 
-    LOCATOR = set_locator()
+    workers = workers or os.cpu_count()
+    os.environ[LOCATOR_PATH_ENV] = locator_path
+    if warmup_file:
+        os.environ[WARMUP_FILE_ENV] = warmup_file
+    if address_index:
+        open_or_build(address_index, address_points)
+        os.environ[ADDRESS_INDEX_ENV] = address_index
+    if reverse_index:
+        open_or_build_reverse(reverse_index, address_points)
+        os.environ[REVERSE_INDEX_ENV] = reverse_index
+    for layer, source in enrichment_layers.items():
+        if source:
+            os.environ[ENRICHMENT_ENV[layer]] = source
+    os.environ.setdefault("UNBOX_BATCH_WORKERS", str(max(1, os.cpu_count() // workers)))
+    uvicorn.run("unbox.locator_api_dev_shim:app", host=host, port=port, workers=workers)
+
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+if __name__ == "__main__":
+    import click
+
+    @click.command()
+    @click.option("--locator", "locator_path", default=LOCATOR_PATH, help="Path to the .loc file to serve")
+    @click.option("--workers", default=None, type=int, help="Server worker processes. Defaults to the number of CPUs.")
+    @click.option("--host", default="0.0.0.0")
+    @click.option("--port", default=8000, type=int)
+    @click.option("--warmup_file", default=None, help="CSV (ID, STREET, CITY, STATE, ZIP) or text file of addresses to warm up with")
+    @click.option("--address_index", default=None, help="Folder of the exact-match address index - built if it doesn't exist")
+    @click.option("--address_points", default=None, help="Prepared address points table to build the address indexes from")
+    @click.option("--reverse_index", default=None, help="Folder of the nearest-address reverse index - built if it doesn't exist")
+    @click.option("--counties", default=None, help="Counties feature class to tag results with county_fips")
+    @click.option("--cities", default=None, help="Cities feature class to tag results with city_geoid")
+    @click.option("--zip_boundaries", default=None, help="ZIP boundaries feature class to tag results with zip")
+    @click.option("--block_groups", default=None, help="Census block groups feature class to tag results with block_group")
+    def main(locator_path, workers, host, port, warmup_file, address_index, address_points, reverse_index, counties, cities, zip_boundaries, block_groups):
+        serve(locator_path, workers=workers, host=host, port=port, warmup_file=warmup_file, address_index=address_index,
+              address_points=address_points, reverse_index=reverse_index, counties=counties, cities=cities,
+              zip_boundaries=zip_boundaries, block_groups=block_groups)
+
+    main()
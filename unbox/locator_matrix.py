@@ -0,0 +1,163 @@
+"""
+Build matrix - builds several locator variants from one set of prepared inputs and compares them.
+
+Comparing variants (with and without TIGER, parcels only, different precision types, different role combinations)
+used to mean a full BuildConfig.run_build for each, repeating the downloads and the parcel and address preparation
+every time. Here the preparation runs once for everything any variant needs, then only CreateLocator runs per variant,
+in worker processes with a concurrency limit. Each finished locator is geocoded against the same sample corpus and the
+results are collected into one comparison report.
+
+Variants are dicts with a "name" and any BuildConfig fields that differ from the base config, e.g.
+
+    [
+        {"name": "full"},
+        {"name": "no_tiger", "tiger": null},
+        {"name": "parcels_only", "include_address_points": false, "tiger": null, "cities": null, "counties": null},
+        {"name": "global_high", "precision_type": "GLOBAL_HIGH"}
+    ]
+
+Remote layers (URLs) are downloaded once, so variants can drop the base config's remote layers or swap in local
+paths, but can't point at different URLs.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+from . import build_locator
+from . import stage_graph
+
+if TYPE_CHECKING:
+    from .build_locator import BuildConfig
+
+# BuildConfig fields a variant may change
+VARIANT_FIELDS = ("include_address_points", "include_parcels", "cities", "counties", "tiger", "zip_boundaries", "precision_type")
+REMOTE_FIELDS = ("cities", "counties", "zip_boundaries")
+
+
+def variant_configs(base: "BuildConfig", variants: List[Dict[str, Any]], output_folder: str) -> Dict[str, "BuildConfig"]:
+    configs = {}
+    for variant in variants:
+        overrides = dict(variant)
+        name = overrides.pop("name", None)
+        if not name:
+            raise ValueError(f"Every variant needs a name: {variant}")
+        if name in configs:
+            raise ValueError(f"Variant names must be unique - {name} is used more than once")
+        unknown = set(overrides) - set(VARIANT_FIELDS)
+        if unknown:
+            raise ValueError(f"Variant {name} sets unsupported field(s): {', '.join(sorted(unknown))}")
+        for key in REMOTE_FIELDS:
+            value = overrides.get(key)
+            if value and value.startswith("http") and value != getattr(base, key):
+                raise ValueError(f"Variant {name} uses a different remote {key} layer than the base config - only the base config's remote layers are downloaded")
+        configs[name] = replace(base, output_locator_path=os.path.join(output_folder, f"{name}.loc"), **overrides)
+    return configs
+
+
+def _variant_inputs(cfg: "BuildConfig", prepared: Dict[str, Any], base: "BuildConfig") -> Dict[str, Any]:
+    """create_locator arguments for one variant, pointing at the shared prepared data"""
+    inputs = {
+        "input_smartfabric_gdb": cfg.input_gdb,
+        "output_locator_path": cfg.output_locator_path,
+        "addresses": prepared.get("prepare_addresses") if cfg.include_address_points else None,
+        "parcels_with_addresses": (cfg.parcels_with_addresses or prepared.get("prepare_parcels")) if cfg.include_parcels else None,
+        "tiger": cfg.tiger,
+        "precision_type": cfg.precision_type,
+    }
+    downloaded = dict(zip(REMOTE_FIELDS, prepared["download_remote"])) if "download_remote" in prepared else {}
+    for key in REMOTE_FIELDS:
+        value = getattr(cfg, key)
+        inputs[key] = downloaded.get(key) if value and value == getattr(base, key) and key in downloaded else value
+    return inputs
+
+
+def run_build_matrix(
+    base: "BuildConfig",
+    variants: List[Dict[str, Any]],
+    sample_addresses: Optional[List[str]] = None,
+    output_folder: Optional[str] = None,
+    max_workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Prepares shared inputs once, builds every variant and compares them.
+
+    Args:
+        base: The config every variant starts from. Its input_gdb, temp_gdb and portal settings are shared.
+        variants: List of variant dicts - see the module docstring
+        sample_addresses: Single line addresses to measure geocode throughput with. Skipped when not provided.
+        output_folder: Where to write the variant locators and the report. Defaults to the base locator's folder.
+        max_workers: How many variants to build at once. Defaults to base.max_workers, then the number of CPUs.
+
+    Returns:
+        One dict per variant with build_seconds, locator_bytes and the geocode_benchmark results
+    """
+    output_folder = output_folder or base.output_folder or os.path.dirname(base.output_locator_path)
+    os.makedirs(output_folder, exist_ok=True)
+    configs = variant_configs(base, variants, output_folder)
+    temp_gdb = base.temp_gdb or build_locator.make_temp_gdb(output_folder, base.parcel_gdb_name)
+
+    print(f"Preparing shared inputs for {len(configs)} variants")
+    prep_stages = build_locator._preparation_stages(
+        input_smartfabric_gdb=base.input_gdb,
+        include_address_points=any(cfg.include_address_points for cfg in configs.values()),
+        include_parcels=any(cfg.include_parcels for cfg in configs.values()),
+        cities=base.cities if any(cfg.cities == base.cities for cfg in configs.values()) else None,
+        counties=base.counties if any(cfg.counties == base.counties for cfg in configs.values()) else None,
+        zip_boundaries=base.zip_boundaries if any(cfg.zip_boundaries == base.zip_boundaries for cfg in configs.values()) else None,
+        parcels_with_addresses=base.parcels_with_addresses,
+        temp_gdb=temp_gdb,
+        portal_auth=base.portal_auth,
+        portal=base.portal,
+        spatial_order=base.spatial_order,
+    )
+    prep_results = stage_graph.run_stage_graph(prep_stages, max_workers=base.max_workers, parallel=base.parallel_stages) if prep_stages else {}
+    if prep_results:
+        print(stage_graph.format_stage_report(prep_stages, prep_results))
+    prepared = {name: result.value for name, result in prep_results.items()}
+
+    build_stages = [
+        stage_graph.Stage(name, build_locator.create_locator, kwargs=_variant_inputs(cfg, prepared, base))
+        for name, cfg in configs.items()
+    ]
+    builds = stage_graph.run_stage_graph(
+        build_stages,
+        max_workers=max_workers or base.max_workers or os.cpu_count(),
+        parallel=base.parallel_stages,
+    )
+
+    report = []
+    for name, cfg in configs.items():
+        row = {
+            "name": name,
+            "locator": cfg.output_locator_path,
+            "build_seconds": round(builds[name].duration, 1),
+            "locator_bytes": build_locator.locator_size(cfg.output_locator_path),
+            "variant": {key: getattr(cfg, key) for key in VARIANT_FIELDS},
+        }
+        if sample_addresses:
+            # one at a time so variants aren't competing for CPU while being measured
+            row["geocode"] = build_locator.geocode_benchmark(cfg.output_locator_path, sample_addresses)
+        report.append(row)
+
+    report_path = os.path.join(output_folder, "matrix_report.json")
+    with open(report_path, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(format_matrix_report(report))
+    print(f"Matrix report written to {report_path}")
+    return report
+
+
+def format_matrix_report(report: List[Dict[str, Any]]) -> str:
+    lines = [f"{'Variant':<24}{'Build (s)':>12}{'Size (MB)':>12}{'Geocodes/s':>12}{'p50 (ms)':>10}{'Match rate':>12}"]
+    for row in report:
+        geocode = row.get("geocode") or {}
+        lines.append(
+            f"{row['name']:<24}{row['build_seconds']:>12.1f}{row['locator_bytes'] / 1024 ** 2:>12.1f}"
+            f"{geocode.get('per_second') or '-':>12}{geocode.get('p50_ms') or '-':>10}{geocode.get('match_rate') or '-':>12}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,84 @@
+"""
+Pool of worker processes that each hold their own loaded Locator.
+
+A single Locator geocodes one address at a time, so a file of addresses sent through the shim is bound to one core.
+LocatorPool starts N worker processes, loads the locator once in each, and splits a batch of addresses into chunks
+that are geocoded in parallel. Results come back in input order.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from . import stage_graph
+from .serialization import project
+from .stub_locator import StubLocator, is_stub
+
+# the Locator loaded in this worker process - set by _init_worker
+_WORKER_LOCATOR = None
+
+
+def _init_worker(locator_path):
+    global _WORKER_LOCATOR
+    if is_stub(locator_path):
+        _WORKER_LOCATOR = StubLocator.from_path(locator_path)
+        return
+    from arcpy.geocoding import Locator  # workers only - the parent process doesn't need its own copy
+    _WORKER_LOCATOR = Locator(locator_path)
+
+
+def _geocode_chunk(addresses: List[str], max_locations: int, out_fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Runs in a worker. One failed address doesn't fail the rest of the chunk. Results are trimmed to out_fields here
+    so less has to be pickled back to the parent - geometries never come back.
+    """
+    output = []
+    for address in addresses:
+        try:
+            output.append({"results": project(_WORKER_LOCATOR.geocode(address, True, maxResults=max_locations), out_fields)})
+        except Exception as e:
+            output.append({"error": f"Geocode failed: {e!s}"})
+    return output
+
+
+class LocatorPool(object):
+    """
+    Worker processes with a Locator loaded in each.
+
+    :param locator_path: Path to the .loc file every worker loads
+    :param workers: Number of worker processes. Defaults to the number of CPUs.
+    :param max_chunk_size: Largest number of addresses sent to a worker at once. Batches are split into about four
+        chunks per worker so workers that finish early can pick up more work.
+    """
+
+    def __init__(self, locator_path: str, workers: Optional[int] = None, max_chunk_size: int = 250):
+        self.locator_path = locator_path
+        self.workers = workers or os.cpu_count()
+        self.max_chunk_size = max_chunk_size
+        self._executor = stage_graph.process_pool(self.workers, initializer=_init_worker, initargs=(locator_path,))
+
+    def chunk_size(self, count: int) -> int:
+        return max(1, min(self.max_chunk_size, math.ceil(count / (self.workers * 4))))
+
+    def submit(self, addresses: List[str], max_locations: int = 1, out_fields: Optional[List[str]] = None) -> Future:
+        """Sends one chunk to a worker. The future's result is a list like geocode_many's."""
+        return self._executor.submit(_geocode_chunk, addresses, max_locations, out_fields)
+
+    def geocode_many(self, addresses: List[str], max_locations: int = 1, out_fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns one dict per address, in input order, with either "results" (the list of candidates, with only
+        out_fields when given) or "error".
+        """
+        size = self.chunk_size(len(addresses))
+        futures = [self.submit(addresses[start:start + size], max_locations, out_fields) for start in range(0, len(addresses), size)]
+        output = []
+        for future in futures:
+            output.extend(future.result())
+        return output
+
+    def close(self, wait: bool = True, cancel_pending: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_pending)
@@ -0,0 +1,120 @@
+"""
+Helpers for swapping a rebuilt locator into a running shim - the memory headroom check and a file watcher.
+
+The swap itself lives in locator_api_dev_shim.swap_locator. While the new locator warms up, both it and the old one
+are loaded, so before loading anything we check that there's room for another copy of the locator per instance.
+"""
+
+import ctypes
+import glob
+import os
+import sys
+import threading
+
+from typing import Callable, Optional
+
+
+def locator_size(locator_path) -> int:
+    """Size in bytes of a locator on disk - the .loc file plus the .loz/.lox files that go with it."""
+    base = os.path.splitext(locator_path)[0]
+    return sum(os.path.getsize(path) for path in glob.glob(f"{glob.escape(base)}.lo*"))
+
+
+def available_memory_bytes() -> Optional[int]:
+    """Physical memory available to new allocations, or None when we can't tell on this platform"""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+
+    if sys.platform == "win32":
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("sullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+        return None
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def check_memory_headroom(locator_path: str, instances: int, factor: float = 1.0, reserve_bytes: int = 512 * 1024 ** 2):
+    """
+    Raises MemoryError if loading `instances` more copies of the locator would leave less than reserve_bytes free.
+    Each copy is estimated as the locator's size on disk times factor. Passes when free memory can't be measured.
+    """
+    available = available_memory_bytes()
+    if available is None:
+        print("Can't measure free memory on this platform - skipping the headroom check")
+        return
+    required = int(locator_size(locator_path) * instances * factor) + reserve_bytes
+    if required > available:
+        raise MemoryError(
+            f"Not enough memory to load {locator_path} next to the current locator - needs about "
+            f"{required / 1024 ** 3:.1f} GB but {available / 1024 ** 3:.1f} GB is available"
+        )
+
+
+class LocatorWatcher(object):
+    """
+    Polls a locator path and calls on_change(path) once it has changed and then stayed the same for a full interval,
+    so we don't reload a locator that's still being written.
+
+    :param version: Function returning something that changes when the locator does - geocode_cache.locator_version
+    """
+
+    def __init__(self, locator_path: str, on_change: Callable[[str], None], version: Callable[[str], str], interval: float = 30):
+        self.locator_path = locator_path
+        self.on_change = on_change
+        self.version = version
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="locator-watcher", daemon=True)
+
+    def _current(self) -> Optional[str]:
+        try:
+            return self.version(self.locator_path)
+        except OSError:  # mid-rewrite
+            return None
+
+    def _run(self):
+        loaded = self._current()
+        candidate = None
+        while not self._stop.wait(self.interval):
+            current = self._current()
+            if current is None or current == loaded:
+                candidate = None
+                continue
+            if current != candidate:
+                candidate = current  # changed - wait for it to settle
+                continue
+            try:
+                self.on_change(self.locator_path)
+                loaded = current
+            except Exception as e:
+                print(f"Reloading {self.locator_path} failed, keeping the current locator: {e!s}")
+                loaded = current  # don't retry the same file over and over
+            candidate = None
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,294 @@
+"""
+Sharded locator builds - one locator per county (or per group of counties), combined into a composite locator.
+
+A statewide CreateLocator run is single threaded and takes hours, and any change to the data means starting over.
+Here, each shard's parcels and address points are prepared and built into their own locator in a separate worker
+process, and the shards are then combined with CreateCompositeAddressLocator. The composite routes a request to a
+single shard when the input has a county name or FIPS code in its Subregion field, and searches all of them otherwise.
+
+TIGER, cities, counties and ZIP boundaries cover the whole state, so rather than clipping them into every shard they're
+built once into a "shared" locator that sits last in the composite and backs up every shard for street ranges and
+place-level matches.
+
+A manifest stored with the shards records a fingerprint of each shard's source rows. On the next build, only shards
+whose fingerprint or options changed (or whose locator is missing) are rebuilt. The composite is cheap, so it's
+recreated every time.
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import arcpy
+
+from . import build_locator
+from . import stage_graph
+
+if TYPE_CHECKING:
+    from .build_locator import BuildConfig
+
+FIPS_FIELD = "FIPS_CODE"
+
+# The fields that feed the locator (directly or through the parcel/assessment join) for each source table. If none
+# of these change for a shard's rows, its locator doesn't need to be rebuilt.
+FINGERPRINT_FIELDS = {
+    "Addresses": ["address_lid", "address", "house_number", "street_name", "prefix_type", "suffix_type",
+                  "suffix_direction", "unit", "city", "county", "state", "zip", "SHAPE@XY"],
+    "Parcels": ["PARCEL_LID", "PRIMARY_ASSESSMENT_LID", "SHAPE@AREA", "SHAPE@XY"],
+    "Assessments": ["ASSESSMENT_LID", "SITE_ADDR", "SITE_HOUSE_NUMBER", "SITE_DIRECTION", "SITE_STREET_NAME",
+                    "SITE_MODE", "SITE_QUADRANT", "SITE_UNIT_PREFIX", "SITE_UNIT_NUMBER", "SITE_CITY", "SITE_STATE",
+                    "SITE_ZIP", "SITE_PLUS_4"],
+}
+
+# Input fields of the composite locator, mapped to the fields of the same name on every member.
+# (field name, alias, length)
+COMPOSITE_INPUT_FIELDS = [
+    ("Address", "Address or Place", 100),
+    ("Address2", "Address2", 100),
+    ("Address3", "Address3", 100),
+    ("Neighborhood", "Neighborhood", 50),
+    ("City", "City", 50),
+    ("Subregion", "County", 50),
+    ("Region", "State", 50),
+    ("Postal", "ZIP", 20),
+    ("PostalExt", "ZIP4", 20),
+    ("CountryCode", "Country", 100),
+]
+
+SHARED_LOCATOR_NAME = "shared"
+
+
+def _distinct_values(table, field) -> List[Any]:
+    with arcpy.da.SearchCursor(table, [field], sql_clause=(f"DISTINCT {field}", None)) as cursor:
+        return sorted({row[0] for row in cursor if row[0] is not None})
+
+
+def list_region_groups(input_gdb, region_groups: Optional[Dict[str, List[str]]] = None) -> Dict[str, List[str]]:
+    """
+    Returns {shard name: [FIPS codes]}. When region_groups isn't provided, every county with address points or
+    parcels gets its own shard.
+    """
+    if region_groups:
+        return {_member_name(name): [str(code) for code in codes] for name, codes in region_groups.items()}
+
+    codes = set()
+    for table in ("Addresses", "Parcels"):
+        codes.update(str(code) for code in _distinct_values(os.path.join(input_gdb, table), FIPS_FIELD))
+    return {_member_name(f"county_{code}"): [code] for code in sorted(codes)}
+
+
+def _member_name(name) -> str:
+    """Composite member names can't have spaces or punctuation"""
+    return re.sub(r"\W", "_", str(name))
+
+
+def fips_where_clause(table, fips_codes, field=FIPS_FIELD) -> str:
+    field_type = arcpy.ListFields(table, field)[0].type
+    if field_type == "String":
+        values = ", ".join(f"'{code}'" for code in fips_codes)
+    else:
+        values = ", ".join(str(int(code)) for code in fips_codes)
+    return f"{field} IN ({values})"
+
+
+def shard_fingerprint(input_gdb, fips_codes) -> Dict[str, Any]:
+    """
+    Hashes the locator-relevant rows of one shard. Row hashes are summed, so the fingerprint doesn't depend on
+    the order the rows come back in.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    rows = {}
+    counties = set()
+
+    for table, fields in FINGERPRINT_FIELDS.items():
+        path = os.path.join(input_gdb, table)
+        county_index = fields.index("county") if "county" in fields else None
+        total = 0
+        count = 0
+        with arcpy.da.SearchCursor(path, fields, where_clause=fips_where_clause(path, fips_codes)) as cursor:
+            for row in cursor:
+                row_hash = hashlib.blake2b(repr(row).encode("utf-8"), digest_size=8).digest()
+                total = (total + int.from_bytes(row_hash, "little")) % 2**64
+                count += 1
+                if county_index is not None and row[county_index]:
+                    counties.add(row[county_index])
+        rows[table] = count
+        digest.update(f"{table}:{count}:{total};".encode("utf-8"))
+
+    return {"fingerprint": digest.hexdigest(), "rows": rows, "counties": sorted(counties)}
+
+
+def build_shard(input_gdb, fips_codes, output_locator_path, include_address_points=True, include_parcels=True, spatial_order=None) -> str:
+    """Prepares and builds the locator for one shard. Runs in a worker process."""
+    shard_folder = os.path.dirname(output_locator_path)
+    os.makedirs(shard_folder, exist_ok=True)
+    temp_gdb = build_locator.make_temp_gdb(shard_folder, "shard_inputs.gdb")
+
+    with arcpy.EnvManager(overwriteOutput=True):
+        build_locator.make_locator(
+            input_smartfabric_gdb=input_gdb,
+            output_locator_path=output_locator_path,
+            include_address_points=include_address_points,
+            include_parcels=include_parcels,
+            temp_gdb=temp_gdb,
+            # FIPS_CODE can be text in one table and a number in the other, so each gets its own clause
+            where_clause=fips_where_clause(os.path.join(input_gdb, "Addresses"), fips_codes),
+            parcel_where_clause=fips_where_clause(os.path.join(input_gdb, "Parcels"), fips_codes),
+            parallel=False,  # each shard already runs in its own worker process
+            spatial_order=spatial_order,
+        )
+
+    shutil.rmtree(os.path.dirname(temp_gdb), ignore_errors=True)
+    return output_locator_path
+
+
+def build_shared_locator(input_gdb, output_locator_path, cities=None, counties=None, tiger=None, zip_boundaries=None, temp_gdb=None, portal_auth="pro", portal=None) -> str:
+    """Builds the statewide layers every shard shares into their own locator. Runs in a worker process."""
+    cities, counties, zip_boundaries = build_locator.copy_remote_to_local(
+        cities=cities, counties=counties, zips=zip_boundaries, temp_gdb=temp_gdb, portal_auth=portal_auth, portal=portal,
+    )
+    with arcpy.EnvManager(overwriteOutput=True):
+        return build_locator.create_locator(
+            input_smartfabric_gdb=input_gdb,
+            output_locator_path=output_locator_path,
+            cities=cities,
+            counties=counties,
+            tiger=tiger,
+            zip_boundaries=zip_boundaries,
+        )
+
+
+def subregion_criterion(fips_codes, county_names) -> str:
+    """Selection criterion that routes requests with one of these counties (by name or FIPS) to a shard"""
+    values = set(fips_codes) | set(county_names)
+    values |= {f"{name} County" for name in county_names if not name.lower().endswith(" county")}
+    return " OR ".join("Subregion = '{}'".format(value.replace("'", "''")) for value in sorted(values))
+
+
+def create_composite_locator(members: List[Tuple[str, str, Optional[str]]], output_locator_path) -> str:
+    """
+    Args:
+        members: (member name, locator path, selection criterion or None) in priority order
+        output_locator_path: Path to the composite .loc to create
+    """
+    locators = ";".join(f"'{path}' {name}" for name, path, _ in members)
+    field_map = ";".join(
+        f'{field} "{alias}" true true false {length} Text 0 0,First,#,'
+        + ",".join(f"{name},{field},0,0" for name, _, _ in members)
+        for field, alias, length in COMPOSITE_INPUT_FIELDS
+    )
+    criteria = ";".join(f'{name} "{criterion}"' if criterion else f"{name} #" for name, _, criterion in members)
+
+    print(f"Creating composite locator from {len(members)} members")
+    with arcpy.EnvManager(overwriteOutput=True):
+        arcpy.geocoding.CreateCompositeAddressLocator(locators, field_map, criteria, output_locator_path)
+    return output_locator_path
+
+
+def _read_manifest(manifest_path) -> Dict[str, Any]:
+    if manifest_path and os.path.exists(manifest_path):
+        with open(manifest_path, "r") as manifest_file:
+            return json.load(manifest_file)
+    return {"shards": {}, "shared": None}
+
+
+def _write_manifest(manifest, manifest_path):
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)  # never leave a half-written manifest behind if we're interrupted
+
+
+def build_sharded_locator(cfg: "BuildConfig") -> Dict[str, Any]:
+    """
+    Builds (or incrementally rebuilds) the shards described by the config and combines them into a composite
+    locator at cfg.output_locator_path.
+
+    Returns:
+        dict with the composite path, the names of the shards that were rebuilt and skipped, and stage timings
+    """
+    shards_folder = f"{os.path.splitext(cfg.output_locator_path)[0]}_shards"
+    os.makedirs(shards_folder, exist_ok=True)
+    manifest_path = cfg.shard_manifest or os.path.join(shards_folder, "manifest.json")
+    manifest = _read_manifest(manifest_path)
+    max_workers = cfg.max_workers or os.cpu_count()
+
+    groups = list_region_groups(cfg.input_gdb, cfg.region_groups)
+    options = {"include_address_points": cfg.include_address_points, "include_parcels": cfg.include_parcels}
+    print(f"Fingerprinting {len(groups)} shards")
+    fingerprints = stage_graph.run_stage_graph(
+        [stage_graph.Stage(name, shard_fingerprint, kwargs=dict(input_gdb=cfg.input_gdb, fips_codes=codes)) for name, codes in groups.items()],
+        max_workers=max_workers,
+        parallel=cfg.parallel_stages,
+    )
+
+    shard_locators = {name: os.path.join(shards_folder, name, f"{name}.loc") for name in groups}
+    rebuild = []
+    for name, codes in groups.items():
+        previous = manifest["shards"].get(name)
+        if (previous is None or previous["fingerprint"] != fingerprints[name].value["fingerprint"]
+                or previous.get("options") != options or not arcpy.Exists(shard_locators[name])):
+            rebuild.append(name)
+
+    stages = [
+        stage_graph.Stage(name, build_shard, kwargs=dict(
+            input_gdb=cfg.input_gdb,
+            fips_codes=groups[name],
+            output_locator_path=shard_locators[name],
+            include_address_points=cfg.include_address_points,
+            include_parcels=cfg.include_parcels,
+            spatial_order=cfg.spatial_order,
+        ))
+        for name in rebuild
+    ]
+
+    shared_inputs = {"cities": cfg.cities, "counties": cfg.counties, "tiger": cfg.tiger, "zip_boundaries": cfg.zip_boundaries}
+    shared_locator = os.path.join(shards_folder, SHARED_LOCATOR_NAME, f"{SHARED_LOCATOR_NAME}.loc")
+    use_shared = any(shared_inputs.values())
+    if use_shared and (not manifest["shared"] or manifest["shared"]["inputs"] != shared_inputs or not arcpy.Exists(shared_locator)):
+        os.makedirs(os.path.dirname(shared_locator), exist_ok=True)
+        stages.append(stage_graph.Stage(SHARED_LOCATOR_NAME, build_shared_locator, kwargs=dict(
+            input_gdb=cfg.input_gdb,
+            output_locator_path=shared_locator,
+            temp_gdb=build_locator.make_temp_gdb(os.path.dirname(shared_locator), "shared_inputs.gdb"),
+            portal_auth=cfg.portal_auth,
+            portal=cfg.portal,
+            **shared_inputs,
+        )))
+
+    print(f"Rebuilding {len(rebuild)} of {len(groups)} shards: {', '.join(rebuild) or 'none'}")
+
+    def record(result: stage_graph.StageResult):
+        # write the manifest as each shard finishes so a failure later on doesn't lose finished work
+        entry = {"locator": result.value, "build_seconds": round(result.duration, 1), "built_at": datetime.datetime.now().isoformat()}
+        if result.name == SHARED_LOCATOR_NAME:
+            manifest["shared"] = {**entry, "inputs": shared_inputs}
+        else:
+            manifest["shards"][result.name] = {**entry, **fingerprints[result.name].value, "fips_codes": groups[result.name], "options": options}
+        _write_manifest(manifest, manifest_path)
+
+    builds = stage_graph.run_stage_graph(stages, max_workers=max_workers, parallel=cfg.parallel_stages, on_result=record) if stages else {}
+    if builds:
+        print(stage_graph.format_stage_report(stages, builds))
+
+    members = [
+        (name, shard_locators[name], subregion_criterion(groups[name], fingerprints[name].value["counties"]))
+        for name in groups
+    ]
+    if use_shared:
+        members.append((SHARED_LOCATOR_NAME, shared_locator, None))
+    create_composite_locator(members, cfg.output_locator_path)
+
+    return {
+        "composite": cfg.output_locator_path,
+        "rebuilt": rebuild,
+        "skipped": [name for name in groups if name not in rebuild],
+        "stages": builds,
+    }
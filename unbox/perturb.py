@@ -0,0 +1,273 @@
+"""
+Perturbed address corpora, for measuring how well a locator copes with bad input.
+
+Takes a corpus in our standard input schema (ID, STREET, CITY, STATE, ZIP - stratified_sample writes one) and writes a
+copy with a mix of damage applied: house numbers dropped or wrong, street types dropped, typos in the street name, ZIP
+codes wrong or missing, cities missing. Each perturbation is a batch string operation over every row it applies to
+(np.char, or swapping characters in a fixed width character array), so millions of rows take seconds. Every output
+row keeps the ID it came from in ORIGINAL_ID and what was done to it in PERTURBATION. Rows a perturbation can't apply
+to (dropping the house number of an address without one, say) are written unchanged as "none".
+
+The output geocodes like any other corpus, and the report joins the results back on ID for the match rate of each
+perturbation type - and, given the original corpus geocoded too, how far each type moves the location:
+
+    python -m unbox.perturb --input qa_sample.csv --output perturbed.csv --copies 2
+    python bulk_geocode_cli.py --locator locator.loc --input perturbed.csv --output perturbed_geocoded.csv
+    python -m unbox.perturb --input perturbed.csv --geocoded perturbed_geocoded.csv --baseline qa_sample_geocoded.csv
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from .address_normalize import ABBREVIATIONS
+from .projection import geodesic_distance
+
+INPUT_FIELDS = ["ID", "STREET", "CITY", "STATE", "ZIP"]
+OUTPUT_FIELDS = ["ID", "ORIGINAL_ID", "PERTURBATION", "STREET", "CITY", "STATE", "ZIP"]
+_SUFFIXES = ("ALLEY", "AVENUE", "BOULEVARD", "CIRCLE", "COURT", "DRIVE", "EXPRESSWAY", "FREEWAY", "HIGHWAY", "LANE", "LOOP",
+             "PARKWAY", "PLACE", "PLAZA", "ROAD", "SQUARE", "STREET", "TERRACE", "TRAIL", "WAY")
+# what drop_street_type removes from the end of a street - spelled out or abbreviated
+STREET_TYPES = np.array(sorted(set(_SUFFIXES) | {ABBREVIATIONS[suffix] for suffix in _SUFFIXES}))
+# report how often perturbed addresses land within this many meters of where the original did
+WITHIN_METERS = 100
+
+Columns = Dict[str, np.ndarray]
+
+
+def _house_number(street: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """The first token of each street, the rest of it, and whether the first token is a house number"""
+    parts = np.char.partition(street, " ")
+    first, rest = parts[:, 0], parts[:, 2]
+    return first, rest, np.char.isdigit(first) & (np.char.str_len(rest) > 0)
+
+
+def drop_house_number(columns: Columns, rng: np.random.Generator) -> Tuple[Columns, np.ndarray]:
+    _, rest, applies = _house_number(columns["STREET"])
+    return {"STREET": rest}, applies
+
+
+def wrong_house_number(columns: Columns, rng: np.random.Generator) -> Tuple[Columns, np.ndarray]:
+    first, rest, applies = _house_number(columns["STREET"])
+    numbers = rng.integers(1, 20000, len(first)).astype(str)
+    numbers = np.where(numbers == first, np.char.add(numbers, "1"), numbers)
+    return {"STREET": np.char.add(np.char.add(numbers, " "), rest)}, applies
+
+
+def drop_street_type(columns: Columns, rng: np.random.Generator) -> Tuple[Columns, np.ndarray]:
+    """Drops a street type at the very end of the street - not one followed by a unit"""
+    parts = np.char.rpartition(columns["STREET"], " ")
+    head, last = parts[:, 0], parts[:, 2]
+    return {"STREET": head}, np.isin(np.char.upper(last), STREET_TYPES) & (np.char.str_len(head) > 0)
+
+
+def typo(columns: Columns, rng: np.random.Generator) -> Tuple[Columns, np.ndarray]:
+    """Swaps two neighboring characters somewhere in the street name (after the house number)"""
+    street = columns["STREET"]
+    first, _, numbered = _house_number(street)
+    start = np.where(numbered, np.char.str_len(first) + 1, 0)
+    lengths = np.char.str_len(street)
+    applies = lengths - start >= 3
+    width = max(int(lengths.max(initial=0)), 1)
+    characters = street.astype(f"<U{width}").view(np.uint32).reshape(len(street), width).copy()
+    position = start + (rng.random(len(street)) * np.maximum(lengths - start - 1, 1)).astype(np.int64)
+    position = np.where(applies, position, 0)
+    rows = np.arange(len(street))
+    swapped = characters[rows, position].copy()
+    characters[rows, position] = characters[rows, np.minimum(position + 1, width - 1)]
+    characters[rows, np.minimum(position + 1, width - 1)] = swapped
+    misspelled = characters.view(f"<U{width}").ravel()
+    # swapping two of the same character isn't a typo
+    return {"STREET": misspelled}, applies & (misspelled != street)
+
+
+def wrong_zip(columns: Columns, rng: np.random.Generator) -> Tuple[Columns, np.ndarray]:
+    """Changes the last digit of the ZIP code (dropping any +4) - usually a real ZIP code, just not the right one"""
+    five = np.char.ljust(columns["ZIP"], 5).astype("<U5")
+    last = five.view(np.uint32).reshape(len(five), 5)[:, 4].astype(np.int64) - ord("0")
+    new_last = (last + rng.integers(1, 10, len(five))) % 10
+    return {"ZIP": np.char.add(five.astype("<U4"), new_last.astype(str))}, np.char.isdigit(five)
+
+
+def drop_zip(columns: Columns, rng: np.random.Generator) -> Tuple[Columns, np.ndarray]:
+    return {"ZIP": np.full(len(columns["ZIP"]), "")}, np.char.str_len(columns["ZIP"]) > 0
+
+
+def drop_city(columns: Columns, rng: np.random.Generator) -> Tuple[Columns, np.ndarray]:
+    return {"CITY": np.full(len(columns["CITY"]), "")}, np.char.str_len(columns["CITY"]) > 0
+
+
+PERTURBATIONS: Dict[str, Callable[[Columns, np.random.Generator], Tuple[Columns, np.ndarray]]] = {
+    "drop_house_number": drop_house_number,
+    "wrong_house_number": wrong_house_number,
+    "drop_street_type": drop_street_type,
+    "typo": typo,
+    "wrong_zip": wrong_zip,
+    "drop_zip": drop_zip,
+    "drop_city": drop_city,
+}
+# "none" rows are the control - the same addresses, untouched
+DEFAULT_MIX = {"none": 1, **{name: 1 for name in PERTURBATIONS}}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parses "drop_zip=2,typo=1,none" into weights - a name without a weight gets 1"""
+    weights = {}
+    for part in filter(None, (part.strip() for part in mix.split(","))):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight) if weight else 1.0
+    return weights
+
+
+def perturb(columns: Columns, mix: Optional[Dict[str, float]] = None, copies: int = 1, seed: int = 0) -> Columns:
+    """
+    Makes `copies` perturbed copies of each row of a corpus (columns as numpy string arrays), each with a perturbation
+    picked by the mix's weights. Any columns beyond the standard ones are carried through.
+    """
+    mix = mix or DEFAULT_MIX
+    unknown = set(mix) - set(PERTURBATIONS) - {"none"}
+    if unknown:
+        raise ValueError(f"Unknown perturbations {sorted(unknown)} - choose from {['none'] + list(PERTURBATIONS)}")
+    missing = set(INPUT_FIELDS) - set(columns)
+    if missing:
+        raise ValueError(f"The corpus needs the standard input columns {INPUT_FIELDS} - it's missing {sorted(missing)}")
+
+    rng = np.random.default_rng(seed)
+    count = len(columns["ID"])
+    rows = np.tile(np.arange(count), copies)
+    output = {name: np.asarray(values)[rows].astype(str) for name, values in columns.items()}
+    copy_numbers = np.repeat(np.arange(1, copies + 1), count).astype(str)
+    output["ORIGINAL_ID"] = output["ID"]
+    output["ID"] = np.char.add(np.char.add(output["ID"], "-"), copy_numbers)
+
+    names = list(mix)
+    weights = np.array([mix[name] for name in names], dtype=np.float64)
+    chosen = rng.choice(len(names), size=len(rows), p=weights / weights.sum())
+    perturbation = np.full(len(rows), "none", dtype=f"<U{max(map(len, names + ['none']))}")
+    for number, name in enumerate(names):
+        if name == "none":
+            continue
+        selected = np.flatnonzero(chosen == number)
+        changes, applies = PERTURBATIONS[name]({field: output[field][selected] for field in INPUT_FIELDS}, rng)
+        selected = selected[applies]
+        for field, values in changes.items():
+            values = values[applies]
+            if values.dtype.itemsize > output[field].dtype.itemsize:  # wrong house numbers can be longer than right ones
+                output[field] = output[field].astype(values.dtype)
+            output[field][selected] = values
+        perturbation[selected] = name
+    output["PERTURBATION"] = perturbation
+    return output
+
+
+def read_columns(path: str) -> Columns:
+    """A CSV's columns as numpy string arrays, keyed by upper case column name"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        header = [name.strip().upper() for name in next(reader, [])]
+        values = list(zip(*reader)) or [()] * len(header)
+    return {name: np.array(column, dtype=str) for name, column in zip(header, values)}
+
+
+def write_columns(columns: Columns, path: str):
+    fields = [field for field in OUTPUT_FIELDS if field in columns] + [field for field in columns if field not in OUTPUT_FIELDS]
+    with open(path, "w", encoding="utf-8", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(fields)
+        writer.writerows(zip(*(columns[field].tolist() for field in fields)))
+
+
+def _join(ids: np.ndarray, other_ids: np.ndarray) -> np.ndarray:
+    """Index of each ID in other_ids, or -1"""
+    unique, first = np.unique(other_ids, return_index=True)
+    if not len(unique):
+        return np.full(len(ids), -1)
+    positions = np.minimum(np.searchsorted(unique, ids), len(unique) - 1)
+    return np.where(unique[positions] == ids, first[positions], -1)
+
+
+def _coordinates(geocoded: Columns, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    x = np.full(len(rows), np.nan)
+    y = np.full(len(rows), np.nan)
+    found = rows >= 0
+    for values, column in ((x, "X"), (y, "Y")):
+        picked = geocoded[column][rows[found]]
+        numeric = np.char.str_len(picked) > 0
+        filled = np.full(len(picked), np.nan)
+        filled[numeric] = picked[numeric].astype(np.float64)
+        values[found] = filled
+    return x, y
+
+
+def perturbation_report(perturbed: Columns, geocoded: Columns, baseline: Optional[Columns] = None,
+                        within: float = WITHIN_METERS) -> Dict[str, Dict[str, object]]:
+    """
+    Match rate (and mean score) per perturbation type, from a perturbed corpus and its bulk geocoding output. With the
+    original corpus's geocoding output as the baseline, also the median distance from where the original address was
+    found, and the share found within `within` meters of it.
+    """
+    rows = _join(perturbed["ID"], geocoded["ID"])
+    status = np.where(rows >= 0, geocoded["STATUS"][np.maximum(rows, 0)], "")
+    matched = status == "M"
+    scores = np.where(matched, geocoded["SCORE"][np.maximum(rows, 0)], "")
+    scores = np.where(np.char.str_len(scores) > 0, scores, "nan").astype(np.float64)
+
+    distances = None
+    if baseline is not None:
+        x, y = _coordinates(geocoded, np.where(matched, rows, -1))
+        baseline_rows = _join(perturbed["ORIGINAL_ID"], baseline["ID"])
+        baseline_matched = baseline_rows >= 0
+        baseline_matched[baseline_matched] = baseline["STATUS"][baseline_rows[baseline_matched]] == "M"
+        original_x, original_y = _coordinates(baseline, np.where(baseline_matched, baseline_rows, -1))
+        distances = geodesic_distance(original_x, original_y, x, y)
+
+    report = {}
+    for name in np.unique(perturbed["PERTURBATION"]):
+        selected = perturbed["PERTURBATION"] == name
+        count = int(selected.sum())
+        result = {
+            "rows": count,
+            "matched": int(matched[selected].sum()),
+            "match_rate": round(float(matched[selected].mean()), 4),
+            "mean_score": round(float(np.nanmean(scores[selected])), 2) if matched[selected].any() else None,
+        }
+        if distances is not None:
+            compared = distances[selected][~np.isnan(distances[selected])]
+            result["compared"] = len(compared)
+            result["median_meters"] = round(float(np.median(compared)), 1) if len(compared) else None
+            result[f"within_{within:g}m"] = round(float((compared <= within).mean()), 4) if len(compared) else None
+        report[str(name)] = result
+    return report
+
+
+if __name__ == "__main__":
+    import time
+
+    import click
+
+    @click.command()
+    @click.option("--input", "input_path", required=True, help="Corpus CSV in the standard input schema - or, with --geocoded, a perturbed corpus")
+    @click.option("--output", default=None, help="CSV to write the perturbed corpus to")
+    @click.option("--mix", default=None, help="Perturbations and weights, e.g. none=1,drop_zip=2,typo. All of them equally by default.")
+    @click.option("--copies", default=1, type=int, help="Perturbed copies of each input row")
+    @click.option("--seed", default=0, type=int, help="Same seed, same perturbations")
+    @click.option("--geocoded", default=None, help="Instead of perturbing, report on this bulk geocoding output of the --input corpus")
+    @click.option("--baseline", default=None, help="Bulk geocoding output of the original corpus, for distances in the report")
+    def main(input_path, output, mix, copies, seed, geocoded, baseline):
+        if geocoded:
+            report = perturbation_report(read_columns(input_path), read_columns(geocoded), read_columns(baseline) if baseline else None)
+            print(json.dumps(report, indent=2))
+            return
+        if not output:
+            raise click.UsageError("Pass --output, or --geocoded for a report")
+        start = time.perf_counter()
+        perturbed = perturb(read_columns(input_path), parse_mix(mix) if mix else None, copies, seed)
+        write_columns(perturbed, output)
+        print(f"Wrote {len(perturbed['ID'])} perturbed addresses to {output} in {time.perf_counter() - start:.1f} seconds")
+
+    main()
@@ -16,12 +16,22 @@
 #       Keep LB location, then make some perturbed datasets - drop house numbers, or "way"/"street" at the end, or modify them to have incorrect or nonexistent values, mess up the zip code, etc etc
 #
 # check distance to matched parcel for each input
-from typing import Optional
+from __future__ import annotations
+
+import csv
+import itertools
+import warnings
+
+from typing import Dict, Iterable, List, Optional, Union
 from pathlib import Path
 
 import arcpy
 import numpy as np
 
+from .projection import geodesic_distance
+from .result_store import ResultStore
+from .tdigest import TDigest
+
 # Let's make some constants to reference for types of geocoders we'll compare with.
 CDT = {"name": "State", "field_name": "CDT", "id": 1}
 ESRI = {"name": "StreetMapPremium", "field_name": "SMP", "id": 2}
@@ -30,82 +40,326 @@ AZURE = {"name": "Azure Maps", "field_name": "Azure", "id": 4}
 GOOGLE = {"name": "Google Maps API", "field_name": "Google", "id": 5}
 LIGHTBOX = {"name": "LightBox Geocoding API", "field_name": "LB", "id": 6}
 
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90, 95, 98, 99)
+# distances (meters) we report the share of addresses two geocoders agree within
+AGREEMENT_METERS = (25, 50, 100)
+# rows per read when streaming - about 8 MB per numeric field
+STREAMING_CHUNK_SIZE = 1_000_000
+# distances computed at once when comparing every pair of geocoders (pairs x IDs) - about 8 MB per temporary array
+COMPARISON_CHUNK_DISTANCES = 1_000_000
+
+
+def read_columns(table, fields: Iterable[str], where_clause: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Reads numeric fields into float64 numpy arrays in one bulk read, with nulls as NaN. Much faster than looping over
+    a SearchCursor for millions of rows.
+    """
+    fields = list(fields)
+    array = arcpy.da.TableToNumPyArray(table, fields, where_clause=where_clause, skip_nulls=False,
+                                       null_value={field: np.nan for field in fields})
+    return {field: np.asarray(array[field], dtype=np.float64) for field in fields}
+
+
+def _oid_chunks(table, chunk_size: int):
+    """Where clauses covering the table chunk_size object IDs at a time"""
+    oid_field = arcpy.Describe(table).OIDFieldName
+    with arcpy.da.SearchCursor(table, [oid_field], sql_clause=(None, f"ORDER BY {oid_field} DESC")) as cursor:
+        last_oid = next(iter(cursor), (0,))[0]
+    for start in range(0, last_oid, chunk_size):
+        yield f"{oid_field} > {start} AND {oid_field} <= {start + chunk_size}"
+
+
+def _value_percentiles(values: np.ndarray, pcts: Iterable[float]) -> Dict[float, float]:
+    """All the percentiles of an array's non-NaN values from one np.percentile call"""
+    pcts = list(pcts)
+    values = values[~np.isnan(values)]
+    estimates = np.percentile(values, pcts) if len(values) else np.full(len(pcts), np.nan)
+    return {p: float(estimate) for p, estimate in zip(pcts, estimates)}
+
+
+def percentiles(table, pcts=DEFAULT_PERCENTILES, fields=("NEAR_DIST_BING", "NEAR_DIST_SMP"), streaming: bool = False,
+                chunk_size: int = STREAMING_CHUNK_SIZE, compression: float = 500):
+    """
+    Percentiles of each field's non-null values, as {field: {pct: value}}.
+
+    By default every field is read into memory in one bulk read and all its percentiles come from one np.percentile
+    call. With streaming=True, the table is read chunk_size object IDs at a time into a t-digest per field instead -
+    memory stays flat however big the table is, and the percentiles are approximate (well under 1% off in the tails
+    for distance-like data).
+    """
+    pcts = list(pcts)
+    if not streaming:
+        return {field: _value_percentiles(values, pcts) for field, values in read_columns(table, fields).items()}
+
+    digests = {field: TDigest(compression) for field in fields}
+    for where_clause in _oid_chunks(table, chunk_size):
+        for field, values in read_columns(table, fields, where_clause).items():
+            digests[field].update(values)
+    return {field: digest.percentiles(pcts) for field, digest in digests.items()}
+
+
+def read_points(points_path, id_field: str = "ID"):
+    """
+    IDs, longitudes and latitudes (WGS84, whatever the data's own coordinate system) of a point dataset as numpy arrays,
+    in one bulk read. Rows without a location or ID (unmatched addresses) are left out.
+    """
+    array = arcpy.da.FeatureClassToNumPyArray(str(points_path), [id_field, "SHAPE@X", "SHAPE@Y"],
+                                              spatial_reference=arcpy.SpatialReference(4326), skip_nulls=True)
+    return array[id_field], np.asarray(array["SHAPE@X"], dtype=np.float64), np.asarray(array["SHAPE@Y"], dtype=np.float64)
+
+
+def join_on_id(ids: np.ndarray, other_ids: np.ndarray) -> np.ndarray:
+    """
+    For each of ids, the index of the first row of other_ids with the same ID, or -1 when there isn't one. Sorts once
+    and binary searches instead of building a dict, so it's fast for millions of IDs.
+    """
+    if ids.dtype.kind != other_ids.dtype.kind:  # text IDs on one side and numbers on the other
+        ids, other_ids = ids.astype(str), other_ids.astype(str)
+    unique, first = np.unique(other_ids, return_index=True)
+    if not len(unique):
+        return np.full(len(ids), -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(unique, ids), len(unique) - 1)
+    return np.where(unique[positions] == ids, first[positions], -1)
+
+
+def write_lines(output, ids, id_field, lons, lats, other_lons, other_lats, distance_field, distances):
+    """Writes geodesic lines from each (lon, lat) to its (other_lon, other_lat) - for looking at the misses on a map"""
+    table = np.zeros(len(ids), dtype=[(id_field, ids.dtype), ("BASE_X", "f8"), ("BASE_Y", "f8"), ("COMPARISON_X", "f8"),
+                                      ("COMPARISON_Y", "f8"), (distance_field, "f8")])
+    table[id_field], table["BASE_X"], table["BASE_Y"] = ids, lons, lats
+    table["COMPARISON_X"], table["COMPARISON_Y"], table[distance_field] = other_lons, other_lats, distances
+    pairs = "in_memory/comparison_pairs"
+    if arcpy.Exists(pairs):
+        arcpy.management.Delete(pairs)
+    arcpy.da.NumPyArrayToTable(table, pairs)
+    try:
+        arcpy.management.XYToLine(pairs, str(output), "BASE_X", "BASE_Y", "COMPARISON_X", "COMPARISON_Y", "GEODESIC",
+                                  id_field, arcpy.SpatialReference(4326), "ATTRIBUTES")
+    finally:
+        arcpy.management.Delete(pairs)
+    return output
+
+
+def _geocode_points(geocode: "GeocodedDataset", id_field: str, store: Optional[ResultStore] = None):
+    """read_points for a geocoded dataset - from its points, or its located results in a ResultStore"""
+    if store is None:
+        return read_points(geocode.points_path, id_field)
+    results = store.read(geocode.dataset.name, geocode.geocoder["field_name"], geocode.build_id, matched_only=True)
+    return results["address_id"].astype(str), results["x"], results["y"]
+
 
-def percentiles(table, pcts=(10, 25, 50, 75, 90, 95, 98, 99), fields=("NEAR_DIST_BING", "NEAR_DIST_SMP")):
-    all_values = {fid: {'name': field, 'values': [], 'pcts': {}} for fid, field in list(enumerate(fields))}
-    ids = all_values.keys()
-    with arcpy.da.SearchCursor(table, fields) as data:
-        for row in data:
-            for id in ids:
-                if row[id] is not None:
-                    all_values[id]['values'].append(row[id])
-        for id in ids:
-            np_data = np.array(all_values[id]['values'])
-            for p in pcts:
-                all_values[id]['pcts'][p] = np.percentile(np_data, p)
-    returns = {value['name']: value['pcts'] for id, value in all_values.items()}
-    return returns
+def align_points(geocodes: Iterable["GeocodedDataset"], id_field: str = "ID", store: Optional[ResultStore] = None):
+    """
+    Reads each geocoded dataset once (from the result store, if given) and lines them up by ID. Returns the sorted IDs
+    found in any of them, and longitude and latitude arrays with a row per dataset and a column per ID - NaN where a
+    dataset has no location.
+    """
+    points = [_geocode_points(geocode, id_field, store) for geocode in geocodes]
+    if not points:
+        return np.zeros(0), np.zeros((0, 0)), np.zeros((0, 0))
+    if len({ids.dtype.kind for ids, _, _ in points}) > 1:
+        points = [(ids.astype(str), lons, lats) for ids, lons, lats in points]
+    all_ids = np.unique(np.concatenate([ids for ids, _, _ in points]))
+    lons = np.full((len(points), len(all_ids)), np.nan)
+    lats = np.full((len(points), len(all_ids)), np.nan)
+    for row, (ids, point_lons, point_lats) in enumerate(points):
+        rows = join_on_id(all_ids, ids)
+        found = rows >= 0
+        lons[row, found], lats[row, found] = point_lons[rows[found]], point_lats[rows[found]]
+    return all_ids, lons, lats
+
+
+def _column_name(prefix: str, value: float) -> str:
+    return f"{prefix}{value:g}".replace(".", "_")
+
+
+def comparison_matrix(names: List[str], lons: np.ndarray, lats: np.ndarray, pcts=DEFAULT_PERCENTILES,
+                      agreement=AGREEMENT_METERS, chunk_distances: int = COMPARISON_CHUNK_DISTANCES,
+                      compression: float = 500) -> List[Dict[str, object]]:
+    """
+    Compares every pair of geocoders, from align_points' arrays. Returns a row of results per pair - how many IDs both
+    located, how many only one did, distance percentiles and the share of the IDs both located that are within each
+    agreement distance.
+
+    Distances are worked out for a block of IDs at a time (about chunk_distances of them across all the pairs), so
+    memory stays flat however many addresses there are. Counts, means and agreement add up exactly across blocks.
+    Percentiles are exact when everything fits in one block, and otherwise come from a t-digest per pair, like
+    percentiles(streaming=True).
+    """
+    first, second = np.triu_indices(len(names), k=1)
+    pairs, id_count = len(first), lons.shape[1] if lons.ndim == 2 else 0
+    chunk_size = max(1, chunk_distances // max(pairs, 1))
+    located = ~np.isnan(lons)
+
+    pcts, agreement = list(pcts), list(agreement)
+    counts, sums = np.zeros(pairs, dtype=np.int64), np.zeros(pairs)
+    within_counts = np.zeros((len(agreement), pairs), dtype=np.int64)
+    pair_percentiles = np.full((len(pcts), pairs), np.nan)
+    digests = [TDigest(compression) for _ in range(pairs)] if id_count > chunk_size else None
+    for start in range(0, id_count, chunk_size):
+        ids = slice(start, start + chunk_size)
+        distances = geodesic_distance(lons[first, ids], lats[first, ids], lons[second, ids], lats[second, ids])
+        counts += (~np.isnan(distances)).sum(axis=1)
+        sums += np.nansum(distances, axis=1)
+        for i, meters in enumerate(agreement):
+            within_counts[i] += (distances <= meters).sum(axis=1)
+        if digests is None:
+            with warnings.catch_warnings():  # pairs with nothing in common get NaN percentiles - that's expected, not noise
+                warnings.simplefilter("ignore", RuntimeWarning)
+                pair_percentiles = np.nanpercentile(distances, pcts, axis=1).reshape(len(pcts), pairs)
+        else:
+            for pair, digest in enumerate(digests):
+                digest.update(distances[pair])
+    if digests is not None:
+        pair_percentiles = np.array([list(digest.percentiles(pcts).values()) for digest in digests]).reshape(pairs, len(pcts)).T
+
+    with np.errstate(divide="ignore", invalid="ignore"):  # NaN for pairs with nothing in common
+        means = sums / counts
+        within = within_counts / counts
+
+    results = []
+    for pair, (a, b) in enumerate(zip(first, second)):
+        result = {
+            "BASE": names[a],
+            "COMPARISON": names[b],
+            "COMPARED": int(counts[pair]),
+            "BASE_ONLY": int((located[a] & ~located[b]).sum()),
+            "COMPARISON_ONLY": int((located[b] & ~located[a]).sum()),
+            "MEAN": float(means[pair]),
+        }
+        result.update({_column_name("P", p): float(pair_percentiles[i, pair]) for i, p in enumerate(pcts)})
+        result.update({_column_name("WITHIN_", meters) + "M": float(within[i, pair]) for i, meters in enumerate(agreement)})
+        results.append(result)
+    return results
+
+
+def write_results_table(results: List[Dict[str, object]], output: Union[Path, str], dataset_name: Optional[str] = None):
+    """Writes comparison results, a row per pair of geocoders, to a CSV or (for any other path) a geodatabase table"""
+    if dataset_name is not None:
+        results = [{"DATASET": dataset_name, **result} for result in results]
+    if not results:
+        return output
+    if str(output).lower().endswith(".csv"):
+        with open(output, "w", newline="") as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+        return output
+
+    text_width = max((len(value) for result in results for value in result.values() if isinstance(value, str)), default=1)
+    types = {int: "i8", float: "f8", str: f"<U{text_width}"}
+    array = np.array([tuple(result.values()) for result in results],
+                     dtype=[(name, types[type(value)]) for name, value in results[0].items()])
+    if arcpy.Exists(str(output)):
+        arcpy.management.Delete(str(output))
+    arcpy.da.NumPyArrayToTable(array, str(output))
+    return output
 
 
 class GeocodedDataset:
-    geocoder: str = None
-    text_path: Optional[Path, str] = None
-    points_path: Optional[Path, str] = None
+    """
+    :param build_id: Which build of the geocoder made the results, for reading them from a ResultStore. The most
+        recently stored one by default.
+    """
+    geocoder: dict = None
+    text_path: Optional[Union[Path, str]] = None
+    points_path: Optional[Union[Path, str]] = None
+    build_id: Optional[str] = None
 
     dataset: "AddressDataset" = None
 
-    def __init__(self, dataset: "AddressDataset", geocoder: str, text_path: Optional[Path, str], points_path) -> None:
+    def __init__(self, dataset: "AddressDataset", geocoder: dict, text_path: Optional[Union[Path, str]],
+                 points_path: Optional[Union[Path, str]] = None, build_id: Optional[str] = None) -> None:
         self.dataset = dataset
         self.geocoder = geocoder
+        self.text_path = text_path
+        self.points_path = points_path
+        self.build_id = build_id
+        dataset.geocodes[geocoder["field_name"]] = self
 
     def __str__(self) -> str:
-        return f"{self.dataset.name} geocoded by {self.geocoder}"
+        return f"{self.dataset.name} geocoded by {self.geocoder['name']}"
 
 
 class AddressDataset:
-    text_path: Optional[Path, str]  = None
-    geocodes: dict[str, GeocodedDataset] = dict()
-    comparisons: dict[str, dict] = dict()
+    text_path: Optional[Union[Path, str]] = None
+    geocodes: Dict[str, GeocodedDataset] = None
+    comparisons: Dict[int, Dict[int, dict]] = None
     name: str = None
 
-    def __init__(self, name: str, text_path: Optional[Path, str] = None) -> None:
+    def __init__(self, name: str, text_path: Optional[Union[Path, str]] = None) -> None:
         self.name = name
         self.text_path = text_path
+        self.geocodes = {}
+        self.comparisons = {}
 
-    def compare(self, base: GeocodedDataset, comparison: GeocodedDataset, id_field: str = "ID"):
+    def compare(self, base: GeocodedDataset, comparison: GeocodedDataset, id_field: str = "ID",
+                lines: Optional[Union[Path, str]] = None, pcts=DEFAULT_PERCENTILES):
         """
         Compare two geocoded datasets and report on quality metrics.
+
+        Each address is matched to the same ID in the other dataset (not to whichever comparison point happens to be
+        nearest), and the geodesic distance between the two locations goes into a NEAR_DIST_<geocoder> field on the
+        base points. Pass lines to also write a feature class of lines connecting each pair of locations there.
         """
-        # do comparison work here
-        # run near
         comparison_field = f"NEAR_DIST_{comparison.geocoder['field_name']}"
-        arcpy.analysis.Near(base.points_path, comparison.points_path, method="GEODESIC", field_names=comparison_field)
+        ids, lons, lats = read_points(base.points_path, id_field)
+        comparison_ids, comparison_lons, comparison_lats = read_points(comparison.points_path, id_field)
+        rows = join_on_id(ids, comparison_ids)
+        matched = rows >= 0
+        ids, lons, lats, rows = ids[matched], lons[matched], lats[matched], rows[matched]
+        comparison_lons, comparison_lats = comparison_lons[rows], comparison_lats[rows]
+        distances = geodesic_distance(lons, lats, comparison_lons, comparison_lats)
+
+        # write the distances back in one go, joined on the ID
+        distance_array = np.zeros(len(ids), dtype=[(id_field, ids.dtype), (comparison_field, "f8")])
+        distance_array[id_field], distance_array[comparison_field] = ids, distances
+        arcpy.da.ExtendTable(str(base.points_path), id_field, distance_array, id_field, append_only=False)
 
         # report percentiles
-        pct_results = percentiles(base.points_path, fields=(comparison_field,))
-        print(f"Percentiles for {base} vs {comparison}:")
+        pct_results = {comparison_field: _value_percentiles(distances, pcts)}
+        print(f"Percentiles for {base} vs {comparison} ({len(ids)} matching IDs):")
         print(pct_results)
 
-        # make connecting lines
-        merged_points = arcpy.management.Merge([base.points_path, comparison.points_path],
-                                               f"in_memory/merged_{base.geocoder}_{comparison.geocoder}")
-        connecting_lines = arcpy.management.PointsToLine(merged_points,
-                                                         f"in_memory/lines_{base.geocoder}_{comparison.geocoder}",
-                                                         id_field)
-
-        # insert into map
-        #aprx = arcpy.mp.ArcGISProject("CURRENT")
-        #map_obj = aprx.activeMap
-        #map_obj.addDataFromPath(connecting_lines)
-
-        self.comparisons[base.geocoder["id"]] = {
-            comparison.geocoder["id"]: {
-                "points": base.points_path,
-                "near_field": comparison_field,
-                "comparison_points": comparison.points_path,
-                "lines": connecting_lines,
-                "percentiles": pct_results,
-            }
+        connecting_lines = None
+        if lines:
+            connecting_lines = write_lines(lines, ids, id_field, lons, lats, comparison_lons, comparison_lats,
+                                           comparison_field, distances)
+
+        result = {
+            "points": base.points_path,
+            "near_field": comparison_field,
+            "comparison_points": comparison.points_path,
+            "lines": connecting_lines,
+            "matched": len(ids),
+            "unmatched": int((~matched).sum()),
+            "percentiles": pct_results,
         }
+        self.comparisons.setdefault(base.geocoder["id"], {})[comparison.geocoder["id"]] = result
         # make it work to reference it from the perspective of either geocoder when we want to look it up later
-        self.comparisons[comparison.geocoder["id"]][base.geocoder["id"]] = self.comparisons[base.geocoder["id"]][comparison.geocoder["id"]]
\ No newline at end of file
+        self.comparisons.setdefault(comparison.geocoder["id"], {})[base.geocoder["id"]] = result
+        return result
+
+    def compare_all(self, geocodes: Optional[Iterable[GeocodedDataset]] = None, id_field: str = "ID",
+                    output: Optional[Union[Path, str]] = None, pcts=DEFAULT_PERCENTILES, agreement=AGREEMENT_METERS,
+                    store: Optional[ResultStore] = None):
+        """
+        Compare every pair of geocodes of this dataset (all of them by default) in one pass - each one's points are
+        read once, and distances, percentiles and agreement for all the pairs are computed together. Writes a row per
+        pair to output (a CSV or geodatabase table) if given, and returns the rows.
+
+        With a store, results are read from it (this dataset's name, each geocoder's field_name and build_id) rather
+        than from points feature classes.
+        """
+        geocodes = list(self.geocodes.values() if geocodes is None else geocodes)
+        ids, lons, lats = align_points(geocodes, id_field, store)
+        names = [geocode.geocoder["field_name"] for geocode in geocodes]
+        results = comparison_matrix(names, lons, lats, pcts, agreement)
+        print(f"Compared {len(results)} pairs of geocoders over {len(ids)} addresses in {self.name}")
+
+        for (base, comparison), result in zip(itertools.combinations(geocodes, 2), results):
+            self.comparisons.setdefault(base.geocoder["id"], {})[comparison.geocoder["id"]] = result
+            self.comparisons.setdefault(comparison.geocoder["id"], {})[base.geocoder["id"]] = result
+        if output:
+            write_results_table(results, output, self.name)
+        return results
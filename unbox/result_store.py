@@ -0,0 +1,219 @@
+"""
+A store of geocoding results for quality assessment runs, in one SQLite file.
+
+Results from our locators and from the outside geocoders we compare against otherwise end up in loose CSVs and JSON
+dumps that each comparison has to import again. Here every result is a row keyed by (dataset, geocoder, build ID,
+address ID), with its coordinates (WGS84), score, match type, status and a hash of the input address text it came
+from. The build ID says which version of a geocoder made the result - for our locators, a hash of the .loc file's
+version (locator_build_id), and for an outside API, whatever label you give the run.
+
+That makes runs incremental. geocode_incremental only sends the addresses that have no result for this build yet,
+whose input text has changed since they were geocoded, or that failed with an error last time, so rerunning a QA
+corpus after editing a few rows geocodes a few rows, and a new locator build geocodes everything once. Comparisons
+read straight from the store - see quality_assessment.AddressDataset.compare_all.
+
+    python -m unbox.result_store --store qa.sqlite --dataset qa_sample --geocoder CDT --input qa_sample.csv --locator statewide.loc
+    python -m unbox.result_store --store qa.sqlite --dataset qa_sample --geocoder Bing --build_id 2026-10 --import_results bing_geocodes.csv
+"""
+
+from __future__ import annotations
+
+import contextlib
+import csv
+import hashlib
+import itertools
+import sqlite3
+import time
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .bulk_geocode import DEFAULT_CHUNK_SIZE, _input_row, geocode_rows
+from .geocode_cache import locator_version
+from .locator_pool import LocatorPool
+
+COLUMNS = ["address_id", "input_hash", "x", "y", "score", "match_type", "status"]
+NUMERIC_COLUMNS = ("x", "y", "score")
+# results written per transaction
+WRITE_BATCH_SIZE = 10000
+
+
+def input_hash(address: str) -> str:
+    """Hash of the address text a result came from - a changed address means a stale result"""
+    return hashlib.blake2b(address.strip().encode("utf-8"), digest_size=12).hexdigest()
+
+
+def locator_build_id(locator_path: str) -> str:
+    """Build ID for one of our locators - changes whenever the .loc file is rebuilt or replaced"""
+    return hashlib.blake2b(locator_version(locator_path).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _float(value) -> Optional[float]:
+    return float(value) if value not in (None, "") else None
+
+
+class ResultStore(object):
+    """
+    Geocoding results in a SQLite file.
+
+    :param path: The file - created if it doesn't exist. ":memory:" for a throwaway store.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS results (dataset TEXT, geocoder TEXT, build_id TEXT, address_id TEXT,"
+            " input_hash TEXT, x REAL, y REAL, score REAL, match_type TEXT, status TEXT, stored REAL,"
+            " PRIMARY KEY (dataset, geocoder, build_id, address_id))"
+        )
+
+    def hashes(self, dataset: str, geocoder: str, build_id: str) -> Dict[str, str]:
+        """
+        {address ID: input hash} of every result stored for this build, leaving out errors (status "E") - the geocoder
+        failed rather than not finding the address, so those are worth another try
+        """
+        return dict(self._connection.execute(
+            "SELECT address_id, input_hash FROM results WHERE dataset = ? AND geocoder = ? AND build_id = ?"
+            " AND status IS NOT 'E'", (dataset, geocoder, build_id)))
+
+    def pending(self, dataset: str, geocoder: str, build_id: str, rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """The {"id", "address"} rows with no result for this build, a result for different input text, or an error"""
+        stored = self.hashes(dataset, geocoder, build_id)
+        for row in rows:
+            if stored.get(row["id"]) != input_hash(row["address"]):
+                yield row
+
+    def put(self, dataset: str, geocoder: str, build_id: str, results: Iterable[Dict[str, Any]]) -> int:
+        """
+        Stores results, replacing any for the same address and build. Each is a bulk geocoding output row (id,
+        address, status, score, addr_type, x, y) - or anything with those keys. Returns how many were stored.
+        """
+        count = 0
+        results = iter(results)
+        while True:
+            batch = [(dataset, geocoder, build_id, str(result["id"]), input_hash(result.get("address") or ""),
+                      _float(result.get("x")), _float(result.get("y")), _float(result.get("score")),
+                      result.get("addr_type") or None, result.get("status") or None, time.time())
+                     for result in itertools.islice(results, WRITE_BATCH_SIZE)]
+            if not batch:
+                return count
+            with self._transaction():
+                self._connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            count += len(batch)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self._connection.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def builds(self, dataset: str, geocoder: str) -> List[str]:
+        """Build IDs with results for this dataset and geocoder, most recently stored last"""
+        return [row[0] for row in self._connection.execute(
+            "SELECT build_id FROM results WHERE dataset = ? AND geocoder = ? GROUP BY build_id ORDER BY MAX(stored)",
+            (dataset, geocoder))]
+
+    def read(self, dataset: str, geocoder: str, build_id: Optional[str] = None, matched_only: bool = False) -> Dict[str, np.ndarray]:
+        """
+        A build's results as numpy arrays (address_id, input_hash, x, y, score, match_type, status), ordered by address
+        ID. Defaults to the build stored most recently. Missing coordinates and scores are NaN.
+        """
+        if build_id is None:
+            builds = self.builds(dataset, geocoder)
+            if not builds:
+                return {name: np.zeros(0, dtype=np.float64 if name in NUMERIC_COLUMNS else object) for name in COLUMNS}
+            build_id = builds[-1]
+        query = f"SELECT {', '.join(COLUMNS)} FROM results WHERE dataset = ? AND geocoder = ? AND build_id = ?"
+        if matched_only:
+            query += " AND x IS NOT NULL AND y IS NOT NULL"
+        rows = self._connection.execute(query + " ORDER BY address_id", (dataset, geocoder, build_id)).fetchall()
+        columns = {name: list(values) for name, values in zip(COLUMNS, zip(*rows))} if rows else {name: [] for name in COLUMNS}
+        return {name: np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+                if name in NUMERIC_COLUMNS else np.array(values, dtype=object) for name, values in columns.items()}
+
+    def close(self):
+        self._connection.close()
+
+
+def geocode_incremental(store: ResultStore, dataset: str, geocoder: str, build_id: str, rows: Iterable[Dict[str, Any]],
+                        pool: LocatorPool, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Geocodes the {"id", "address"} rows that need it (see ResultStore.pending) across a LocatorPool and stores the
+    results as they come back. Returns how many rows there were and how many were geocoded.
+    """
+    rows = list(rows)
+    geocoded = store.put(dataset, geocoder, build_id, geocode_rows(store.pending(dataset, geocoder, build_id, rows), pool, chunk_size))
+    return {"rows": len(rows), "geocoded": geocoded, "skipped": len(rows) - geocoded}
+
+
+def read_input(path: str) -> List[Dict[str, Any]]:
+    """{"id", "address"} rows from a CSV with an address column or the standard input schema"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as input_file:
+        return [_input_row(record, row_number) for row_number, record in enumerate(csv.DictReader(input_file), start=1)]
+
+
+def import_results(store: ResultStore, dataset: str, geocoder: str, build_id: str, path: str) -> int:
+    """
+    Loads a CSV of results from earlier runs - bulk geocoding output, or the outside geocoder scripts' output (the
+    standard input columns plus X, Y and, for Bing, entityType). Rows with coordinates count as matched.
+    """
+    def results():
+        with open(path, "r", encoding="utf-8-sig", newline="") as results_file:
+            for row_number, record in enumerate(csv.DictReader(results_file), start=1):
+                fields = {key.lower(): value for key, value in record.items() if key}
+                located = fields.get("x") not in (None, "") and fields.get("y") not in (None, "")
+                yield {
+                    **_input_row(record, row_number),
+                    "x": fields.get("x"),
+                    "y": fields.get("y"),
+                    "score": fields.get("score"),
+                    "addr_type": fields.get("addr_type") or fields.get("entitytype"),
+                    "status": fields.get("status") or ("M" if located else "U"),
+                }
+
+    return store.put(dataset, geocoder, build_id, results())
+
+
+if __name__ == "__main__":
+    import json
+
+    import click
+
+    @click.command()
+    @click.option("--store", "store_path", required=True, help="SQLite file holding the results")
+    @click.option("--dataset", required=True, help="Name of the address dataset, e.g. qa_sample")
+    @click.option("--geocoder", required=True, help="Geocoder name - the field_name of one in quality_assessment, e.g. CDT or Bing")
+    @click.option("--input", "input_path", default=None, help="CSV of addresses to geocode (address column or the standard input schema)")
+    @click.option("--locator", "locator_path", default=None, help="Geocode --input against this .loc, skipping rows already in the store")
+    @click.option("--build_id", default=None, help="Build of the geocoder. Defaults to one derived from --locator.")
+    @click.option("--import_results", "results_path", default=None, help="Instead of geocoding, load this CSV of earlier results")
+    @click.option("--workers", default=None, type=int, help="Worker processes for --locator")
+    def main(store_path, dataset, geocoder, input_path, locator_path, build_id, results_path, workers):
+        store = ResultStore(store_path)
+        try:
+            if results_path:
+                if not build_id:
+                    raise click.UsageError("Pass --build_id with --import_results")
+                print(f"Imported {import_results(store, dataset, geocoder, build_id, results_path)} results")
+                return
+            if not (input_path and locator_path):
+                raise click.UsageError("Pass --input and --locator, or --import_results")
+            pool = LocatorPool(locator_path, workers=workers)
+            start = time.perf_counter()
+            try:
+                counts = geocode_incremental(store, dataset, geocoder, build_id or locator_build_id(locator_path), read_input(input_path), pool)
+            finally:
+                pool.close()
+            counts["seconds"] = round(time.perf_counter() - start, 1)
+            print(json.dumps(counts, indent=2))
+        finally:
+            store.close()
+
+    main()
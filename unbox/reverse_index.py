@@ -0,0 +1,280 @@
+"""
+Nearest-address index - a reverse geocoding fast path in front of the locator.
+
+The index is a KD-tree over the prepared address points, projected to California Albers (see projection.py) so
+distances are in meters. The tree is stored implicitly as flat numpy arrays, which makes it memory-mappable like the
+exact-match address index. Points are reordered so each leaf is a contiguous run. The tree is balanced and complete,
+so node i's children are 2i + 1 and 2i + 2, and we only need each node's split value and bounding box.
+
+Queries are vectorized across a whole batch of points:
+
+1. every point descends to its own leaf at once, one tree level per numpy step, and takes the nearest point there as
+   its first guess
+2. a level-by-level pass then finds every other leaf whose bounding box is closer than that guess. There are usually
+   only a few, since the first guess is rarely more than a leaf's width off
+3. the points in those leaves are checked too
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import shutil
+import threading
+import time
+
+from array import array
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .address_index import _label, _street
+from .projection import to_california_albers
+
+INDEX_FIELDS = ["house_number", "address", "unit", "city", "ZIP5", "address_lid", "SHAPE@XY"]
+ARRAYS = ("px", "py", "lon", "lat", "lid", "label_offsets", "split", "box_min_x", "box_min_y", "box_max_x", "box_max_y")
+DEFAULT_LEAF_SIZE = 32
+QUERY_CHUNK_SIZE = 65536  # bounds the temporary (points x leaf size) arrays in a query
+
+
+def _tree_depth(count: int, leaf_size: int) -> int:
+    return max(0, math.ceil(math.log2(count / leaf_size))) if count > leaf_size else 0
+
+
+def _starts(count: int, level: int) -> np.ndarray:
+    """Where each node at a level starts in the reordered points - plus the end, so node k is [starts[k], starts[k + 1])"""
+    nodes = 1 << level
+    return (np.arange(nodes + 1, dtype=np.int64) * count) // nodes
+
+
+def build_tree(px: np.ndarray, py: np.ndarray, leaf_size: int = DEFAULT_LEAF_SIZE) -> Dict[str, np.ndarray]:
+    """
+    Builds the implicit KD-tree over projected coordinates. Returns the order to put the points in, each node's split
+    value and each node's bounding box. Splits alternate between x (even levels) and y (odd levels).
+
+    Each level is a single lexsort of every point by (node, coordinate) rather than a loop over nodes.
+    """
+    count = len(px)
+    depth = _tree_depth(count, leaf_size)
+    order = np.arange(count, dtype=np.int64)
+    split = np.zeros(max(0, (1 << depth) - 1), dtype=np.float64)
+    positions = np.arange(count, dtype=np.int64)
+    for level in range(depth):
+        coordinate = px if level % 2 == 0 else py
+        node = np.searchsorted(_starts(count, level), positions, side="right") - 1
+        order = order[np.lexsort((coordinate[order], node))]
+        # the split is the first coordinate of the right child
+        right_starts = _starts(count, level + 1)[1:-1:2]
+        split[(1 << level) - 1:(1 << (level + 1)) - 1] = coordinate[order[right_starts]]
+
+    # leaf boxes from the reordered points, then every parent's box from its children's
+    leaves = _starts(count, depth)[:-1]
+    sorted_x, sorted_y = px[order], py[order]
+    node_count = (1 << (depth + 1)) - 1
+    boxes = {name: np.zeros(node_count, dtype=np.float64) for name in ("box_min_x", "box_min_y", "box_max_x", "box_max_y")}
+    first_leaf = (1 << depth) - 1
+    if count:
+        boxes["box_min_x"][first_leaf:] = np.minimum.reduceat(sorted_x, leaves)
+        boxes["box_min_y"][first_leaf:] = np.minimum.reduceat(sorted_y, leaves)
+        boxes["box_max_x"][first_leaf:] = np.maximum.reduceat(sorted_x, leaves)
+        boxes["box_max_y"][first_leaf:] = np.maximum.reduceat(sorted_y, leaves)
+    for level in range(depth - 1, -1, -1):
+        parents = np.arange((1 << level) - 1, (1 << (level + 1)) - 1)
+        for name, combine in (("box_min_x", np.minimum), ("box_min_y", np.minimum), ("box_max_x", np.maximum), ("box_max_y", np.maximum)):
+            boxes[name][parents] = combine(boxes[name][2 * parents + 1], boxes[name][2 * parents + 2])
+    return {"order": order, "split": split, **boxes}
+
+
+def build_reverse_index(address_points: str, index_folder: str, leaf_size: int = DEFAULT_LEAF_SIZE) -> Dict[str, Any]:
+    """
+    Builds the index from a prepared address points table (see build_locator.prepare_address_data) into
+    index_folder, writing to a temporary folder first and swapping it in like build_address_index does.
+    """
+    import arcpy  # imported here so serving from an existing index doesn't need arcpy
+
+    start = time.perf_counter()
+    lons, lats, lids = array("d"), array("d"), array("q")
+    label_list: List[bytes] = []
+    with arcpy.da.SearchCursor(address_points, INDEX_FIELDS, spatial_reference=arcpy.SpatialReference(4326)) as cursor:
+        for house_number, address, unit, city, zip5, lid, (x, y) in cursor:
+            if x is None or y is None:
+                continue
+            lons.append(x)
+            lats.append(y)
+            lids.append(int(lid) if lid is not None else -1)
+            label_list.append(_label(_street(house_number, address), unit, city, zip5).encode("utf-8"))
+
+    meta = write_reverse_index(index_folder, np.frombuffer(lons, dtype=np.float64), np.frombuffer(lats, dtype=np.float64),
+                               np.frombuffer(lids, dtype=np.int64), label_list, leaf_size=leaf_size, source=address_points)
+    meta["seconds"] = round(time.perf_counter() - start, 1)
+    with open(os.path.join(index_folder, "meta.json"), "w") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    print(f"Built reverse index over {meta['points']} points in {meta['seconds']} seconds")
+    return meta
+
+
+def write_reverse_index(index_folder: str, lons: np.ndarray, lats: np.ndarray, lids: np.ndarray, labels: List[bytes],
+                        leaf_size: int = DEFAULT_LEAF_SIZE, source: Optional[str] = None) -> Dict[str, Any]:
+    """Builds the tree over the given points and saves it. Split out of build_reverse_index so it runs without arcpy."""
+    px, py = to_california_albers(lons, lats)
+    tree = build_tree(px, py, leaf_size)
+    order = tree.pop("order")
+
+    label_lengths = np.fromiter((len(labels[row]) for row in order), dtype=np.int64, count=len(order))
+    arrays = {
+        "px": px[order],
+        "py": py[order],
+        "lon": lons[order],
+        "lat": lats[order],
+        "lid": lids[order],
+        "label_offsets": np.r_[0, np.cumsum(label_lengths)].astype(np.int64),
+        **tree,
+    }
+    temp_folder = f"{index_folder}_building"
+    shutil.rmtree(temp_folder, ignore_errors=True)
+    os.makedirs(temp_folder)
+    for name, values in arrays.items():
+        np.save(os.path.join(temp_folder, f"{name}.npy"), values)
+    with open(os.path.join(temp_folder, "labels.bin"), "wb") as labels_file:
+        labels_file.write(b"".join(labels[row] for row in order))
+    meta = {"source": source, "built": time.time(), "points": len(order), "leaf_size": leaf_size, "depth": _tree_depth(len(order), leaf_size)}
+    with open(os.path.join(temp_folder, "meta.json"), "w") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+
+    if os.path.exists(index_folder):
+        old_folder = f"{index_folder}_old_{int(time.time())}"
+        os.replace(index_folder, old_folder)
+        shutil.rmtree(old_folder, ignore_errors=True)  # Windows won't delete files that are mapped - leave them
+    os.replace(temp_folder, index_folder)
+    return meta
+
+
+class ReverseIndex(object):
+    """An index built by build_reverse_index, opened memory-mapped"""
+
+    def __init__(self, index_folder: str):
+        self.index_folder = index_folder
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(index_folder, f"{name}.npy"), mmap_mode="r"))
+        labels_path = os.path.join(index_folder, "labels.bin")
+        self.labels = np.memmap(labels_path, dtype=np.uint8, mode="r") if os.path.getsize(labels_path) else np.zeros(0, np.uint8)
+        with open(os.path.join(index_folder, "meta.json")) as meta_file:
+            self.meta = json.load(meta_file)
+        self.count = len(self.px)
+        self.depth = _tree_depth(self.count, self.meta["leaf_size"])
+        self.leaf_starts = _starts(self.count, self.depth)
+        self.max_leaf = int(np.diff(self.leaf_starts).max()) if self.count else 0
+        self._lock = threading.Lock()
+        self.queries = self.within = 0
+
+    def _leaf_nearest(self, qx: np.ndarray, qy: np.ndarray, leaves: np.ndarray):
+        """Squared distance to, and row of, the nearest point in each query's given leaf"""
+        starts, ends = self.leaf_starts[leaves], self.leaf_starts[leaves + 1]
+        rows = starts[:, None] + np.arange(self.max_leaf)[None, :]
+        valid = rows < ends[:, None]
+        rows = np.where(valid, rows, starts[:, None])
+        d2 = (self.px[rows] - qx[:, None]) ** 2 + (self.py[rows] - qy[:, None]) ** 2
+        d2[~valid] = np.inf
+        best = np.argmin(d2, axis=1)
+        picked = np.arange(len(leaves))
+        return d2[picked, best], rows[picked, best]
+
+    def _query_projected(self, qx: np.ndarray, qy: np.ndarray):
+        first_leaf = (1 << self.depth) - 1
+        # 1. descend to each point's own leaf
+        node = np.zeros(len(qx), dtype=np.int64)
+        for level in range(self.depth):
+            coordinate = qx if level % 2 == 0 else qy
+            node = 2 * node + 1 + (coordinate >= self.split[node])
+        home = node - first_leaf
+        best_d2, best_row = self._leaf_nearest(qx, qy, home)
+
+        # 2. every other leaf whose box is closer than the first guess
+        query = np.arange(len(qx))
+        node = np.zeros(len(qx), dtype=np.int64)
+        for _ in range(self.depth):
+            query, node = np.repeat(query, 2), np.stack([2 * node + 1, 2 * node + 2], axis=1).ravel()
+            dx = np.maximum(0, np.maximum(self.box_min_x[node] - qx[query], qx[query] - self.box_max_x[node]))
+            dy = np.maximum(0, np.maximum(self.box_min_y[node] - qy[query], qy[query] - self.box_max_y[node]))
+            keep = dx * dx + dy * dy < best_d2[query]
+            query, node = query[keep], node[keep]
+        leaf = node - first_leaf
+        others = leaf != home[query]
+        query, leaf = query[others], leaf[others]
+
+        # 3. check their points, keeping the closest per query
+        if len(query):
+            d2, rows = self._leaf_nearest(qx[query], qy[query], leaf)
+            improved = d2 < best_d2[query]
+            query, d2, rows = query[improved], d2[improved], rows[improved]
+            order = np.lexsort((d2, query))
+            query, d2, rows = query[order], d2[order], rows[order]
+            first = np.r_[True, query[1:] != query[:-1]] if len(query) else np.zeros(0, dtype=bool)
+            best_d2[query[first]], best_row[query[first]] = d2[first], rows[first]
+        return np.sqrt(best_d2), best_row
+
+    def query(self, lons, lats) -> Dict[str, np.ndarray]:
+        """
+        Nearest address point to each of a batch of WGS84 points. Returns arrays of distances in meters, rows (for
+        label()), address_lid and the address point's coordinates.
+        """
+        lons, lats = np.atleast_1d(np.asarray(lons, dtype=np.float64)), np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        if not self.count:
+            raise ValueError(f"The reverse index at {self.index_folder} has no points")
+        qx, qy = to_california_albers(lons, lats)
+        distances, rows = np.empty(len(qx)), np.empty(len(qx), dtype=np.int64)
+        for start in range(0, len(qx), QUERY_CHUNK_SIZE):
+            chunk = slice(start, start + QUERY_CHUNK_SIZE)
+            distances[chunk], rows[chunk] = self._query_projected(qx[chunk], qy[chunk])
+        return {"distance": distances, "row": rows, "lid": self.lid[rows], "lon": self.lon[rows], "lat": self.lat[rows]}
+
+    def label(self, row: int) -> str:
+        return bytes(self.labels[self.label_offsets[row]:self.label_offsets[row + 1]]).decode("utf-8")
+
+    def results(self, lons, lats, max_distance: Optional[float] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Reverse geocode results shaped like the locator's for each point, or None where the nearest address point is
+        more than max_distance meters away (so the caller can fall back to the locator)
+        """
+        nearest = self.query(lons, lats)
+        results = []
+        for distance, row, lid, x, y in zip(nearest["distance"], nearest["row"], nearest["lid"], nearest["lon"], nearest["lat"]):
+            if max_distance is not None and distance > max_distance:
+                results.append(None)
+                continue
+            label = self.label(int(row))
+            results.append({
+                "Match_addr": label,
+                "LongLabel": label,
+                "Addr_type": "PointAddress",
+                "X": float(x),
+                "Y": float(y),
+                "Distance": round(float(distance), 2),
+                "address_lid": int(lid),
+            })
+        with self._lock:
+            self.queries += len(results)
+            self.within += sum(result is not None for result in results)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "index_folder": self.index_folder,
+                "points": self.count,
+                "depth": self.depth,
+                "built": self.meta.get("built"),
+                "queries": self.queries,
+                "within_distance": self.within,
+                "within_rate": round(self.within / self.queries, 4) if self.queries else None,
+            }
+
+
+def open_or_build(index_folder: str, address_points: Optional[str] = None) -> ReverseIndex:
+    """Opens the index, building it first if it doesn't exist yet and we know where the address points are"""
+    if not os.path.exists(os.path.join(index_folder, "meta.json")):
+        if not address_points:
+            raise FileNotFoundError(f"No reverse index at {index_folder} and no address points table to build one from")
+        build_reverse_index(address_points, index_folder)
+    return ReverseIndex(index_folder)
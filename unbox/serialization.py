@@ -0,0 +1,40 @@
+"""
+Response serialization for the dev shim - field projection and a fast JSON path.
+
+Locator results carry about 60 attributes and most clients use five of them. project() trims results down to the
+requested fields (and always drops Shape) without mutating the results, which may be shared with the cache.
+dumps() uses orjson when it's installed and falls back to a compact json.dumps otherwise. Neither needs the results
+walked first - the locator's result dicts only hold strings and numbers.
+"""
+
+import json
+
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import orjson
+except ImportError:  # optional - `python -m pip install orjson` for faster responses
+    orjson = None
+
+
+def parse_out_fields(out_fields: Optional[str]) -> Optional[List[str]]:
+    """Comma separated outFields, as in Esri's REST APIs. None or "*" means every field."""
+    if not out_fields:
+        return None
+    fields = [field.strip() for field in out_fields.split(",") if field.strip()]
+    return None if not fields or "*" in fields else fields
+
+
+def project(results: Iterable[Dict[str, Any]], out_fields: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """New result dicts with only out_fields (matched case-insensitively), or every field but Shape"""
+    if out_fields is None:
+        return [{key: value for key, value in result.items() if key != "Shape"} for result in results]
+    wanted = {field.lower() for field in out_fields}
+    wanted.discard("shape")
+    return [{key: value for key, value in result.items() if key.lower() in wanted} for result in results]
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
@@ -0,0 +1,174 @@
+"""
+Request metrics for the dev shim, in the Prometheus text exposition format.
+
+Each request's time is split into phases - waiting in the admission queue, inside the locator, and serializing the
+response - plus the total. Handlers record phases with timed() or record(); the middleware collects them into
+per-endpoint histograms, counts requests by status, and sends them back to the client in a Server-Timing header.
+
+This writes the text format directly rather than depending on prometheus_client, since it's only a handful of series.
+Every worker process keeps its own numbers, so with several workers each scrape sees whichever worker answered - the
+pid label tells them apart.
+"""
+
+import math
+import os
+import threading
+import time
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# seconds - from cache hits up to slow reverse geocodes on a busy host
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ("queue", "locator", "enrich", "serialize")
+
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("unbox_request_timings", default=None)
+
+
+def record(phase: str, seconds: float):
+    """Adds time to a phase of the current request. Does nothing outside of a request."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram(object):
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        with self._lock:
+            series = self._series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bound_label = 'le="' + _number(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, bound_label)} {cumulative}")
+                infinity_label = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, infinity_label)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Counter(object):
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+def snapshot(name: str, help_text: str, samples: Iterable[Tuple[Dict[str, str], float]], metric_type: str = "gauge") -> List[str]:
+    """Renders values read at scrape time, like cache stats, that are kept somewhere else"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        if value is None:
+            continue
+        lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return lines
+
+
+class ShimMetrics(object):
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.request_seconds = Histogram(
+            "unbox_request_duration_seconds",
+            "Request time by endpoint and phase (queue, locator, enrich, serialize, total)",
+            ("endpoint", "phase"),
+            buckets,
+        )
+        self.requests = Counter("unbox_requests_total", "Requests by endpoint and HTTP status", ("endpoint", "status"))
+
+    def observe_request(self, endpoint: str, status: int, timings: Dict[str, float]):
+        self.requests.inc((endpoint, str(status)))
+        for phase, seconds in timings.items():
+            self.request_seconds.observe((endpoint, phase), seconds)
+
+    def render(self, extra_lines: Iterable[str] = ()) -> str:
+        lines = self.request_seconds.render() + self.requests.render()
+        lines.extend(snapshot("unbox_worker_info", "Worker process serving this scrape", [({"pid": str(os.getpid())}, 1)]))
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+    def middleware(self):
+        """
+        HTTP middleware for the FastAPI app. It times each request, records the phases the handler reported, and adds
+        a Server-Timing header.
+        """
+        async def collect_metrics(request, call_next):
+            timings: Dict[str, float] = {}
+            token = _request_timings.set(timings)
+            start = time.perf_counter()
+            status = 500
+            try:
+                response = await call_next(request)
+                status = response.status_code
+            finally:
+                timings["total"] = time.perf_counter() - start
+                _request_timings.reset(token)
+                route = request.scope.get("route")
+                self.observe_request(getattr(route, "path", "other"), status, timings)
+            response.headers["Server-Timing"] = server_timing(timings)
+            return response
+
+        return collect_metrics
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    ordered = [phase for phase in PHASES + ("total",) if phase in timings]
+    return ", ".join(f"{phase};dur={timings[phase] * 1000:.2f}" for phase in ordered)
@@ -0,0 +1,121 @@
+"""
+Spatially clustered ordering of feature classes along a Hilbert or Z-order (Morton) curve.
+
+LightBox features land in the merged GDB in county-append order and arbitrary order within each county, so reading
+everything in a small area touches pages all over the file. Rewriting the features in curve order of their centroids
+puts neighbors next to each other on disk, which helps bounding box queries and the reads CreateLocator makes.
+
+The work is split so it never needs the whole table in memory: the curve key is computed one row at a time with an
+UpdateCursor, then arcpy's Sort tool (which sorts on disk) writes the rows out in key order.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+
+import arcpy
+
+CURVES = ("hilbert", "zorder")
+SORT_KEY_FIELD = "SPATIAL_SORT_KEY"
+
+# 2^16 cells per side - about 15 m cells statewide in California, which is finer than we need for clustering. Keys
+# go up to 2^32, so they're stored in a double (exact to 2^53) rather than a 32 bit integer field.
+DEFAULT_ORDER = 16
+
+
+def hilbert_index(x: int, y: int, order: int = DEFAULT_ORDER) -> int:
+    """Distance along the Hilbert curve of the grid cell (x, y) on a 2^order by 2^order grid"""
+    n = 1 << order
+    d = 0
+    s = n >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        if ry == 0:  # rotate the quadrant so the curve stays continuous
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+
+def zorder_index(x: int, y: int, order: int = DEFAULT_ORDER) -> int:
+    """Morton code of the grid cell (x, y) - bits of x and y interleaved"""
+    d = 0
+    for bit in range(order):
+        d |= ((x >> bit) & 1) << (2 * bit)
+        d |= ((y >> bit) & 1) << (2 * bit + 1)
+    return d
+
+
+def curve_key(x: float, y: float, extent, curve: str = "hilbert", order: int = DEFAULT_ORDER) -> int:
+    """
+    Maps a coordinate to its position along the curve. extent is (xmin, ymin, xmax, ymax) of the whole dataset -
+    it's divided into 2^order cells per side.
+    """
+    xmin, ymin, xmax, ymax = extent
+    cells = (1 << order) - 1
+    cell_x = min(cells, max(0, int((x - xmin) / ((xmax - xmin) or 1) * cells)))
+    cell_y = min(cells, max(0, int((y - ymin) / ((ymax - ymin) or 1) * cells)))
+    if curve == "hilbert":
+        return hilbert_index(cell_x, cell_y, order)
+    elif curve == "zorder":
+        return zorder_index(cell_x, cell_y, order)
+    raise ValueError(f"Unknown curve {curve!r} - use one of {', '.join(CURVES)}")
+
+
+def add_sort_key(features, curve: str = "hilbert", order: int = DEFAULT_ORDER, field=SORT_KEY_FIELD) -> str:
+    """Adds and fills a field with each feature's centroid position along the curve"""
+    desc_extent = arcpy.Describe(features).extent
+    extent = (desc_extent.XMin, desc_extent.YMin, desc_extent.XMax, desc_extent.YMax)
+
+    if not arcpy.ListFields(features, field):
+        arcpy.management.AddField(features, field, field_type="DOUBLE", field_is_nullable=True)
+
+    with arcpy.da.UpdateCursor(features, ["SHAPE@TRUECENTROID", field]) as cursor:
+        for row in cursor:
+            centroid = row[0]
+            if centroid is None or centroid[0] is None:
+                row[1] = None  # null geometries sort to one end
+            else:
+                row[1] = curve_key(centroid[0], centroid[1], extent, curve, order)
+            cursor.updateRow(row)
+    return field
+
+
+def spatially_ordered_copy(in_features, out_features, curve: str = "hilbert", order: int = DEFAULT_ORDER, delete_input=False) -> str:
+    """
+    Writes in_features to out_features in curve order. in_features gets the sort key field added, so it should
+    be a copy we own (like the temp copies the locator preparation makes) - pass delete_input=True to remove it after.
+    """
+    logging.info(f"Ordering {in_features} along a {curve} curve")
+    add_sort_key(in_features, curve, order)
+    arcpy.management.Sort(in_features, out_features, [[SORT_KEY_FIELD, "ASCENDING"]])
+    arcpy.management.DeleteField(out_features, SORT_KEY_FIELD)
+    if delete_input:
+        arcpy.management.Delete(in_features)
+    return out_features
+
+
+def reorder_in_place(table, curve: str = "hilbert", order: int = DEFAULT_ORDER) -> str:
+    """
+    Rewrites an existing feature class in curve order while keeping the dataset itself (and any relationship classes,
+    views and attribute indexes that reference it). Rows are sorted into a scratch copy, the original is truncated and
+    the sorted rows are appended back. ObjectIDs change, but our relationship classes use the LID fields, not ObjectIDs.
+
+    The spatial index should be rebuilt afterward (GDBMerge.recreate_spatial_indexes).
+    """
+    workspace = os.path.dirname(table)
+    sorted_copy = os.path.join(workspace, f"{os.path.basename(table)}_spatially_sorted")
+
+    logging.info(f"Reordering {table} along a {curve} curve")
+    add_sort_key(table, curve, order)
+    arcpy.management.Sort(table, sorted_copy, [[SORT_KEY_FIELD, "ASCENDING"]])
+    arcpy.management.TruncateTable(table)
+    arcpy.management.Append(sorted_copy, table, schema_type="NO_TEST")
+    arcpy.management.Delete(sorted_copy)
+    arcpy.management.DeleteField(table, SORT_KEY_FIELD)
+    return table
@@ -0,0 +1,219 @@
+"""
+Small dependency-graph runner used to schedule the preparation steps of a locator build.
+
+Each stage is a top-level function plus keyword arguments. Stages whose dependencies have finished are submitted to
+a pool of worker processes right away, so independent steps (downloading remote layers, preparing parcels,
+preparing address points) overlap and the final step starts as soon as everything it needs is ready. Every stage
+is timed so we can report which chain of steps bounds the total build time (the critical path).
+
+Stage functions and their arguments need to be picklable since they run in other processes - that means
+module-level functions and plain values (paths, flags), not arcpy objects.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import signal
+import sys
+import time
+import multiprocessing
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[..., Any]
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    depends_on: Sequence[str] = ()
+
+    # Optional hook that runs in the parent process once dependencies finish. It receives a dict of
+    # {stage_name: return value} for the completed stages and returns extra kwargs for this stage - this is how
+    # outputs of one stage (like the path of a prepared table) get passed into the next.
+    resolve: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+
+
+@dataclass
+class StageResult:
+    name: str
+    value: Any
+    started: float  # seconds since the graph started running
+    finished: float
+    pid: int = None
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+
+def _timed_call(func: Callable[..., Any], kwargs: Dict[str, Any]) -> Tuple[Any, float, float, int]:
+    """Runs in the worker - wall clock times so they're comparable across processes."""
+    start = time.time()
+    value = func(**kwargs)
+    return value, start, time.time(), os.getpid()
+
+
+def _topological_order(stages: Sequence[Stage]) -> List[Stage]:
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("Stage names must be unique")
+    for stage in stages:
+        missing = [dep for dep in stage.depends_on if dep not in by_name]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stage(s): {', '.join(missing)}")
+
+    ordered = []
+    done = set()
+    visiting = set()
+
+    def visit(stage):
+        if stage.name in done:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"Stage graph has a cycle involving {stage.name}")
+        visiting.add(stage.name)
+        for dep in stage.depends_on:
+            visit(by_name[dep])
+        visiting.discard(stage.name)
+        done.add(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+
+def process_pool(max_workers: Optional[int] = None, initializer: Optional[Callable[..., None]] = None, initargs: Tuple = ()) -> ProcessPoolExecutor:
+    """
+    Creates a process pool that also works when we're running inside ArcGIS Pro's Python window, where
+    sys.executable is ArcGISPro.exe rather than a Python interpreter.
+    """
+    if sys.executable.lower().endswith("arcgispro.exe"):
+        multiprocessing.set_executable(os.path.join(sys.exec_prefix, "pythonw.exe"))
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+
+
+def run_stage_graph(
+    stages: Sequence[Stage],
+    max_workers: Optional[int] = None,
+    parallel: bool = True,
+    on_result: Optional[Callable[[StageResult], None]] = None,
+) -> Dict[str, StageResult]:
+    """
+    Runs the stages, respecting dependencies, and returns a dict of StageResult objects keyed by stage name.
+
+    Args:
+        stages: The stages to run. Order doesn't matter beyond dependencies.
+        max_workers: Maximum number of worker processes. Defaults to the number of stages, since these are
+            long-running and mostly IO/geoprocessing bound.
+        parallel: When False, runs everything in this process in dependency order - useful for debugging.
+        on_result: Optional callback run in this process as each stage finishes, so callers can record progress
+            that should survive a later stage failing.
+    """
+    ordered = _topological_order(stages)
+    graph_start = time.time()
+    results: Dict[str, StageResult] = {}
+
+    def stage_kwargs(stage):
+        kwargs = dict(stage.kwargs)
+        if stage.resolve:
+            kwargs.update(stage.resolve({name: result.value for name, result in results.items()}))
+        return kwargs
+
+    def record(stage, value, start, end, pid):
+        results[stage.name] = StageResult(stage.name, value, start - graph_start, end - graph_start, pid)
+        print(f"Stage {stage.name} finished in {round(end - start, 1)} seconds")
+        if on_result:
+            on_result(results[stage.name])
+
+    if not parallel or len(ordered) == 1:
+        for stage in ordered:
+            print(f"Starting stage {stage.name}")
+            record(stage, *_timed_call(stage.func, stage_kwargs(stage)))
+        return results
+
+    pending = list(ordered)
+    running = {}
+    worker_pids = multiprocessing.Queue()
+    executor = process_pool(max_workers or len(ordered), initializer=_register_worker, initargs=(worker_pids,))
+    try:
+        while pending or running:
+            for stage in [s for s in pending if all(dep in results for dep in s.depends_on)]:
+                print(f"Starting stage {stage.name}")
+                running[executor.submit(_timed_call, stage.func, stage_kwargs(stage))] = stage
+                pending.remove(stage)
+
+            finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                record(stage, *future.result())  # re-raises the worker's exception if the stage failed
+    except BaseException:
+        _abort(executor, worker_pids)
+        raise
+    finally:
+        worker_pids.close()
+    executor.shutdown()
+    return results
+
+
+def _register_worker(worker_pids):
+    """Pool initializer - tells the parent process this worker's PID, so _abort can stop it"""
+    worker_pids.put(os.getpid())
+
+
+def _abort(executor: ProcessPoolExecutor, worker_pids):
+    """
+    Stops the pool without waiting for stages that are still running - a failed download shouldn't surface only after
+    hours of parcel preparation. cancel() can't stop a stage that has started, so the workers are terminated, using
+    the PIDs they registered when they started.
+    """
+    executor.shutdown(wait=False, cancel_futures=True)
+    while True:
+        try:
+            pid = worker_pids.get(timeout=0.1)
+        except queue.Empty:
+            break
+        try:
+            os.kill(pid, signal.SIGTERM)  # TerminateProcess on Windows
+        except OSError:
+            pass  # already exited
+
+
+def critical_path(stages: Sequence[Stage], results: Dict[str, StageResult]) -> Tuple[List[str], float]:
+    """
+    Returns the chain of stages with the largest summed duration, and that duration. Shortening anything
+    off this path won't make the build finish sooner.
+    """
+    cost: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+    for stage in _topological_order(stages):
+        best_dep = max(stage.depends_on, key=lambda dep: cost[dep], default=None)
+        cost[stage.name] = results[stage.name].duration + (cost[best_dep] if best_dep else 0)
+        previous[stage.name] = best_dep
+
+    if not cost:
+        return [], 0.0
+
+    name = max(cost, key=cost.get)
+    total = cost[name]
+    path = []
+    while name:
+        path.append(name)
+        name = previous[name]
+    return list(reversed(path)), total
+
+
+def format_stage_report(stages: Sequence[Stage], results: Dict[str, StageResult]) -> str:
+    path, path_seconds = critical_path(stages, results)
+    wall = max((result.finished for result in results.values()), default=0.0)
+
+    lines = [f"{'Stage':<24}{'Start (s)':>12}{'Wall (s)':>12}  Critical"]
+    for result in sorted(results.values(), key=lambda r: r.started):
+        marker = "*" if result.name in path else ""
+        lines.append(f"{result.name:<24}{result.started:>12.1f}{result.duration:>12.1f}  {marker}")
+    lines.append(f"Critical path: {' -> '.join(path)} ({round(path_seconds, 1)} of {round(wall, 1)} seconds total)")
+    return "\n".join(lines)
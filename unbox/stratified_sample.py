@@ -0,0 +1,231 @@
+"""
+Stratified samples of LightBox addresses, for building QA corpora.
+
+quality_assessment compares geocoders on samples of addresses, and a plain random sample of the statewide Addresses
+table is mostly houses on small lots in a few big counties. This draws a sample per (county, parcel acreage bucket)
+stratum instead - 5% of each by default, and/or at most a fixed number from each - so rural and large-parcel
+addresses show up in the comparison too.
+
+Parcel acreage comes from Parcels through AddressParcelRelation, read once into sorted numpy LID arrays. Addresses
+is then read in a single pass, a batch of rows at a time. Each address gets a sort key from a hash of its address_lid
+and the seed, and each stratum keeps the addresses with the lowest keys (bottom-k sampling, a reservoir sample that
+doesn't depend on the order rows come back in), so memory grows with the sample, not the table, and the same seed
+always picks the same addresses.
+
+    python -m unbox.stratified_sample --gdb smartfabric.gdb --output qa_sample.csv --fraction 0.05 --seed 1
+
+The output is a CSV in our standard input schema (ID, STREET, CITY, STATE, ZIP), with the address_lid as the ID and
+COUNTY and ACRES columns added for breaking results down by stratum.
+"""
+
+from __future__ import annotations
+
+import csv
+import itertools
+import os
+import time
+
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .address_index import _street
+
+ADDRESS_FIELDS = ["address_lid", "FIPS_CODE", "house_number", "address", "unit", "city", "state", "zip"]
+# upper edges, in acres, of the parcel size buckets - bucket 0 is addresses without a parcel
+ACREAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 5, 20, 100)
+DEFAULT_FRACTION = 0.05
+DEFAULT_SEED = 0
+# Addresses rows per vectorized batch
+BATCH_SIZE = 200_000
+OUTPUT_FIELDS = ["ID", "STREET", "CITY", "STATE", "ZIP", "COUNTY", "ACRES"]
+
+
+def sample_keys(lids: np.ndarray, seed: int = DEFAULT_SEED) -> np.ndarray:
+    """
+    Uniform keys in [0, 1), one per LID - a splitmix64 hash of the LID and seed, so an address always gets the same
+    key for the same seed
+    """
+    z = np.asarray(lids).astype(np.uint64) + np.uint64((seed + 1) * 0x9E3779B97F4A7C15 % (1 << 64))
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def acreage_bucket(acres: np.ndarray) -> np.ndarray:
+    """Bucket number for each acreage - 0 for NaN (no parcel), then 1 for the smallest parcels and up"""
+    acres = np.asarray(acres, dtype=np.float64)
+    return np.where(np.isnan(acres), 0, np.digitize(acres, ACREAGE_BUCKETS, right=True) + 1)
+
+
+def acreage_lookup(parcel_lids: np.ndarray, parcel_acres: np.ndarray, relation_address_lids: np.ndarray,
+                   relation_parcel_lids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Joins parcel acreage onto addresses through the address/parcel relation. Returns sorted address LIDs and the
+    acreage of each one's parcel - the biggest one, for addresses related to more than one.
+    """
+    order = np.argsort(parcel_lids)
+    parcel_lids, parcel_acres = parcel_lids[order], np.asarray(parcel_acres, dtype=np.float64)[order]
+    if len(parcel_lids):
+        positions = np.minimum(np.searchsorted(parcel_lids, relation_parcel_lids), len(parcel_lids) - 1)
+        acres = np.where(parcel_lids[positions] == relation_parcel_lids, parcel_acres[positions], np.nan)
+    else:
+        acres = np.full(len(relation_parcel_lids), np.nan)
+    # biggest parcel first within each address, with parcels missing from Parcels last
+    order = np.lexsort((-np.nan_to_num(acres, nan=-1), relation_address_lids))
+    address_lids, first = np.unique(relation_address_lids[order], return_index=True)
+    return address_lids, acres[order][first]
+
+
+def read_acreage_lookup(gdb: str) -> Tuple[np.ndarray, np.ndarray]:
+    """acreage_lookup for a SmartFabric geodatabase, from bulk reads of Parcels and AddressParcelRelation"""
+    import arcpy  # imported here so the sampling itself can run (and be tested) without arcpy
+
+    parcels = arcpy.da.TableToNumPyArray(os.path.join(gdb, "Parcels"), ["PARCEL_LID", "AGGR_ACREAGE"], skip_nulls=False,
+                                         null_value={"PARCEL_LID": -1, "AGGR_ACREAGE": np.nan})
+    relation = arcpy.da.TableToNumPyArray(os.path.join(gdb, "AddressParcelRelation"), ["address_lid", "parcel_lid"],
+                                          null_value={"address_lid": -1, "parcel_lid": -1})
+    return acreage_lookup(parcels["PARCEL_LID"].astype(np.int64), parcels["AGGR_ACREAGE"],
+                          relation["address_lid"].astype(np.int64), relation["parcel_lid"].astype(np.int64))
+
+
+class StratifiedSampler(object):
+    """
+    Keeps a bottom-k sample per stratum as batches of addresses are added.
+
+    :param fraction: Keep addresses whose key is below this - that share of each stratum, give or take. None for no limit.
+    :param per_stratum: Keep at most this many addresses (the lowest keys) from each stratum. None for no limit.
+    """
+
+    def __init__(self, fraction: Optional[float] = DEFAULT_FRACTION, per_stratum: Optional[int] = None, seed: int = DEFAULT_SEED):
+        if fraction is None and per_stratum is None:
+            raise ValueError("Pass a fraction, a per_stratum size, or both")
+        self.fraction = fraction
+        self.per_stratum = per_stratum
+        self.seed = seed
+        self.strata = np.zeros(0, dtype=np.int64)
+        self.keys = np.zeros(0)
+        self.columns: Dict[str, np.ndarray] = {}
+        self.seen: Dict[int, int] = {}
+        self._counties: Dict[Any, int] = {}
+
+    def _stratum_codes(self, counties: np.ndarray, buckets: np.ndarray) -> np.ndarray:
+        names, inverse = np.unique(counties.astype(str), return_inverse=True)
+        codes = np.array([self._counties.setdefault(name, len(self._counties)) for name in names], dtype=np.int64)
+        return codes[inverse.ravel()] * (len(ACREAGE_BUCKETS) + 2) + buckets
+
+    def add(self, lids: np.ndarray, counties: np.ndarray, acres: np.ndarray, columns: Dict[str, np.ndarray]):
+        """Adds a batch of addresses - their LIDs, county codes, parcel acreage (NaN for none) and any other columns"""
+        strata = self._stratum_codes(counties, acreage_bucket(acres))
+        for stratum, count in zip(*np.unique(strata, return_counts=True)):
+            self.seen[int(stratum)] = self.seen.get(int(stratum), 0) + int(count)
+
+        keys = sample_keys(lids, self.seed)
+        keep = keys < self.fraction if self.fraction is not None else np.ones(len(keys), dtype=bool)
+        columns = {"lid": np.asarray(lids), "county": np.asarray(counties).astype(str), "acres": np.asarray(acres, dtype=np.float64),
+                   **{name: np.asarray(values, dtype=object) for name, values in columns.items()}}
+        self.strata = np.concatenate([self.strata, strata[keep]])
+        self.keys = np.concatenate([self.keys, keys[keep]])
+        self.columns = {name: np.concatenate([self.columns[name], values[keep]]) if name in self.columns else values[keep]
+                        for name, values in columns.items()}
+        if self.per_stratum is not None:
+            self._trim()
+
+    def _trim(self):
+        """Drops all but the per_stratum lowest keys in each stratum"""
+        order = np.lexsort((self.keys, self.strata))
+        strata = self.strata[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(strata)) + 1] if len(strata) else np.zeros(0, dtype=np.int64)
+        rank = np.arange(len(strata)) - np.repeat(starts, np.diff(np.r_[starts, len(strata)]))
+        kept = order[rank < self.per_stratum]
+        self.strata, self.keys = self.strata[kept], self.keys[kept]
+        self.columns = {name: values[kept] for name, values in self.columns.items()}
+
+    def sample(self) -> Dict[str, np.ndarray]:
+        """The sampled addresses' columns, ordered by county, then acreage bucket, then LID"""
+        if not self.columns:
+            return {}
+        buckets = acreage_bucket(self.columns["acres"])
+        order = np.lexsort((self.columns["lid"], buckets, self.columns["county"]))
+        return {name: values[order] for name, values in self.columns.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"seen": sum(self.seen.values()), "sampled": len(self.keys), "strata": len(self.seen),
+                "strata_sampled": len(np.unique(self.strata)), "seed": self.seed}
+
+
+def _batches(rows: Iterable[tuple], size: int):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_corpus(sample: Dict[str, np.ndarray], output: str) -> int:
+    """Writes a sample to a CSV in the standard input schema. Returns the number of rows."""
+    with open(output, "w", newline="", encoding="utf-8") as corpus:
+        writer = csv.writer(corpus)
+        writer.writerow(OUTPUT_FIELDS)
+        count = len(sample.get("lid", ()))
+        for row in range(count):
+            address, unit = sample["address"][row], sample["unit"][row]
+            street = _street(sample["house_number"][row], address)
+            writer.writerow([
+                int(sample["lid"][row]),
+                f"{street} {unit}" if unit else street,
+                sample["city"][row] or "",
+                sample["state"][row] or "",
+                sample["zip"][row] or "",
+                sample["county"][row],
+                "" if np.isnan(sample["acres"][row]) else round(float(sample["acres"][row]), 4),
+            ])
+    return count
+
+
+def sample_addresses(gdb: str, output: str, fraction: Optional[float] = DEFAULT_FRACTION, per_stratum: Optional[int] = None,
+                     seed: int = DEFAULT_SEED, where_clause: Optional[str] = None, batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """Draws a stratified sample of a SmartFabric geodatabase's Addresses and writes it to output as a CSV"""
+    import arcpy  # imported here so the sampling itself can run (and be tested) without arcpy
+
+    start = time.perf_counter()
+    address_lids, address_acres = read_acreage_lookup(gdb)
+    sampler = StratifiedSampler(fraction, per_stratum, seed)
+    with arcpy.da.SearchCursor(os.path.join(gdb, "Addresses"), ADDRESS_FIELDS, where_clause=where_clause) as cursor:
+        for batch in _batches(cursor, batch_size):
+            columns = dict(zip(ADDRESS_FIELDS, (np.array(values, dtype=object) for values in zip(*batch))))
+            lids = np.array([lid if lid is not None else -1 for lid in columns.pop("address_lid")], dtype=np.int64)
+            counties = columns.pop("FIPS_CODE")
+            acres = np.full(len(lids), np.nan)
+            if len(address_lids):
+                positions = np.minimum(np.searchsorted(address_lids, lids), len(address_lids) - 1)
+                found = address_lids[positions] == lids
+                acres[found] = address_acres[positions[found]]
+            sampler.add(lids, counties, acres, columns)
+
+    stats = sampler.stats()
+    stats["written"] = write_corpus(sampler.sample(), output)
+    stats["seconds"] = round(time.perf_counter() - start, 1)
+    print(f"Sampled {stats['written']} of {stats['seen']} addresses from {stats['strata']} strata in {stats['seconds']} seconds")
+    return stats
+
+
+if __name__ == "__main__":
+    import json
+
+    import click
+
+    @click.command()
+    @click.option("--gdb", required=True, help="SmartFabric geodatabase with Addresses, Parcels and AddressParcelRelation")
+    @click.option("--output", required=True, help="CSV to write the sample to")
+    @click.option("--fraction", default=DEFAULT_FRACTION, type=float, help="Share of each stratum to sample. 0 for no limit.")
+    @click.option("--per_stratum", default=None, type=int, help="Most addresses to sample from any one stratum")
+    @click.option("--seed", default=DEFAULT_SEED, type=int, help="Same seed, same sample")
+    @click.option("--where_clause", default=None, help="Only sample Addresses rows matching this")
+    def main(gdb, output, fraction, per_stratum, seed, where_clause):
+        stats = sample_addresses(gdb, output, fraction or None, per_stratum, seed, where_clause)
+        print(json.dumps(stats, indent=2))
+
+    main()
@@ -0,0 +1,99 @@
+"""
+A stand-in for arcpy.geocoding.Locator that sleeps for a configurable time and makes up a plausible result.
+
+It lets the dev shim, its worker pools and the load test harness (load_test.py) run on machines without arcpy - CI on
+Linux, say - so we can measure the shim's own overhead and its concurrency features without a real locator in the
+way. Use it anywhere a locator path goes by passing a path like
+
+    stub:latency=0.005,jitter=0.002,error_rate=0.01
+
+latency and jitter are seconds (each call sleeps latency plus up to jitter), error_rate is the fraction of calls that
+raise. Results are deterministic per address or point, so caches and coalescing behave as they would for real.
+"""
+
+import hashlib
+import random
+import threading
+import time
+
+from typing import Any, Dict, List
+
+from .address_normalize import normalize_address
+
+STUB_PREFIX = "stub:"
+# roughly California, so results land somewhere sensible on a map
+_EXTENT = (-124.0, 32.6, -114.2, 41.9)
+
+
+def is_stub(locator_path) -> bool:
+    return isinstance(locator_path, str) and locator_path.startswith(STUB_PREFIX)
+
+
+def _fraction(text: str, salt: str) -> float:
+    digest = hashlib.blake2b(f"{salt}|{text}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2 ** 64
+
+
+class StubLocator(object):
+    """
+    Has the geocode and reverseGeocode methods the shim uses, with the same signatures.
+
+    :param latency: Seconds every call takes
+    :param jitter: Up to this many more seconds, at random
+    :param error_rate: Fraction of calls that raise RuntimeError
+    """
+
+    def __init__(self, latency: float = 0.005, jitter: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(0)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @classmethod
+    def from_path(cls, locator_path: str) -> "StubLocator":
+        options = {}
+        for option in locator_path[len(STUB_PREFIX):].split(","):
+            if option.strip():
+                name, _, value = option.partition("=")
+                options[name.strip()] = float(value)
+        return cls(**options)
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0)
+            fail = self.error_rate and self._random.random() < self.error_rate
+        time.sleep(delay)  # like the real locator, releases the GIL while it works
+        if fail:
+            raise RuntimeError("Stub locator error")
+
+    def geocode(self, address: str, forStorage: bool = True, maxResults: int = 1, **kwargs) -> List[Dict[str, Any]]:
+        self._call()
+        normalized = normalize_address(address)
+        if not normalized:
+            return []
+        x = _EXTENT[0] + _fraction(normalized, "x") * (_EXTENT[2] - _EXTENT[0])
+        y = _EXTENT[1] + _fraction(normalized, "y") * (_EXTENT[3] - _EXTENT[1])
+        return [{
+            "Match_addr": normalized,
+            "LongLabel": normalized,
+            "Status": "M",
+            "Score": 100 - candidate * 5,
+            "Addr_type": "PointAddress" if candidate == 0 else "StreetAddress",
+            "X": x,
+            "Y": y,
+            "DisplayX": x,
+            "DisplayY": y,
+        } for candidate in range(min(maxResults, 2))]
+
+    def reverseGeocode(self, location, forStorage: bool = True, **kwargs) -> Dict[str, Any]:
+        self._call()
+        if isinstance(location, (tuple, list)):
+            x, y = location
+        else:  # an arcpy PointGeometry
+            x, y = location.firstPoint.X, location.firstPoint.Y
+        house_number = int(_fraction(f"{x:.4f},{y:.4f}", "number") * 9999) + 1
+        label = f"{house_number} STUB ST"
+        return {"Match_addr": label, "LongLabel": label, "Addr_type": "StreetAddress", "X": x, "Y": y, "Distance": 0}
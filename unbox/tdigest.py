@@ -0,0 +1,71 @@
+"""
+A small t-digest for approximate percentiles over more values than fit in memory.
+
+Values are kept as weighted centroids - many small ones near the tails and fewer, bigger ones in the middle, so
+extreme percentiles (p99 of a distance distribution, say) stay accurate while the digest stays a few KB. Updates take
+whole numpy arrays: the new values are sorted in with the existing centroids, and neighbors are merged wherever they
+fall in the same unit of the scale function, using bincount instead of a Python loop.
+"""
+
+from typing import Dict, Iterable
+
+import numpy as np
+
+
+class TDigest(object):
+    """
+    :param compression: Roughly how many centroids to keep. Higher is more accurate and bigger.
+    """
+
+    def __init__(self, compression: float = 500):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _scale(self, q: np.ndarray) -> np.ndarray:
+        """The k1 scale function - steep at the tails, so clusters there stay small"""
+        return self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        """Replaces the centroids with these, merged - each goes in the cluster for the scale unit its left edge is in"""
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        left = (np.cumsum(weights) - weights) / weights.sum()
+        cluster = np.floor(self._scale(left)).astype(np.int64)
+        cluster -= cluster[0]
+        total = np.bincount(cluster, weights=weights)
+        keep = total > 0
+        self.weights = total[keep]
+        self.means = np.bincount(cluster, weights=means * weights)[keep] / self.weights
+
+    def update(self, values) -> "TDigest":
+        """Adds an array of values. NaNs are skipped."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.count += len(values)
+            self.min, self.max = min(self.min, float(values.min())), max(self.max, float(values.max()))
+            self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(len(values))]))
+        return self
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        """Folds another digest's centroids into this one"""
+        if other.count:
+            self.count += other.count
+            self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+            self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+        return self
+
+    def percentiles(self, pcts: Iterable[float]) -> Dict[float, float]:
+        """Estimated percentiles (0-100), interpolated between centroid centers. NaN when the digest is empty."""
+        pcts = list(pcts)
+        if not self.count:
+            return {p: float("nan") for p in pcts}
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0], centers, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        estimates = np.interp(np.asarray(pcts, dtype=np.float64) / 100 * self.count, positions, values)
+        return {p: float(estimate) for p, estimate in zip(pcts, estimates)}